@@ -0,0 +1,88 @@
+"""
+Benchmark process_single_player against player registries of growing size.
+
+The API is replaced by an in-memory profile generator so only the crawler's own
+bookkeeping is measured. Throughput should stay flat from 1k to 500k players.
+
+Usage: python bench_player_index.py [--sizes 1000 10000 100000 500000] [--calls 2000]
+"""
+import argparse
+import builtins
+import random
+import time
+from collections import defaultdict
+
+from bfs_par_v2 import UniformClashRoyaleScraper
+
+
+class OfflineScraper(UniformClashRoyaleScraper):
+    """Scraper whose profile fetch is served from memory"""
+
+    def get_player_data(self, player_tag):
+        rng = random.Random(player_tag)
+        return {
+            'success': True,
+            'profile': {'maxscore': rng.randint(1, 9999)},
+            'matches': [
+                {
+                    'game_config': {'name': 'Ladder'},
+                    'timestamp': 0,
+                    'players': [
+                        {'hashtag': player_tag},
+                        {'hashtag': f"OPP{rng.randint(0, 10**9)}", 'score': rng.randint(0, 9999), 'name': 'Opponent'}
+                    ]
+                }
+                for _ in range(25)
+            ]
+        }
+
+
+def run_benchmark(registry_size: int, calls: int, width: int = 3) -> float:
+    """Return processed players per second with a registry of registry_size players"""
+    scraper = OfflineScraper(max_workers=1)
+    # Quota large enough that it never fills during the benchmark
+    scraper.setup_quota_system(total_quota=(registry_size + calls * width) * 100, strategy="arena_based")
+
+    all_players = {}
+    for i in range(registry_size):
+        tag = f"P{i}"
+        all_players[tag] = {'tag': tag, 'trophies': i % 10000, 'name': 'Player', 'depth': 1}
+    visited_players = set(all_players)
+
+    # Expand players spread over the whole registry, including the most recent ones
+    tags = [f"P{int(i * (registry_size - 1) / max(calls - 1, 1))}" for i in range(calls)]
+    progress_counter = defaultdict(int, start_time=time.time())
+
+    start = time.perf_counter()
+    for tag in tags:
+        scraper.process_single_player(all_players[tag], width, visited_players, all_players, progress_counter)
+    elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawler player registry')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 500000],
+                        help='Registry sizes to benchmark')
+    parser.add_argument('--calls', type=int, default=2000,
+                        help='Players processed per registry size')
+    args = parser.parse_args()
+
+    original_print = builtins.print
+    results = []
+    for size in args.sizes:
+        # Silence the crawler's progress output while timing
+        builtins.print = lambda *a, **k: None
+        try:
+            rate = run_benchmark(size, args.calls)
+        finally:
+            builtins.print = original_print
+        results.append((size, rate))
+        print(f"{size:>9,} players in registry: {rate:10,.0f} players processed/s")
+
+    baseline = results[0][1]
+    print(f"Worst throughput relative to the smallest registry: {min(r for _, r in results) / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
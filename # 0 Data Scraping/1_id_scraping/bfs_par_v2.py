@@ -1,17 +1,35 @@
 import requests
 import time
 import json
+import os
 import random
+import sys
 from typing import List, Dict, Any, Set, Optional, Tuple
 from collections import deque, defaultdict
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import threading
 from datetime import datetime, timedelta
 
+# Shared API helpers live next to the battle log collector
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "#1 Data Collection"))
+from rate_limiter import configure_rate_limiter, get_rate_limiter, DEFAULT_REQUESTS_PER_SECOND, DEFAULT_BURST
+from concurrency import configure_concurrency_limiter, get_concurrency_limiter
+from http_client import PooledSession
+from cancellation import Cancelled, CancellationToken
+from battle_log_final import BattleLogWriter, API_BASE_URL
+from raw_archive import RawProfileArchive
+from crawl_journal import CrawlJournal
+from player_stream import PlayerStreamWriter, metadata_path, write_metadata
+from priority_frontier import QuotaPriorityFrontier, weighted_sample
+
+# Ladder matchmaking pairs players within roughly this many trophies
+MATCHMAKING_SPREAD = 200
+
 class UniformClashRoyaleScraper:
-    def __init__(self, max_workers: int = 5):
-        self.base_url = "https://stats-royale-api-js-beta-z2msk5bu3q-uk.a.run.app"
+    def __init__(self, max_workers: int = 5, quota_aware: bool = True, base_url: Optional[str] = None):
+        # Defaults to STATS_ROYALE_API_URL or the live API
+        self.base_url = (base_url or API_BASE_URL).rstrip('/')
         self.headers = {
             'authority': 'stats-royale-api-js-beta-z2msk5bu3q-uk.a.run.app',
             'accept': '*/*',
@@ -28,12 +46,23 @@ class UniformClashRoyaleScraper:
             'sec-fetch-site': 'cross-site',
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36'
         }
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        # One kept-alive connection per worker, shared by the worker threads
+        self.session = PooledSession(pool_size=max_workers, headers=self.headers)
         self.max_workers = max_workers
+        # Expand players from under-filled arenas/buckets first and weight opponent selection by remaining quota
+        self.quota_aware = quota_aware
         self.visited_lock = threading.Lock()
         self.progress_lock = threading.Lock()
         self.quota_lock = threading.Lock()
+        self.journal = None
+        # Set in fused crawl-and-collect mode: battle logs of every fetched profile are stored
+        self.battle_writer = None
+        # Set when the output is NDJSON: players are written as soon as they are expanded
+        self.player_stream = None
+        # Set when raw profile responses are archived for later re-processing
+        self.archive = None
+        # Cancelled once the quota is reached; replaced at the start of every expansion
+        self.cancel_token = CancellationToken()
         
     def setup_quota_system(self, total_quota: int = 50000, strategy: str = "arena_based"):
         """
@@ -113,6 +142,20 @@ class UniformClashRoyaleScraper:
                 
             return True
     
+    def is_quota_full(self) -> bool:
+        """Check if the total quota, or every arena/bucket quota, has been reached"""
+        with self.quota_lock:
+            if self.total_collected >= self.total_quota:
+                return True
+            
+            if self.strategy == "arena_based":
+                return all(self.arena_counts[arena] >= quota for arena, quota in self.arena_quotas.items())
+                
+            elif self.strategy == "bucket_based":
+                return all(self.bucket_counts[bucket] >= quota for bucket, quota in self.bucket_quotas.items())
+            
+            return False
+    
     def register_player(self, player_trophies: int):
         """Register a new player in the quota system"""
         with self.quota_lock:
@@ -126,6 +169,35 @@ class UniformClashRoyaleScraper:
                 bucket = self.get_player_bucket(player_trophies)
                 self.bucket_counts[bucket] += 1
     
+    def get_remaining_quota_fraction(self, player_trophies: int) -> float:
+        """Fraction of the quota still open in the arena/bucket of this trophy count"""
+        with self.quota_lock:
+            if self.total_collected >= self.total_quota:
+                return 0.0
+            
+            if self.strategy == "arena_based":
+                arena = self.get_player_arena(player_trophies)
+                quota = self.arena_quotas.get(arena, 0)
+                return max(quota - self.arena_counts[arena], 0) / quota if quota > 0 else 0.0
+                
+            elif self.strategy == "bucket_based":
+                bucket = self.get_player_bucket(player_trophies)
+                quota = self.bucket_quotas.get(bucket, 0)
+                return max(quota - self.bucket_counts[bucket], 0) / quota if quota > 0 else 0.0
+            
+            return 1.0 - self.total_collected / self.total_quota
+    
+    def get_frontier_priority(self, player: Dict[str, Any]) -> float:
+        """
+        Estimate how much open quota expanding this player will reach.
+        Its opponents are matched around its own trophies, so look at its own
+        arena/bucket and the ones a matchmaking spread away on either side.
+        """
+        trophies = player.get('trophies', 0)
+        return (0.5 * self.get_remaining_quota_fraction(trophies)
+                + 0.25 * self.get_remaining_quota_fraction(max(trophies - MATCHMAKING_SPREAD, 0))
+                + 0.25 * self.get_remaining_quota_fraction(trophies + MATCHMAKING_SPREAD))
+    
     def get_quota_progress(self) -> Dict[str, Any]:
         """Get current progress towards quotas"""
         with self.quota_lock:
@@ -177,14 +249,24 @@ class UniformClashRoyaleScraper:
                 print(f"   ... and {incomplete_buckets - 10} more incomplete buckets")
     
     def get_player_data(self, player_tag: str) -> Optional[Dict[str, Any]]:
-        """Fetch player data including profile and battle logs"""
+        """Fetch player data including profile and battle logs (None once the crawl is cancelled)"""
         try:
             url = f"{self.base_url}/profile/{player_tag}"
-            response = self.session.get(url)
-            response.raise_for_status()
-            return response.json()
+            # The token is taken before the slot, so the slot only times the request itself
+            get_rate_limiter().acquire(self.cancel_token)
+            with get_concurrency_limiter().slot(self.cancel_token):
+                response = self.session.get(url, timeout=10)
+                response.raise_for_status()
+            data = response.json()
+            if self.archive:
+                self.archive.write(player_tag, data)
+            return data
+        except Cancelled:
+            return None
         except Exception as e:
-            print(f"❌ Error fetching data for player {player_tag}: {e}")
+            # Requests aborted by the cancellation are expected to fail
+            if not self.cancel_token.cancelled:
+                print(f"❌ Error fetching data for player {player_tag}: {e}")
             return None
     
     def get_current_player_trophies(self, player_data: Dict[str, Any]) -> int:
@@ -224,40 +306,63 @@ class UniformClashRoyaleScraper:
         
         return opponents
     
-    def process_single_player(self, player_data: Dict, width: int, delay: float, 
-                            visited_players: Set, all_players: List, 
+    def process_single_player(self, player_data: Dict, width: int,
+                            visited_players: Set, all_players: Dict[str, Dict], 
                             progress_counter: Dict) -> Tuple[List[Dict], int]:
-        """Process a single player and return new opponents found"""
+        """
+        Process a single player and return new opponents found
+        all_players is the tag-keyed player registry of the crawl
+        """
         current_player = player_data
         new_players = []
         new_count = 0
         
-        time.sleep(delay)
+        if self.cancel_token.cancelled:
+            return new_players, new_count
+        
         player_api_data = self.get_player_data(current_player['tag'])
         
-        if not player_api_data or not player_api_data.get('success'):
+        if not player_api_data or not player_api_data.get('success') or self.cancel_token.cancelled:
             return new_players, new_count
         
+        # Fused mode: keep the battles of this profile instead of fetching it again later
+        if self.battle_writer:
+            self.battle_writer.write_matches(player_api_data.get('matches', []))
+            with self.progress_lock:
+                player = all_players.get(current_player['tag'])
+                if player is not None:
+                    player['battles_collected'] = True
+        
         # Update current player's trophies if available
         current_trophies = self.get_current_player_trophies(player_api_data)
         if current_trophies > 0:
             with self.progress_lock:
-                for player in all_players:
-                    if player['tag'] == current_player['tag']:
-                        player['trophies'] = current_trophies
-                        break
+                player = all_players.get(current_player['tag'])
+                if player is not None:
+                    player['trophies'] = current_trophies
+            if self.journal:
+                self.journal.write_trophies(current_player['tag'], current_trophies)
         
         # Check if we've reached overall quota
-        if self.total_collected >= self.total_quota:
+        if self.is_quota_full():
             return new_players, new_count
         
         # Extract opponents (already filtered by quota system)
         all_opponents = self.extract_opponents_from_battle_log(player_api_data, current_player['tag'])
+        # Spend the width on players not seen yet, once each; the locked check below stays authoritative
+        unseen_tags = set()
+        candidates = []
+        for opponent in all_opponents:
+            if opponent['tag'] not in visited_players and opponent['tag'] not in unseen_tags:
+                unseen_tags.add(opponent['tag'])
+                candidates.append(opponent)
         
         # Select random opponents, but prioritize needed trophy ranges
-        if len(all_opponents) > 0:
-            # Simple random selection for now (can be enhanced with weighted selection)
-            selected_opponents = random.sample(all_opponents, min(width, len(all_opponents)))
+        if len(candidates) > 0 and self.quota_aware:
+            weights = [self.get_remaining_quota_fraction(opponent['trophies']) for opponent in candidates]
+            selected_opponents = weighted_sample(candidates, weights, min(width, len(candidates)))
+        elif len(candidates) > 0:
+            selected_opponents = random.sample(candidates, min(width, len(candidates)))
         else:
             selected_opponents = []
         
@@ -282,6 +387,12 @@ class UniformClashRoyaleScraper:
                     new_players.append(new_player)
                     new_count += 1
                     self.register_player(opponent['trophies'])
+                    if self.journal:
+                        self.journal.write_player(new_player)
+        
+        if new_count and self.is_quota_full():
+            # Stop the other workers now rather than when the main thread next looks
+            self.cancel_workers()
         
         # Update progress
         with self.progress_lock:
@@ -299,7 +410,8 @@ class UniformClashRoyaleScraper:
                 
                 print(f"   📊 Progress: {progress_counter['processed']} players processed | "
                       f"Total: {self.total_collected:,}/{self.total_quota:,} | "
-                      f"Rate: {rate:.1f} players/s | ETA: {eta/60:.1f} min")
+                      f"Rate: {rate:.1f} players/s | ETA: {eta/60:.1f} min | "
+                      f"Concurrency: {get_concurrency_limiter().current_limit}")
                 
                 # Show quota progress every 100 players
                 if progress_counter['processed'] % 100 == 0:
@@ -307,11 +419,10 @@ class UniformClashRoyaleScraper:
         
         return new_players, new_count
     
-    def expand_player_network_uniform(self, initial_players: List[Dict], width: int = 3, 
-                                    max_depth: int = 10, delay: float = 1.0) -> List[Dict]:
-        """Expand player network with uniform distribution quotas"""
+    def seed_frontier(self, initial_players: List[Dict]) -> Tuple[Set, Dict[str, Dict], deque]:
+        """Register initial players and build the starting frontier"""
         visited_players = set()
-        all_players = []
+        all_players = {}
         queue = deque()
         
         # Add initial players to queue and register them
@@ -322,20 +433,104 @@ class UniformClashRoyaleScraper:
                 player_with_depth = player.copy()
                 player_with_depth['depth'] = 0
                 player_with_depth['source'] = 'initial_dataset'
-                all_players.append(player_with_depth)
+                all_players[player_tag] = player_with_depth
                 self.register_player(player['trophies'])
                 queue.append(player_with_depth)
+                if self.journal:
+                    self.journal.write_player(player_with_depth)
+        
+        return visited_players, all_players, queue
+    
+    def restore_frontier(self, journal_state: Dict[str, Any], max_depth: int) -> Tuple[Set, Dict[str, Dict], deque]:
+        """
+        Rebuild visited players, collected players, quota counters and the
+        frontier from a loaded crawl journal
+        """
+        visited_players = set()
+        all_players = {}
+        queue = deque()
+        
+        for record in journal_state['players']:
+            player_tag = record['tag']
+            if player_tag in visited_players:
+                continue
+            visited_players.add(player_tag)
+            # Quota counters use the trophies the player was registered with
+            self.register_player(record['trophies'])
+            player = dict(record)
+            if player_tag in journal_state['trophies']:
+                player['trophies'] = journal_state['trophies'][player_tag]
+            all_players[player_tag] = player
+            if player_tag not in journal_state['expanded'] and player.get('depth', 0) < max_depth:
+                queue.append(player)
+        
+        print(f"♻️  Restored {len(all_players):,} players from journal, "
+              f"{len(queue):,} still waiting to be expanded")
+        return visited_players, all_players, queue
+    
+    def finish_player(self, player: Dict[str, Any]):
+        """Record a player whose profile has been fetched and expanded"""
+        if self.player_stream:
+            self.player_stream.write(player)
+        if self.journal:
+            self.journal.write_expanded(player['tag'])
+    
+    def reset_cancellation(self):
+        """Give an expansion run a fresh cancellation token"""
+        self.cancel_token = CancellationToken()
+        # Wake workers waiting for a request slot and abort the requests in flight
+        self.cancel_token.on_cancel(get_concurrency_limiter().wake_all)
+        self.cancel_token.on_cancel(self.session.abort_in_flight)
+    
+    def cancel_workers(self):
+        """
+        Stop all workers of the current expansion: workers about to fetch or
+        waiting for the rate limiter return at once, and in-flight requests are aborted
+        """
+        if not self.cancel_token.cancelled:
+            self.cancel_token.cancel()
+            print(f"   🛑 Quota reached, cancelling outstanding profile fetches")
+    
+    def print_fetch_efficiency(self, profiles_fetched: int, accepted_players: int):
+        """Print how many profile fetches each newly accepted player cost"""
+        calls_per_player = profiles_fetched / accepted_players if accepted_players > 0 else float('inf')
+        print(f"Profiles fetched: {profiles_fetched:,} | New players accepted: {accepted_players:,} "
+              f"| API calls per accepted player: {calls_per_player:.2f}")
+    
+    def expand_player_network_uniform(self, initial_players: List[Dict], width: int = 3, 
+                                    max_depth: int = 10,
+                                    resume_state: Optional[Tuple[Set, Dict[str, Dict], deque]] = None) -> List[Dict]:
+        """Expand player network with uniform distribution quotas"""
+        if resume_state is not None:
+            visited_players, all_players, queue = resume_state
+        else:
+            visited_players, all_players, queue = self.seed_frontier(initial_players)
         
-        print(f"🚀 Starting UNIFORM network expansion with {len(initial_players)} initial players")
-        print(f"📊 Parameters: width={width}, max_depth={max_depth}, workers={self.max_workers}, delay={delay}s")
+        print(f"🚀 Starting UNIFORM network expansion with {len(queue)} players in the frontier")
+        limiter = get_rate_limiter()
+        print(f"📊 Parameters: width={width}, max_depth={max_depth}, workers={self.max_workers}, "
+              f"rate={limiter.rate:g} req/s (burst {limiter.burst})")
         print(f"🎯 Target: {self.total_quota:,} players with {self.strategy} distribution")
         
+        self.reset_cancellation()
         start_time = time.time()
-        current_depth = 0
-        
-        while queue and current_depth < max_depth and self.total_collected < self.total_quota:
-            current_level_players = list(queue)
+        current_depth = min((player.get('depth', 0) for player in queue), default=0)
+        initial_count = len(all_players)
+        profiles_fetched = 0
+        
+        while queue and not self.is_quota_full():
+            # A resumed frontier can hold several depths: expand the shallowest level first
+            # and never expand players at max_depth
+            current_depth = min(player.get('depth', 0) for player in queue)
+            if current_depth >= max_depth:
+                break
+            current_level_players = [player for player in queue if player.get('depth', 0) == current_depth]
+            deeper_players = [player for player in queue if player.get('depth', 0) > current_depth]
             queue.clear()
+            queue.extend(deeper_players)
+            if self.quota_aware:
+                # Start with the players most likely to reach open quota
+                current_level_players.sort(key=self.get_frontier_priority, reverse=True)
             
             if not current_level_players:
                 break
@@ -356,34 +551,36 @@ class UniformClashRoyaleScraper:
                 future_to_player = {
                     executor.submit(
                         self.process_single_player, 
-                        player, width, delay, visited_players, all_players, progress_counter
+                        player, width, visited_players, all_players, progress_counter
                     ): player for player in current_level_players
                 }
                 
                 for future in as_completed(future_to_player):
-                    if self.total_collected >= self.total_quota:
-                        # Cancel remaining tasks if quota reached
-                        for f in future_to_player:
-                            f.cancel()
-                        break
-                        
                     player = future_to_player[future]
                     try:
                         new_players, new_count = future.result()
                         for new_player in new_players:
                             queue.append(new_player)
-                            all_players.append(new_player)
+                            all_players[new_player['tag']] = new_player
+                        self.finish_player(player)
                     except Exception as exc:
                         print(f"❌ Player {player['tag']} generated an exception: {exc}")
+                    
+                    if self.is_quota_full():
+                        # Drop tasks that have not started and stop the running ones
+                        self.cancel_workers()
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        break
             
             current_depth += 1
+            profiles_fetched += progress_counter['processed']
             level_time = time.time() - progress_counter['start_time']
             print(f"   ✅ Depth {current_depth-1} completed in {level_time:.1f}s")
             print(f"   📈 Found {progress_counter['found_opponents']} needed opponents, "
                   f"added {progress_counter['new_players']} new players")
             
             # Check if we should continue
-            if self.total_collected >= self.total_quota:
+            if self.is_quota_full():
                 print(f"   🎉 Quota reached! Stopping expansion.")
                 break
         
@@ -396,13 +593,107 @@ class UniformClashRoyaleScraper:
         print(f"Target quota: {self.total_quota:,}")
         print(f"Quota completion: {self.total_collected:,}/{self.total_quota:,} ({self.total_collected/self.total_quota*100:.1f}%)")
         print(f"Maximum depth reached: {current_depth}")
+        self.print_fetch_efficiency(profiles_fetched, len(all_players) - initial_count)
         print(f"Total time: {total_time:.1f}s ({total_time/60:.1f} minutes)")
         print(f"Processing rate: {len(all_players)/total_time:.2f} players/second")
         
         # Final quota progress
         self.print_quota_progress()
+        print(f"\n⚙️  {get_concurrency_limiter().report()}")
         
-        return all_players
+        return list(all_players.values())
+    
+    def expand_player_network_continuous(self, initial_players: List[Dict], width: int = 3,
+                                         max_depth: int = 10,
+                                         resume_state: Optional[Tuple[Set, Dict[str, Dict], deque]] = None) -> List[Dict]:
+        """
+        Expand player network with a continuous work queue instead of per-depth levels.
+        Newly found opponents are queued immediately and picked up by the next idle
+        worker, so one slow profile fetch no longer holds up a whole depth.
+        """
+        if resume_state is not None:
+            visited_players, all_players, queue = resume_state
+        else:
+            visited_players, all_players, queue = self.seed_frontier(initial_players)
+        
+        print(f"🚀 Starting CONTINUOUS network expansion with {len(queue)} players in the frontier")
+        limiter = get_rate_limiter()
+        print(f"📊 Parameters: width={width}, max_depth={max_depth}, workers={self.max_workers}, "
+              f"rate={limiter.rate:g} req/s (burst {limiter.burst})")
+        print(f"🎯 Target: {self.total_quota:,} players with {self.strategy} distribution")
+        
+        if self.quota_aware:
+            queue = QuotaPriorityFrontier(self.get_frontier_priority, queue)
+        
+        self.reset_cancellation()
+        start_time = time.time()
+        deepest_depth = 0
+        initial_count = len(all_players)
+        progress_counter = {
+            'processed': 0,
+            'total_players': len(queue),
+            'found_opponents': 0,
+            'selected_opponents': 0,
+            'new_players': 0,
+            'start_time': start_time
+        }
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_player = {}
+            
+            while (queue or future_to_player) and not self.is_quota_full():
+                # Keep every worker busy as long as there is expandable work
+                while queue and len(future_to_player) < self.max_workers:
+                    player = queue.popleft()
+                    # Players at max_depth are collected but never expanded
+                    if player.get('depth', 0) >= max_depth:
+                        continue
+                    future = executor.submit(
+                        self.process_single_player,
+                        player, width, visited_players, all_players, progress_counter
+                    )
+                    future_to_player[future] = player
+                
+                if not future_to_player:
+                    break
+                
+                done, _ = wait(future_to_player, return_when=FIRST_COMPLETED)
+                for future in done:
+                    player = future_to_player.pop(future)
+                    try:
+                        new_players, new_count = future.result()
+                        for new_player in new_players:
+                            queue.append(new_player)
+                            all_players[new_player['tag']] = new_player
+                            deepest_depth = max(deepest_depth, new_player['depth'])
+                        self.finish_player(player)
+                    except Exception as exc:
+                        print(f"❌ Player {player['tag']} generated an exception: {exc}")
+            
+            if self.is_quota_full():
+                print(f"   🎉 Quota reached! Stopping expansion.")
+                # Drop tasks that have not started and stop the running ones
+                self.cancel_workers()
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        total_time = time.time() - start_time
+        print(f"\n{'='*60}")
+        print(f"📈 CONTINUOUS NETWORK EXPANSION SUMMARY")
+        print(f"{'='*60}")
+        print(f"Total players collected: {len(all_players):,}")
+        print(f"Unique players: {len(visited_players):,}")
+        print(f"Target quota: {self.total_quota:,}")
+        print(f"Quota completion: {self.total_collected:,}/{self.total_quota:,} ({self.total_collected/self.total_quota*100:.1f}%)")
+        print(f"Maximum depth reached: {deepest_depth}")
+        self.print_fetch_efficiency(progress_counter['processed'], len(all_players) - initial_count)
+        print(f"Total time: {total_time:.1f}s ({total_time/60:.1f} minutes)")
+        print(f"Processing rate: {len(all_players)/total_time:.2f} players/second")
+        
+        # Final quota progress
+        self.print_quota_progress()
+        print(f"\n⚙️  {get_concurrency_limiter().report()}")
+        
+        return list(all_players.values())
     
     def load_initial_players(self, filename: str = "clash_royale_arenas_complete.json") -> List[Dict[str, Any]]:
         """Load initial players from JSON file"""
@@ -435,8 +726,13 @@ class UniformClashRoyaleScraper:
             print(f"❌ Error decoding JSON from {filename}")
             return []
     
-    def save_expanded_data(self, players_data: List[Dict], filename: str = "clash_royale_uniform.json"):
-        """Save expanded player data to JSON file"""
+    def save_expanded_data(self, players_data: List[Dict], filename: str = "clash_royale_uniform.ndjson"):
+        """
+        Save expanded player data
+        .ndjson files get one player per line plus a .meta.json sidecar; players
+        already streamed during the crawl are not written again.
+        Any other filename gets the single JSON document with metadata and players.
+        """
         metadata = {
             'total_players': len(players_data),
             'scraping_timestamp': time.time(),
@@ -447,66 +743,149 @@ class UniformClashRoyaleScraper:
             'quota_achieved': self.total_collected
         }
         
-        output_data = {
-            'metadata': metadata,
-            'players': players_data
-        }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"💾 Uniform data saved to {filename}")
+        if filename.endswith('.ndjson'):
+            player_stream = self.player_stream or PlayerStreamWriter(filename)
+            for player in players_data:
+                player_stream.write(player)
+            player_stream.close()
+            write_metadata(filename, metadata)
+            print(f"💾 Uniform data saved to {filename} (metadata in {metadata_path(filename)})")
+        else:
+            output_data = {
+                'metadata': metadata,
+                'players': players_data
+            }
+            
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(output_data, f, indent=2, ensure_ascii=False)
+            
+            print(f"💾 Uniform data saved to {filename}")
         print(f"📊 Total players: {len(players_data):,}")
     
     def run_uniform_expansion(self, input_file: str = "clash_royale_arenas_complete.json",
-                            output_file: str = "clash_royale_uniform.json",
+                            output_file: str = "clash_royale_uniform.ndjson",
                             total_quota: int = 50000,
                             strategy: str = "arena_based",
                             width: int = 3, 
                             max_depth: int = 10, 
-                            delay: float = 1.0):
-        """Run the complete uniform expansion pipeline"""
+                            rate: float = DEFAULT_REQUESTS_PER_SECOND,
+                            burst: int = DEFAULT_BURST,
+                            continuous: bool = False,
+                            journal_file: Optional[str] = None,
+                            resume: bool = False,
+                            battles_file: Optional[str] = None,
+                            archive_dir: Optional[str] = None):
+        """
+        Run the complete uniform expansion pipeline
+        continuous=True uses the work-queue engine instead of depth-by-depth BFS
+        Progress is journaled to journal_file (default: <output_file>.journal);
+        resume=True continues a crashed or interrupted run from that journal
+        battles_file enables fused crawl-and-collect: the battle logs of every
+        fetched profile are flattened and appended to this CSV during the crawl
+        archive_dir keeps every raw profile response (see raw_archive.py)
+        """
         print("🎯 Starting UNIFORM Clash Royale Network Expansion")
         print(f"📁 Input: {input_file}")
         print(f"💾 Output: {output_file}")
         
-        # Setup quota system
-        self.setup_quota_system(total_quota, strategy)
-        
-        # Load initial players
-        initial_players = self.load_initial_players(input_file)
-        
-        if not initial_players:
-            print("❌ No initial players found. Please check the input file.")
-            return
+        journal = CrawlJournal(journal_file or f"{output_file}.journal")
+        print(f"📓 Journal: {journal.path}")
+        configure_rate_limiter(rate, burst)
+        # Requests in flight adapt between 1 and max_workers
+        configure_concurrency_limiter(max_limit=self.max_workers)
+        
+        initial_players = []
+        resume_state = None
+        if resume:
+            if not journal.exists():
+                print(f"❌ Journal {journal.path} not found, nothing to resume")
+                return
+            journal_state = journal.load()
+            # The journaled run's quota setup wins over the command line
+            meta = journal_state['meta']
+            total_quota = meta.get('total_quota', total_quota)
+            strategy = meta.get('strategy', strategy)
+            self.setup_quota_system(total_quota, strategy)
+            resume_state = self.restore_frontier(journal_state, max_depth)
+            journal.open()
+        else:
+            if journal.exists():
+                print(f"❌ Journal {journal.path} already exists. Use --resume to continue it or delete it to start over.")
+                return
+            
+            # Setup quota system
+            self.setup_quota_system(total_quota, strategy)
+            
+            # Load initial players
+            initial_players = self.load_initial_players(input_file)
+            
+            if not initial_players:
+                print("❌ No initial players found. Please check the input file.")
+                return
+            
+            journal.open(fresh=True)
+            journal.write_meta(strategy, total_quota)
         
         # Expand network with uniform distribution
-        expanded_players = self.expand_player_network_uniform(
-            initial_players=initial_players,
-            width=width,
-            max_depth=max_depth,
-            delay=delay
-        )
+        self.journal = journal
+        if output_file.endswith('.ndjson'):
+            self.player_stream = PlayerStreamWriter(output_file, append=resume)
+        if battles_file:
+            print(f"⚔️  Storing battle logs in {battles_file}")
+            self.battle_writer = BattleLogWriter(battles_file)
+        if archive_dir:
+            print(f"🗄️  Archiving raw profiles in {archive_dir}")
+            self.archive = RawProfileArchive(archive_dir)
+        try:
+            expand = self.expand_player_network_continuous if continuous else self.expand_player_network_uniform
+            expanded_players = expand(
+                initial_players=initial_players,
+                width=width,
+                max_depth=max_depth,
+                resume_state=resume_state
+            )
+        finally:
+            journal.close()
+            self.journal = None
+            if self.battle_writer:
+                self.battle_writer.close()
+                print(f"⚔️  Stored {self.battle_writer.rows_written:,} battles in {battles_file}")
+                self.battle_writer = None
+            if self.archive:
+                self.archive.close()
+                self.archive = None
         
         # Save results
         self.save_expanded_data(expanded_players, output_file)
+        self.player_stream = None
         
         print(f"\n🎉 UNIFORM expansion completed successfully!")
-        print(f"📈 Network grew from {len(initial_players)} to {len(expanded_players):,} players")
+        if resume_state is None:
+            print(f"📈 Network grew from {len(initial_players)} to {len(expanded_players):,} players")
+        else:
+            print(f"📈 Network now has {len(expanded_players):,} players")
         print(f"📊 Quota achievement: {self.total_collected:,}/{total_quota:,} ({self.total_collected/total_quota*100:.1f}%)")
 
-def visualize_uniform_data(data_file: str = "clash_royale_uniform.json"):
+def visualize_uniform_data(data_file: str = "clash_royale_uniform.ndjson"):
     """Visualize the uniform player data"""
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        if 'players' in data:
-            players_data = data['players']
-            metadata = data.get('metadata', {})
-        else:
-            players_data = data
+        if data_file.endswith('.ndjson'):
+            with open(data_file, 'r', encoding='utf-8') as f:
+                players_data = [json.loads(line) for line in f if line.strip()]
             metadata = {}
+            if os.path.exists(metadata_path(data_file)):
+                with open(metadata_path(data_file), 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+        else:
+            with open(data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            if 'players' in data:
+                players_data = data['players']
+                metadata = data.get('metadata', {})
+            else:
+                players_data = data
+                metadata = {}
         
         print(f"📊 Visualizing uniform data: {len(players_data):,} players")
         if metadata:
@@ -527,8 +906,8 @@ def main():
     parser = argparse.ArgumentParser(description='Expand Clash Royale player network with uniform distribution')
     parser.add_argument('--input', default='clash_royale_arenas_complete.json', 
                        help='Input JSON file with initial players')
-    parser.add_argument('--output', default='clash_royale_uniform.json', 
-                       help='Output JSON file for expanded data')
+    parser.add_argument('--output', default='clash_royale_uniform.ndjson', 
+                       help='Output file for expanded data (.ndjson streams players during the crawl, .json writes one document at the end)')
     parser.add_argument('--quota', type=int, default=50000, 
                        help='Total number of players to collect')
     parser.add_argument('--strategy', choices=['arena_based', 'bucket_based', 'hybrid'], 
@@ -537,17 +916,34 @@ def main():
                        help='Number of random opponents to select per player')
     parser.add_argument('--max-depth', type=int, default=10, 
                        help='Maximum expansion depth')
-    parser.add_argument('--delay', type=float, default=1.0, 
-                       help='Delay between API calls in seconds')
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND, 
+                       help='Maximum API requests per second across all workers')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, 
+                       help='Maximum number of API requests sent back to back')
     parser.add_argument('--workers', type=int, default=5, 
-                       help='Number of parallel workers')
+                       help='Maximum number of parallel workers (requests in flight adapt below this)')
+    parser.add_argument('--api-url', default=None, 
+                       help='API base URL, e.g. a local mock_api_server.py (default: STATS_ROYALE_API_URL or the live API)')
+    parser.add_argument('--uniform-selection', action='store_true', 
+                       help='Pick opponents uniformly at random and expand the frontier in FIFO order')
+    parser.add_argument('--continuous', action='store_true', 
+                       help='Use a continuous work queue instead of depth-by-depth BFS')
+    parser.add_argument('--journal', default=None, 
+                       help='Crawl journal file (default: <output>.journal)')
+    parser.add_argument('--resume', action='store_true', 
+                       help='Resume an interrupted crawl from its journal')
+    parser.add_argument('--battles-output', default=None, 
+                       help='Also store the battle logs of every fetched profile in this CSV (fused crawl-and-collect)')
+    parser.add_argument('--archive', default=None, 
+                       help='Archive every raw profile response in this directory (rebuild battles with raw_archive.py)')
     parser.add_argument('--visualize', action='store_true', 
                        help='Run visualization after expansion')
     
     args = parser.parse_args()
     
     # Run uniform expansion
-    scraper = UniformClashRoyaleScraper(max_workers=args.workers)
+    scraper = UniformClashRoyaleScraper(max_workers=args.workers, quota_aware=not args.uniform_selection,
+                                        base_url=args.api_url)
     scraper.run_uniform_expansion(
         input_file=args.input,
         output_file=args.output,
@@ -555,7 +951,13 @@ def main():
         strategy=args.strategy,
         width=args.width,
         max_depth=args.max_depth,
-        delay=args.delay
+        rate=args.rate,
+        burst=args.burst,
+        continuous=args.continuous,
+        journal_file=args.journal,
+        resume=args.resume,
+        battles_file=args.battles_output,
+        archive_dir=args.archive
     )
     
     # Run visualization if requested
@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+from typing import List, Dict, Any
+
+
+def repair_last_line(path: str) -> int:
+    """
+    Make an NDJSON file end with a complete line before appending to it.
+    A last line torn by a crash is cut off; a complete record that only lacks
+    its newline gets one. Returns the number of bytes cut off.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        line_start = end
+        while line_start > 0:
+            step = min(4096, line_start)
+            f.seek(line_start - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline >= 0:
+                line_start = line_start - step + newline + 1
+                break
+            line_start -= step
+        if line_start == end:
+            return 0
+        f.seek(line_start)
+        try:
+            json.loads(f.read())
+        except ValueError:
+            f.truncate(line_start)
+            return end - line_start
+        f.write(b'\n')
+        return 0
+
+
+class CrawlJournal:
+    """
+    Append-only NDJSON journal of a crawl.
+
+    Record types:
+        meta      - quota strategy and total quota of the run
+        player    - a discovered player, with the trophies it was registered under
+        trophies  - trophy update for an already discovered player
+        expanded  - a player whose profile has been fetched and expanded
+
+    Quota counters are not written separately: replaying the `player` records
+    through register_player rebuilds them exactly. A partially written last
+    line (crash mid-write) is ignored on load and cut off before the journal
+    is appended to again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def open(self, fresh: bool = False):
+        """Open the journal for appending, truncating it first if fresh=True"""
+        if not fresh and repair_last_line(self.path):
+            print(f"✂️  Dropped the torn last line of {self.path}")
+        self.file = open(self.path, 'w' if fresh else 'a', encoding='utf-8')
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self.file:
+                self.file.write(line)
+                self.file.flush()
+
+    def write_meta(self, strategy: str, total_quota: int):
+        self._append({'type': 'meta', 'strategy': strategy, 'total_quota': total_quota})
+
+    def write_player(self, player: Dict[str, Any]):
+        self._append({'type': 'player', 'player': player})
+
+    def write_trophies(self, tag: str, trophies: int):
+        self._append({'type': 'trophies', 'tag': tag, 'trophies': trophies})
+
+    def write_expanded(self, tag: str):
+        self._append({'type': 'expanded', 'tag': tag})
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Replay the journal.
+        Returns meta, players in discovery order (with trophies as registered),
+        latest trophy updates and the set of expanded tags.
+        """
+        state = {'meta': {}, 'players': [], 'trophies': {}, 'expanded': set()}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write at the end of the file
+                    continue
+                record_type = record.get('type')
+                if record_type == 'player':
+                    state['players'].append(record['player'])
+                elif record_type == 'trophies':
+                    state['trophies'][record['tag']] = record['trophies']
+                elif record_type == 'expanded':
+                    state['expanded'].add(record['tag'])
+                elif record_type == 'meta':
+                    state['meta'] = record
+        return state
@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+from typing import Dict, Any
+
+from crawl_journal import repair_last_line
+
+
+def metadata_path(filename: str) -> str:
+    """Sidecar metadata file of an NDJSON player file: players.ndjson -> players.meta.json"""
+    return f"{os.path.splitext(filename)[0]}.meta.json"
+
+
+class PlayerStreamWriter:
+    """
+    Writes crawled players as newline-delimited JSON, one player per line,
+    as soon as they are final. Each tag is written once; when appending to
+    an existing file the tags already in it are skipped, and a last line
+    torn by a crash is cut off first.
+    """
+
+    def __init__(self, filename: str, append: bool = False):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.written = set()
+        if append and os.path.exists(filename):
+            if repair_last_line(filename):
+                print(f"✂️  Dropped the torn last line of {filename}")
+            with open(filename, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.written.add(json.loads(line)['tag'])
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+        self.file = open(filename, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, player: Dict[str, Any]):
+        line = json.dumps(player, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self.file is None or player['tag'] in self.written:
+                return
+            self.written.add(player['tag'])
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def write_metadata(filename: str, metadata: Dict[str, Any]):
+    with open(metadata_path(filename), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,50 @@
+import heapq
+import itertools
+import random
+from typing import Callable, Dict, Iterable, List, Sequence, Any
+
+
+class QuotaPriorityFrontier:
+    """
+    Crawl frontier that hands out the highest scoring player first.
+
+    Drop-in replacement for the deque used by the crawl engines (append,
+    popleft, len). Scores come from the quota system and only go down as
+    quotas fill, so stale heap entries are re-scored lazily when popped.
+    """
+
+    def __init__(self, score_fn: Callable[[Dict[str, Any]], float], players: Iterable[Dict[str, Any]] = ()):
+        self.score_fn = score_fn
+        self.heap = []
+        self.counter = itertools.count()
+        for player in players:
+            self.append(player)
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def append(self, player: Dict[str, Any]):
+        heapq.heappush(self.heap, (-self.score_fn(player), next(self.counter), player))
+
+    def popleft(self) -> Dict[str, Any]:
+        while True:
+            stored_score, seq, player = heapq.heappop(self.heap)
+            score = self.score_fn(player)
+            # Exact score, or still at least as good as the best stored score
+            if score == -stored_score or not self.heap or score >= -self.heap[0][0]:
+                return player
+            heapq.heappush(self.heap, (-score, seq, player))
+
+
+def weighted_sample(items: Sequence[Any], weights: Sequence[float], k: int) -> List[Any]:
+    """
+    Sample k items without replacement, proportionally to weights
+    (Efraimidis-Spirakis). Items with zero weight are only picked when
+    there are not enough weighted items.
+    """
+    keys = []
+    for item, weight in zip(items, weights):
+        key = random.random() ** (1.0 / weight) if weight > 0 else -random.random()
+        keys.append((key, item))
+    keys.sort(key=lambda pair: pair[0], reverse=True)
+    return [item for _, item in keys[:k]]
@@ -0,0 +1,38 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from bfs_par_v2 import UniformClashRoyaleScraper
+
+
+@pytest.mark.parametrize('continuous', [False, True])
+def test_every_profile_is_fetched_once(tmp_path, monkeypatch, continuous):
+    # A small pool of opponents, so the same tags turn up in many logs and in concurrent expansions
+    pool = [f'#P{i}' for i in range(150)]
+    calls = Counter()
+    lock = threading.Lock()
+
+    def get_player_data(self, tag):
+        with lock:
+            calls[tag] += 1
+        time.sleep(0.001)
+        rng = random.Random(tag)
+        return {'success': True, 'profile': {'maxscore': 5000},
+                'matches': [{'game_config': {'name': 'Ladder'}, 'timestamp': i,
+                             'players': [{'hashtag': tag},
+                                         {'hashtag': rng.choice(pool), 'name': 'x',
+                                          'score': rng.randint(3000, 7000)}]} for i in range(25)]}
+
+    monkeypatch.setattr(UniformClashRoyaleScraper, 'get_player_data', get_player_data)
+    seeds = tmp_path / 'seeds.json'
+    seeds.write_text(json.dumps([{'tag': tag, 'trophies': 5000, 'name': 's'} for tag in pool[:10]]))
+    UniformClashRoyaleScraper(max_workers=8).run_uniform_expansion(
+        input_file=str(seeds), output_file=str(tmp_path / 'players.ndjson'), total_quota=100_000, width=5,
+        max_depth=20, rate=10_000, burst=100, continuous=continuous)
+
+    assert len(calls) > 50
+    assert max(calls.values()) == 1
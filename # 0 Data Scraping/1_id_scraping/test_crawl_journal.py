@@ -0,0 +1,124 @@
+import json
+import random
+
+import pytest
+
+from bfs_par_v2 import UniformClashRoyaleScraper
+from crawl_journal import CrawlJournal, repair_last_line
+
+
+def tear(path, fragment='{"type": "player", "player": {"tag": "#TO'):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(fragment)
+
+
+def player_tags(state):
+    return [player['tag'] for player in state['players']]
+
+
+def test_resume_after_a_torn_line_keeps_the_next_record(tmp_path):
+    journal = CrawlJournal(str(tmp_path / 'crawl.journal'))
+    journal.open(fresh=True)
+    journal.write_player({'tag': '#A', 'trophies': 100})
+    journal.close()
+    tear(journal.path)
+
+    journal.open()
+    journal.write_player({'tag': '#B', 'trophies': 200})
+    journal.close()
+
+    assert player_tags(journal.load()) == ['#A', '#B']
+    with open(journal.path, encoding='utf-8') as f:
+        assert all(json.loads(line) for line in f)
+
+
+def test_complete_record_without_newline_is_kept(tmp_path):
+    path = tmp_path / 'crawl.journal'
+    path.write_text('{"type": "expanded", "tag": "#A"}\n{"type": "expanded", "tag": "#B"}', encoding='utf-8')
+    journal = CrawlJournal(str(path))
+    journal.open()
+    journal.write_expanded('#C')
+    journal.close()
+    assert journal.load()['expanded'] == {'#A', '#B', '#C'}
+
+
+@pytest.mark.parametrize('content, expected', [
+    (b'', b''),
+    (b'{"a": 1}\n', b'{"a": 1}\n'),
+    (b'{"type": "exp', b''),
+    (b'{"a": 1}\n{"a": 2}', b'{"a": 1}\n{"a": 2}\n'),
+    # Torn in the middle of a multi-byte character
+    (b'{"a": 1}\n{"b": "' + 'é'.encode('utf-8')[:1], b'{"a": 1}\n'),
+])
+def test_repair_last_line(tmp_path, content, expected):
+    path = tmp_path / 'file.ndjson'
+    path.write_bytes(content)
+    repair_last_line(str(path))
+    assert path.read_bytes() == expected
+
+
+def test_repair_last_line_of_a_long_torn_line(tmp_path):
+    path = tmp_path / 'file.ndjson'
+    complete = '{"tag": "#A"}\n'
+    path.write_text(complete + '{"tag": "' + 'x' * 10_000, encoding='utf-8')
+    assert repair_last_line(str(path)) == 10_009
+    assert path.read_text(encoding='utf-8') == complete
+
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-crawl"""
+
+
+def fake_profiles(crash_after=None):
+    calls = []
+
+    def get_player_data(self, tag):
+        calls.append(tag)
+        if crash_after is not None and len(calls) == crash_after:
+            raise Crash()
+        rng = random.Random(tag)
+        return {'success': True, 'profile': {'maxscore': rng.randint(3000, 7000)},
+                'matches': [{'game_config': {'name': 'Ladder'}, 'timestamp': i,
+                             'players': [{'hashtag': tag},
+                                         {'hashtag': f'#T{rng.randint(0, 10 ** 6)}', 'name': 'x',
+                                          'score': rng.randint(3000, 7000)}]} for i in range(10)]}
+
+    return get_player_data, calls
+
+
+@pytest.mark.parametrize('continuous', [False, True])
+def test_crawl_resumes_from_its_journal(tmp_path, monkeypatch, continuous):
+    seeds = tmp_path / 'seeds.json'
+    seeds.write_text(json.dumps([{'tag': f'#S{i}', 'trophies': 3000 + 100 * i, 'name': 's'} for i in range(20)]))
+    output = str(tmp_path / 'players.ndjson')
+    options = dict(input_file=str(seeds), output_file=output, total_quota=400, width=3, max_depth=6,
+                   rate=10_000, burst=100, continuous=continuous)
+
+    get_player_data, calls = fake_profiles(crash_after=40)
+    monkeypatch.setattr(UniformClashRoyaleScraper, 'get_player_data', get_player_data)
+    with pytest.raises(Crash):
+        UniformClashRoyaleScraper(max_workers=4).run_uniform_expansion(**options)
+    journal = CrawlJournal(f'{output}.journal')
+    before = journal.load()
+    assert before['meta']['total_quota'] == 400
+    expanded_before = before['expanded']
+    tear(journal.path)
+
+    get_player_data, resumed_calls = fake_profiles()
+    monkeypatch.setattr(UniformClashRoyaleScraper, 'get_player_data', get_player_data)
+    scraper = UniformClashRoyaleScraper(max_workers=4)
+    scraper.run_uniform_expansion(resume=True, **options)
+
+    after = journal.load()
+    tags = player_tags(after)
+    assert len(tags) == len(set(tags))
+    # Nothing journaled before the crash is lost, and players already expanded are not fetched again
+    assert set(player_tags(before)) <= set(tags)
+    assert not expanded_before & set(resumed_calls)
+    assert resumed_calls
+    # Quota counters rebuilt from the journal count every player exactly once
+    assert scraper.total_collected == len(tags)
+    with open(output, encoding='utf-8') as f:
+        streamed = [json.loads(line)['tag'] for line in f]
+    assert len(streamed) == len(set(streamed))
+    assert set(streamed) <= set(tags)
@@ -0,0 +1,50 @@
+import json
+
+from player_stream import PlayerStreamWriter, metadata_path
+
+
+def read_tags(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['tag'] for line in f]
+
+
+def test_each_tag_is_written_once(tmp_path):
+    path = str(tmp_path / 'players.ndjson')
+    writer = PlayerStreamWriter(path)
+    for tag in ['#A', '#B', '#A']:
+        writer.write({'tag': tag})
+    writer.close()
+    # Writes after close are dropped
+    writer.write({'tag': '#C'})
+    assert read_tags(path) == ['#A', '#B']
+
+
+def test_append_skips_tags_already_in_the_file(tmp_path):
+    path = str(tmp_path / 'players.ndjson')
+    writer = PlayerStreamWriter(path)
+    writer.write({'tag': '#A'})
+    writer.close()
+
+    writer = PlayerStreamWriter(path, append=True)
+    writer.write({'tag': '#A'})
+    writer.write({'tag': '#B'})
+    writer.close()
+    assert read_tags(path) == ['#A', '#B']
+
+
+def test_append_after_a_torn_line(tmp_path):
+    path = str(tmp_path / 'players.ndjson')
+    writer = PlayerStreamWriter(path)
+    writer.write({'tag': '#A'})
+    writer.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"tag": "#TO')
+
+    writer = PlayerStreamWriter(path, append=True)
+    writer.write({'tag': '#B'})
+    writer.close()
+    assert read_tags(path) == ['#A', '#B']
+
+
+def test_metadata_path():
+    assert metadata_path('out/players.ndjson') == 'out/players.meta.json'
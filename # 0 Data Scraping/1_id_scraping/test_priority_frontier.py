@@ -0,0 +1,56 @@
+import random
+from collections import Counter
+
+from priority_frontier import QuotaPriorityFrontier, weighted_sample
+
+
+def test_weighted_sample_without_replacement():
+    random.seed(1)
+    items = list("abcdef")
+    for k in range(len(items) + 2):
+        sample = weighted_sample(items, [1, 2, 3, 4, 5, 6], k)
+        assert len(sample) == min(k, len(items))
+        assert len(set(sample)) == len(sample)
+
+
+def test_weighted_sample_first_pick_is_proportional_to_weight():
+    random.seed(2)
+    weights = {"a": 1, "b": 3, "c": 6}
+    trials = 20_000
+    firsts = Counter(weighted_sample(list(weights), list(weights.values()), 1)[0] for _ in range(trials))
+    for item, weight in weights.items():
+        assert abs(firsts[item] / trials - weight / 10) < 0.02
+
+
+def test_weighted_sample_orders_heavier_items_first():
+    random.seed(3)
+    positions = {"light": 0, "heavy": 0}
+    for _ in range(2_000):
+        sample = weighted_sample(["light", "heavy"], [1, 9], 2)
+        positions["heavy"] += sample.index("heavy")
+        positions["light"] += sample.index("light")
+    assert positions["heavy"] < positions["light"]
+
+
+def test_weighted_sample_takes_zero_weights_last():
+    random.seed(4)
+    for _ in range(200):
+        sample = weighted_sample(["zero1", "low", "zero2", "high"], [0, 0.01, 0, 5], 4)
+        assert set(sample[:2]) == {"low", "high"}
+        assert set(sample[2:]) == {"zero1", "zero2"}
+        assert weighted_sample(["zero", "low"], [0, 0.01], 1) == ["low"]
+
+
+def test_frontier_pops_highest_score_first():
+    frontier = QuotaPriorityFrontier(lambda player: player["score"],
+                                     [{"tag": tag, "score": score} for tag, score in [("a", 1), ("b", 3), ("c", 2)]])
+    assert len(frontier) == 3
+    assert [frontier.popleft()["tag"] for _ in range(3)] == ["b", "c", "a"]
+
+
+def test_frontier_rescores_stale_entries():
+    scores = {"a": 5, "b": 4, "c": 1}
+    frontier = QuotaPriorityFrontier(lambda player: scores[player["tag"]], [{"tag": tag} for tag in scores])
+    # a's quota filled up after it was queued
+    scores["a"] = 0
+    assert [frontier.popleft()["tag"] for _ in range(3)] == ["b", "c", "a"]
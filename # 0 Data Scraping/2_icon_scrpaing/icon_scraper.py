@@ -1,8 +1,13 @@
 import requests
 import json
 import os
+import sys
 from urllib.parse import urljoin
 
+# Shared HTTP client lives next to the battle log collector
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "#1 Data Collection"))
+from http_client import PooledSession
+
 # Configuration
 GAMEDATA_URL = "https://cdn.statsroyale.com/gamedata-v4.json"
 BASE_ICON_URL = "https://cdn.statsroyale.com/v6/cards/full_b/"
@@ -39,15 +44,16 @@ def sanitize_filename(name):
     """Sanitize card names for use as filenames"""
     return name.replace(' ', '_').replace('.', '').replace('/', '_')
 
-def download_image(url, filename):
-    """Download an image from URL and save to filename"""
+def download_image(url, filename, session=None):
+    """Download an image from URL and save to filename, reusing session's connections when given"""
     try:
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        with open(filename, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        # Closing the streamed response hands its connection back to the pool, also on errors
+        with (session or requests).get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+
+            with open(filename, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
         print(f"✓ Downloaded: {filename}")
         return True
     except requests.exceptions.RequestException as e:
@@ -63,10 +69,13 @@ def convert_to_evo_id(card_id):
 
 def main():
     print("Fetching game data...")
+    # Every icon comes from the same CDN host, so one kept-alive connection serves them all.
+    # The pool does not block: a connection that is somehow not returned costs a new one, not a hang.
+    session = PooledSession(pool_size=1, pool_block=False, timeout=30)
     
     try:
         # Download game data
-        response = requests.get(GAMEDATA_URL, timeout=30)
+        response = session.get(GAMEDATA_URL)
         response.raise_for_status()
         game_data = response.json()
         
@@ -107,7 +116,7 @@ def main():
             normal_filename = f"card_icons/{sanitize_filename(english_name)}.webp"
             normal_url = f"{BASE_ICON_URL}{card_id}.webp"
             
-            if download_image(normal_url, normal_filename):
+            if download_image(normal_url, normal_filename, session):
                 downloaded_count += 1
             
             # Download evolution icon if available
@@ -118,7 +127,7 @@ def main():
                 
                 print(f"Evolution URL: {evo_url}")
                 
-                if download_image(evo_url, evo_filename):
+                if download_image(evo_url, evo_filename, session):
                     evo_downloaded_count += 1
         
         print(f"\nDownload Summary:")
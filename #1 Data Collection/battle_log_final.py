@@ -1,9 +1,26 @@
 import pandas as pd
 import requests
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
+import itertools
+import os
+import queue
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, List, Dict
 import time
+from rate_limiter import configure_rate_limiter, get_rate_limiter, COLLECTOR_REQUESTS_PER_SECOND, DEFAULT_BURST
+from concurrency import configure_concurrency_limiter, get_concurrency_limiter
+from http_client import configure_http_client, get_http_session
+from retry import RETRYABLE_ERRORS, RetryQueue, backoff_delay, classify_error
+from battle_schema import get_flattener
+from replay_index import ReplayIndex
+from raw_archive import RawProfileArchive
+
+# Set STATS_ROYALE_API_URL to point the fetchers at another server, e.g. mock_api_server.py
+API_BASE_URL = os.environ.get(
+    "STATS_ROYALE_API_URL", "https://stats-royale-api-js-beta-z2msk5bu3q-uk.a.run.app"
+).rstrip("/")
 
 
 def flatten_dict(d, parent_key="", sep="_"):
@@ -53,34 +70,176 @@ def flatter_battle_log(dict_battle: dict) -> dict:
     return new_dict
 
 
+class BattleLogWriter:
+    """
+    Thread-safe streaming writer for flattened battle rows.
+
+    Frames are buffered and appended to the CSV once `chunk_size` rows are
+    waiting, so memory is bounded by the chunk size. New columns are only
+    ever added at the end of the header, so rows written before a column
+    appeared are a prefix of the final layout; on close the header is
+    rewritten once if the schema grew. Appends to an existing CSV unless
+    append=False. `columns` seeds the header, so a run that stores no rows
+    still leaves a readable CSV.
+    """
+
+    def __init__(self, filename: str, chunk_size: int = 5000, append: bool = True,
+                 columns: List[str] = None): # type: ignore
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.frames = []
+        self.buffered_rows = 0
+        self.columns = []
+        self.header_written = False
+        self.header_stale = False
+        self.rows_written = 0
+        if not append and os.path.exists(filename):
+            os.remove(filename)
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            self.columns = list(pd.read_csv(filename, nrows=0).columns)
+            self.header_written = True
+        elif columns:
+            self.columns = list(columns)
+
+    def write_matches(self, matches: List[Dict]):
+        """Flatten and store the matches of one profile response"""
+        self.write_rows([flatter_battle_log(match) for match in matches])
+
+    def write_rows(self, rows: List[Dict]):
+        if rows:
+            self.write_frame(pd.DataFrame(rows))
+
+    def write_frame(self, frame: pd.DataFrame):
+        with self.lock:
+            self.frames.append(frame)
+            self.buffered_rows += len(frame)
+            if self.buffered_rows >= self.chunk_size:
+                self._flush()
+
+    def discard(self):
+        """Drop the rows not written yet"""
+        with self.lock:
+            self.frames = []
+            self.buffered_rows = 0
+
+    def flush(self):
+        """Write the buffered rows now, e.g. before recording them as stored"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.frames:
+            return
+        chunk = pd.concat(self.frames, ignore_index=True, sort=False)
+        self.frames = []
+        self.buffered_rows = 0
+        known = set(self.columns)
+        new_columns = [col for col in chunk.columns if col not in known]
+        if new_columns:
+            self.columns.extend(new_columns)
+            if self.header_written:
+                self.header_stale = True
+        chunk = chunk.reindex(columns=self.columns)
+        chunk.to_csv(self.filename, mode="a", header=not self.header_written, index=False)
+        self.header_written = True
+        self.rows_written += len(chunk)
+
+    def _rewrite_header(self):
+        tmp_filename = f"{self.filename}.tmp"
+        with open(self.filename, "r", encoding="utf-8", newline="") as src, \
+                open(tmp_filename, "w", encoding="utf-8", newline="") as dst:
+            src.readline()
+            pd.DataFrame(columns=self.columns).to_csv(dst, index=False)
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_filename, self.filename)
+        self.header_stale = False
+
+    def close(self):
+        """Write the remaining rows and reconcile the header"""
+        with self.lock:
+            self._flush()
+            if not self.header_written and self.columns:
+                pd.DataFrame(columns=self.columns).to_csv(self.filename, index=False)
+                self.header_written = True
+            if self.header_stale:
+                self._rewrite_header()
+
+
+def fetch_raw_matches(
+    id: str,
+    url: str = f"{API_BASE_URL}/profile/",
+    headers: Dict = None, # type: ignore
+    max_retries: int = 3,
+    archive: RawProfileArchive = None, # type: ignore
+):
+    """
+    Fetch the raw match list of a single player
+    Timeouts, connection errors, 429s and 5xx responses are retried up to
+    max_retries times with exponential backoff and jitter.
+    Status is "success", "not_found" (404, permanent) or "failed".
+    Successful responses are also appended to archive when given.
+    """
+    request_url = f"{url}{id}"
+    for attempt in range(max_retries + 1):
+        try:
+            print(f"Fetching: {request_url}")
+            # The token is taken before the slot, so the slot only times the request itself
+            get_rate_limiter().acquire()
+            with get_concurrency_limiter().slot():
+                response = get_http_session().get(request_url, headers=headers)
+                response.raise_for_status()
+            # if response.status_code == 200:
+            #     matches = response.json()['matches']
+            #     flattened_matches = [flatten_dict(match) for match in matches]
+            #     return {"id": id, "flat_matches": flattened_matches, "status": "success"}
+            data = response.json()
+            if archive is not None:
+                archive.write(id, data)
+            return id, "success", data["matches"]
+
+        except Exception as e:
+            error_kind = classify_error(e)
+            if error_kind in RETRYABLE_ERRORS and attempt < max_retries:
+                delay = backoff_delay(attempt, e)
+                print(f"Retrying {id} after {error_kind} error in {delay:.1f}s ({attempt + 1}/{max_retries})")
+                time.sleep(delay)
+                continue
+            print("error", error_kind, e)
+            status = "not_found" if error_kind == "not_found" else "failed"
+            return id, status, None
+
+
+def flatten_matches(matches: List[Dict], columns: tuple = None) -> pd.DataFrame: # type: ignore
+    """
+    Flatten a raw match list into one row per match
+    With columns, only those are extracted by the compiled flattener
+    (e.g. PREPROCESSOR_COLUMNS), otherwise every field is kept
+    """
+    if columns:
+        return get_flattener(tuple(columns)).flatten(matches)
+    return pd.DataFrame([flatter_battle_log(match) for match in matches])
+
+
 def fetch_api_data(
     id: str,
-    url: str = "https://stats-royale-api-js-beta-z2msk5bu3q-uk.a.run.app/profile/",
+    url: str = f"{API_BASE_URL}/profile/",
     headers: Dict = None, # type: ignore # type: ignore
+    max_retries: int = 3,
 ) -> Dict:
-    """Fetch data from a single API endpoint"""
-    try:
-        request_url = f"{url}{id}"
-        print(f"Fetching: {request_url}")
-        response = requests.get(request_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        # if response.status_code == 200:
-        #     matches = response.json()['matches']
-        #     flattened_matches = [flatten_dict(match) for match in matches]
-        #     return {"id": id, "flat_matches": flattened_matches, "status": "success"}
-        matches = response.json()["matches"]
-        flattened_matches = [flatter_battle_log(match) for match in matches]
-        df_matches = pd.DataFrame(flattened_matches)
-
-        return id, "success", df_matches # type: ignore
-
-    except Exception as e:
-        print("error", e)
-        return id, "failed", None # type: ignore
+    """
+    Fetch data from a single API endpoint and flatten it
+    Status is "success", "not_found" (404, permanent) or "failed".
+    """
+    id, status, matches = fetch_raw_matches(id, url, headers, max_retries)
+    if status != "success":
+        return id, status, None # type: ignore
+    return id, status, flatten_matches(matches) # type: ignore
 
 
 def parallel_api_calls(
-    ids: List[str], max_workers: int = 5, headers: Dict = None # type: ignore
+    ids: List[str], max_workers: int = 5, headers: Dict = None, # type: ignore
+    writer: BattleLogWriter = None, # type: ignore
 ) -> pd.DataFrame:
     """
     Make parallel API calls
@@ -89,18 +248,19 @@ def parallel_api_calls(
         urls: List of API URLs to call
         max_workers: Number of parallel workers (default: 5)
         headers: Optional headers for API requests
+        writer: Optional BattleLogWriter; results are streamed to it in
+            chunks instead of being kept in memory
 
     Returns:
-        List of results from all API calls
+        DataFrame of all results (None when streaming to a writer) and the failed IDs
     """
-    df = pd.DataFrame()
     completed = 0
     failed_id = []
+    frames = []
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Submit all tasks
         future_to_id = {executor.submit(fetch_api_data, id): id for id in ids}
-        results = pd.DataFrame()
         # Process completed tasks
         for future in as_completed(future_to_id):
             result = future.result()
@@ -108,67 +268,414 @@ def parallel_api_calls(
                 print(f"Failed to fetch data for ID: {future_to_id[future]}")
                 failed_id.append(future_to_id[future])
                 continue
+            if result[1] == "not_found":
+                print(f"Player not found, not retrying: {future_to_id[future]}")
+                continue
 
-            results = pd.concat([results, result[2]], ignore_index=True)
-            time.sleep(0.2)  # Slight delay to avoid overwhelming the server
+            if writer is not None:
+                writer.write_frame(result[2])
+            else:
+                frames.append(result[2])
             print(f"Completed: {result[0]} - Status: {result[1]}")
             completed += 1
             if completed % 10 == 0 or completed == len(ids):
-                print(f"Progress: {completed}/{len(ids)} completed")
-    df = pd.DataFrame(results)
+                print(
+                    f"Progress: {completed}/{len(ids)} completed - "
+                    f"concurrency {get_concurrency_limiter().current_limit}"
+                )
+    print(get_concurrency_limiter().report())
+    if writer is not None:
+        return None, failed_id # type: ignore
+    # One concat at the end keeps this linear in the number of rows
+    df = pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
     return df, failed_id # type: ignore
 
 
+class StageStats:
+    """Items handled and time spent by the workers of one pipeline stage"""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, busy: float, blocked: float = 0.0, items: int = 1):
+        with self.lock:
+            self.items += items
+            self.busy += busy
+            self.blocked += blocked
+
+    def summary(self, elapsed: float) -> str:
+        """
+        Throughput plus the share of worker time spent working and blocked on
+        a full output queue. The busiest stage with nothing downstream
+        blocking it is the bottleneck.
+        """
+        capacity = max(elapsed, 1e-9) * self.workers
+        return (f"{self.name}: {self.items} ({self.items / max(elapsed, 1e-9):.1f}/s), "
+                f"busy {self.busy / capacity:.0%}, blocked {self.blocked / capacity:.0%}")
+
+
+_STOP = object()
+
+
+class PipelineInterrupted(KeyboardInterrupt):
+    """
+    Ctrl-C during pipelined_api_calls, raised once the requests in flight
+    were finished and every battle they fetched reached the writer
+    """
+
+    def __init__(self, failed_ids: List[str]):
+        super().__init__()
+        self.failed_ids = failed_ids
+
+
+def pipelined_api_calls(
+    ids: List[str],
+    writer: BattleLogWriter,
+    max_workers: int = 30,
+    flatten_workers: int = 2,
+    queue_size: int = 64,
+    headers: Dict = None, # type: ignore
+    use_processes: bool = False,
+    report_every: float = 10.0,
+    columns: tuple = None, # type: ignore
+    flatten_batch: int = 50,
+    replay_index: ReplayIndex = None, # type: ignore
+    archive: RawProfileArchive = None, # type: ignore
+    label: str = "Pipeline",
+    on_fetched: Callable[[str, List[Dict], int], None] = None, # type: ignore
+) -> List[str]:
+    """
+    Fetch, flatten and write battle logs as three stages connected by bounded queues
+
+        fetch (max_workers I/O threads) -> raw matches -> flatten (flatten_workers)
+        -> DataFrames -> write (a single thread feeding writer)
+
+    A full queue blocks the stage in front of it, so a slow disk or parser
+    slows the fetchers down instead of piling up responses in memory.
+    With use_processes=True the flatten workers hand the work to a process
+    pool so flattening runs outside the GIL.
+    Each flatten worker takes up to flatten_batch queued responses at a time
+    and turns them into one DataFrame; with columns only that projection is
+    extracted (see battle_schema.py).
+    With a replay_index, fetchers drop battles older than the player's
+    high-water mark and flatten workers drop replayTags already stored.
+    With an archive, every raw response is kept there as fetched.
+    Reports are prefixed with label, e.g. the shard name.
+    on_fetched(player_id, matches, new_matches) is called from the fetch
+    workers for every successful fetch, new_matches being the number left
+    after the high-water mark.
+    Per-stage throughput is printed every report_every seconds and at the end.
+    An unexpected error while handling a player's log or a flatten batch is
+    reported, its claims are released and its players are returned with the
+    failed IDs; the stage keeps draining its queue.
+    On Ctrl-C no new IDs are fetched, the requests in flight are finished and
+    written, and PipelineInterrupted is raised.
+
+    Returns:
+        The IDs that failed after retries
+    """
+    raw_queue = queue.Queue(maxsize=queue_size)
+    frame_queue = queue.Queue(maxsize=queue_size)
+    stats = {
+        "fetch": StageStats("fetch", max_workers),
+        "flatten": StageStats("flatten", flatten_workers),
+        "write": StageStats("write", 1),
+    }
+    id_iter = iter(ids)
+    id_lock = threading.Lock()
+    failed_ids = []
+    write_errors = []
+    # Unexpected errors of the fetch and flatten workers; the players concerned are queued for retry
+    worker_errors = []
+    process_pool = ProcessPoolExecutor(max_workers=flatten_workers) if use_processes else None
+    stopping = threading.Event()
+
+    def next_id():
+        if stopping.is_set():
+            return None
+        with id_lock:
+            return next(id_iter, None)
+
+    def fetch_worker():
+        while (player_id := next_id()) is not None:
+            start = time.monotonic()
+            fetched = None
+            try:
+                _, status, matches = fetch_raw_matches(player_id, headers=headers, archive=archive)
+                fetched = time.monotonic()
+                if status == "failed":
+                    print(f"Failed to fetch data for ID: {player_id}")
+                    failed_ids.append(player_id)
+                elif status == "not_found":
+                    print(f"Player not found, not retrying: {player_id}")
+                else:
+                    fresh = matches
+                    if replay_index is not None:
+                        fresh = replay_index.newer_than_mark(player_id, matches)
+                    if on_fetched is not None:
+                        on_fetched(player_id, matches, len(fresh))
+                    if fresh:
+                        raw_queue.put((player_id, fresh))
+            except Exception as e:
+                # Keep fetching: a dead fetcher would silently shrink the pool
+                print(f"Error processing the battle log of {player_id}, queued for retry:", e)
+                worker_errors.append(e)
+                if replay_index is not None:
+                    replay_index.release_matches([], [player_id])
+                failed_ids.append(player_id)
+            if fetched is None:
+                fetched = time.monotonic()
+            stats["fetch"].add(fetched - start, time.monotonic() - fetched)
+
+    def flatten_worker():
+        stopped = False
+        while not stopped:
+            batch = [raw_queue.get()]
+            # Stop at a sentinel so every worker gets its own
+            while len(batch) < flatten_batch and batch[-1] is not _STOP and not raw_queue.empty():
+                batch.append(raw_queue.get())
+            if batch[-1] is _STOP:
+                stopped = True
+                batch.pop()
+            if not batch:
+                continue
+            start = time.monotonic()
+            players = [player_id for player_id, _ in batch]
+            claimed = []
+            try:
+                matches = [match for _, response in batch for match in response]
+                if replay_index is not None:
+                    claimed = matches = replay_index.claim(matches)
+                    if not matches:
+                        stats["flatten"].add(time.monotonic() - start, items=len(batch))
+                        continue
+                if process_pool is not None:
+                    frame = process_pool.submit(flatten_matches, matches, columns).result()
+                else:
+                    frame = flatten_matches(matches, columns)
+            except Exception as e:
+                # Not written: release the battles so the index does not count them as stored,
+                # and queue the players for the next pass. The worker keeps draining the queue,
+                # so the fetchers never block on it and every sentinel is still consumed.
+                print(f"Could not flatten the battle logs of {len(players)} players, queued for retry:", e)
+                worker_errors.append(e)
+                if replay_index is not None:
+                    replay_index.release_matches(claimed, players)
+                failed_ids.extend(players)
+                continue
+            flattened = time.monotonic()
+            frame_queue.put(frame)
+            stats["flatten"].add(flattened - start, time.monotonic() - flattened, items=len(batch))
+
+    def write_worker():
+        while (frame := frame_queue.get()) is not _STOP:
+            if write_errors:
+                # Keep draining so the upstream stages never block forever
+                continue
+            start = time.monotonic()
+            try:
+                writer.write_frame(frame)
+            except Exception as e:
+                write_errors.append(e)
+            stats["write"].add(time.monotonic() - start)
+
+    def report(elapsed: float):
+        print(
+            f"{label} {elapsed:.0f}s | " + " | ".join(s.summary(elapsed) for s in stats.values())
+            + f" | queued raw {raw_queue.qsize()}, frames {frame_queue.qsize()}"
+            + f" | concurrency {get_concurrency_limiter().current_limit}"
+        )
+
+    start_time = time.monotonic()
+    fetchers = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(max_workers)]
+    flatteners = [threading.Thread(target=flatten_worker, daemon=True) for _ in range(flatten_workers)]
+    write_thread = threading.Thread(target=write_worker, daemon=True)
+    for thread in fetchers + flatteners + [write_thread]:
+        thread.start()
+
+    interrupted = False
+    try:
+        next_report = start_time + report_every
+        try:
+            for thread in fetchers:
+                while thread.is_alive():
+                    thread.join(timeout=max(0.0, next_report - time.monotonic()))
+                    if time.monotonic() >= next_report:
+                        report(time.monotonic() - start_time)
+                        next_report += report_every
+        except KeyboardInterrupt:
+            # Stop handing out IDs; what is in flight still goes through flatten and write
+            print(f"{label} interrupted, finishing the requests in flight")
+            interrupted = True
+            stopping.set()
+            for thread in fetchers:
+                thread.join()
+        for _ in flatteners:
+            raw_queue.put(_STOP)
+        for thread in flatteners:
+            thread.join()
+        frame_queue.put(_STOP)
+        write_thread.join()
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown()
+
+    report(time.monotonic() - start_time)
+    print(get_concurrency_limiter().report())
+    if replay_index is not None:
+        print(replay_index.report())
+    if worker_errors:
+        print(f"{label}: {len(worker_errors)} fetched or flattened batches failed unexpectedly "
+              f"(first: {worker_errors[0]!r}), their players are queued for retry")
+    if write_errors:
+        raise write_errors[0]
+    if interrupted:
+        raise PipelineInterrupted(failed_ids)
+    return failed_ids
+
+
 def save_to_csv(data: pd.DataFrame, filename: str):
     """Save DataFrame to CSV file"""
     data.to_csv(filename, index=False)
     print(f"Data saved to {filename}")
 
 
+def iter_players(json_file_path: str, index_tuple: tuple = None): # type: ignore
+    """
+    Yield the player records of a crawler output file, optionally only the
+    [start, stop) index range.
+    NDJSON files are streamed: lines before the range are skipped without
+    being parsed and reading stops at the end of the range. Unreadable lines,
+    such as one torn by an interrupted crawl, are reported and skipped.
+    """
+    start, stop = index_tuple if index_tuple else (0, None)
+    if json_file_path.endswith(".ndjson"):
+        with open(json_file_path, "r", encoding="utf-8", errors="ignore") as file:
+            for line_number, line in enumerate(itertools.islice(file, start, stop), start + 1):
+                if not line.strip():
+                    continue
+                try:
+                    player = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Skipping unreadable line {line_number} of {json_file_path} (torn write?)")
+                    continue
+                yield player
+    else:
+        with open(json_file_path, "r", errors="ignore") as file:
+            data = json.load(file)
+        yield from data["players"][start:stop]
+
+
 def battle_log_from_json(
     json_file_path: str,
     csv_file_path: str,
     index_tuple: tuple = None, # type: ignore
     csv_file_path_failed: str = "failed_ids.csv",
+    requests_per_second: float = COLLECTOR_REQUESTS_PER_SECOND, # type: ignore
+    burst: int = DEFAULT_BURST,
+    skip_collected: bool = True,
+    max_workers: int = 30,
+    drain_failed: bool = True,
+    chunk_size: int = 5000,
+    flatten_workers: int = 2,
+    use_processes: bool = False,
+    columns: tuple = None, # type: ignore
+    replay_index_file: str = "replay_index.bin",
+    incremental: bool = True,
+    archive_dir: str = None, # type: ignore
 ):
-    """Load battle log data from a JSON file and save to CSV"""
-    with open(json_file_path, "r", errors="ignore") as file:
-        data = json.load(file)
-
-    players_json_unpacked = data["players"]
-    # players_json_unpacked is a list of dicts with each dict with details of players with id being with the key "tag"
-
-    players_json_unpacked_ids = [player["tag"] for player in players_json_unpacked]
-    if index_tuple:
-        players_json_unpacked_ids = players_json_unpacked_ids[
-            index_tuple[0] : index_tuple[1]
+    """
+    Load battle log data from a crawler output file (.json or .ndjson) and save to CSV
+    Players whose battles were already stored by a fused crawl
+    (battles_collected) are skipped unless skip_collected=False
+    csv_file_path_failed is a durable retry queue: tags that still fail after
+    retries are queued there and, with drain_failed=True, the next pass
+    fetches the queued tags again along with its own range
+    Battles are written to csv_file_path in chunks of chunk_size rows
+    Fetching, flattening (flatten_workers, optionally in processes) and
+    writing run as separate pipeline stages, see pipelined_api_calls
+    columns=PREPROCESSOR_COLUMNS stores only the columns the preprocessor
+    keeps, extracted by the much faster compiled flattener
+    With incremental=True only battles not stored by an earlier run are
+    written: replay_index_file keeps the stored replayTags and every
+    player's newest battle timestamp (see replay_index.py). The new battles
+    are appended to csv_file_path, so the battles the index already counts
+    stay there; without incremental the CSV is overwritten
+    With archive_dir the raw responses are archived there, so the CSV can be
+    rebuilt later with raw_archive.py instead of fetching again
+    Requests are not throttled unless requests_per_second is given; the
+    load on the API is then bounded by max_workers alone
+    """
+    configure_rate_limiter(requests_per_second, burst)
+    # Requests in flight adapt between 1 and max_workers, over as many kept-alive connections
+    configure_concurrency_limiter(max_limit=max_workers)
+    configure_http_client(pool_size=max_workers)
+    if not index_tuple:
+        index_tuple = (0, 100)  # Limit to first 100 IDs for testing
+
+    # list of dicts with details of players with id being with the key "tag"
+    players_json_unpacked = list(iter_players(json_file_path, index_tuple))
+
+    if skip_collected:
+        collected = sum(1 for player in players_json_unpacked if player.get("battles_collected"))
+        if collected:
+            print(f"Skipping {collected} players already collected during the crawl")
+        players_json_unpacked = [
+            player for player in players_json_unpacked if not player.get("battles_collected")
         ]
-    else:
-        print(len(players_json_unpacked_ids))
-        players_json_unpacked_ids = players_json_unpacked_ids[
-            :100
-        ]  # Limit to first 100 IDs for testing
-
-    # Make parallel API calls
-    results_df, failed_ids = parallel_api_calls(
-        players_json_unpacked_ids, max_workers=30
-    )
-    # Save to CSV
+    players_json_unpacked_ids = [player["tag"] for player in players_json_unpacked]
 
-    save_to_csv(results_df, csv_file_path) # type: ignore
+    retry_queue = RetryQueue(csv_file_path_failed)
+    if drain_failed:
+        own_ids = set(players_json_unpacked_ids)
+        queued_ids = [tag for tag in retry_queue.load() if tag not in own_ids]
+        if queued_ids:
+            print(f"Retrying {len(queued_ids)} previously failed IDs from {csv_file_path_failed}")
+            players_json_unpacked_ids += queued_ids
+
+    replay_index = ReplayIndex(replay_index_file) if incremental else None
+    if replay_index is not None and len(replay_index):
+        print(f"Skipping battles already stored: {len(replay_index):,} in {replay_index_file}")
+        if not os.path.exists(csv_file_path):
+            print(f"Warning: {csv_file_path} does not exist, but {replay_index_file} still counts its battles "
+                  f"as stored; delete the index to collect them again")
+
+    # Fetch, flatten and write as pipeline stages, streaming the battles to the CSV in chunks.
+    # A projection seeds the header, so a pass storing no rows still leaves a readable CSV;
+    # a full flatten keeps the column order of the battles themselves
+    writer = BattleLogWriter(csv_file_path, chunk_size=chunk_size, append=incremental,
+                             columns=list(columns) if columns else None) # type: ignore
+    archive = RawProfileArchive(archive_dir) if archive_dir else None
+    try:
+        failed_ids = pipelined_api_calls(
+            players_json_unpacked_ids, writer, max_workers=max_workers,
+            flatten_workers=flatten_workers, use_processes=use_processes, columns=columns,
+            replay_index=replay_index, archive=archive,
+        )
+    finally:
+        # An exception here (or from the pipeline) skips the index save below
+        writer.close()
+        if archive is not None:
+            archive.close()
+    print(f"Data saved to {csv_file_path} ({writer.rows_written} new rows)")
+    # Only once the battles are on disk
+    if replay_index is not None:
+        replay_index.save()
 
     if failed_ids:
         print(f"Failed to fetch data for IDs: {failed_ids}")
-    # Append new failed ids to file, avoid writing duplicates already present
-        try:
-            with open(csv_file_path_failed, "a+", encoding="utf-8") as f:
-                f.seek(0)
-                existing = {line.strip() for line in f if line.strip()}
-                to_write = [str(i) for i in failed_ids if str(i) not in existing] # type: ignore
-                if to_write:
-                    f.write("\n".join(to_write) + "\n")
-        except Exception as e:
-            print("Could not write failed ids:", e)
+    # Queue failed ids for the next pass and drop the ones that succeeded
+    try:
+        dead_ids = retry_queue.update(players_json_unpacked_ids, failed_ids)
+        if dead_ids:
+            print(f"Giving up on {len(dead_ids)} IDs, moved to {retry_queue.dead_path}")
+    except Exception as e:
+        print("Could not write failed ids:", e)
 
 
 if __name__ == "__main__":
@@ -185,5 +692,5 @@ if __name__ == "__main__":
 
     # # Save to CSV
     # save_to_csv(results_df, "battle_log_data_neo.csv")
-    json_path = r"./scraped_ids/clash_royale_uniform.json"
+    json_path = r"./scraped_ids/clash_royale_uniform.ndjson"
     battle_log_from_json(json_path, "battle_log_full_batch_trail.csv")
@@ -0,0 +1,101 @@
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+# Columns battle_log_data_preprocessor.py keeps, in the same order
+PREPROCESSOR_COLUMNS = [
+    "replayTag", "arena", "game_config_name", "players_0_avgManaCost", "players_0_hashtag", "players_0_score",
+    "players_0_stars", "players_0_winner", "players_0_elixirLeaked", "players_0_supportCards",
+    "players_0_spells", "players_0_kingTowerHitPoints", "players_0_princessTowersHitPoints",
+    "players_1_avgManaCost", "players_1_hashtag", "players_1_score", "players_1_stars",
+    "players_1_winner", "players_1_elixirLeaked", "players_1_spells", "players_1_supportCards",
+    "players_1_kingTowerHitPoints", "players_1_princessTowersHitPoints",
+]
+
+# Same nesting rules as flatter_battle_log: dicts are prefixed with their key,
+# lists of dicts with their key and index
+DICT_KEYS = ("game_config",)
+LIST_KEYS = ("players",)
+
+
+def compile_column(column: str) -> Tuple:
+    """
+    Path of a flattened column name in a raw match:
+    "arena" -> ("arena",), "game_config_name" -> ("game_config", "name"),
+    "players_1_spells" -> ("players", 1, "spells")
+    """
+    for key in DICT_KEYS:
+        if column.startswith(f"{key}_"):
+            return (key, column[len(key) + 1:])
+    for key in LIST_KEYS:
+        if column.startswith(f"{key}_"):
+            index, _, field = column[len(key) + 1:].partition("_")
+            if index.isdigit() and field:
+                return (key, int(index), field)
+    return (column,)
+
+
+class CompiledBattleFlattener:
+    """
+    Flattens raw matches straight into the requested columns.
+
+    The column names are compiled once into lookups grouped by where they
+    live in a match (top level, a nested dict, a player), so a match costs
+    one dict lookup per requested field. Rows are written into preallocated
+    column lists and a whole batch of matches becomes one DataFrame. Values
+    are the same as flatter_battle_log's for those columns; missing fields
+    are None.
+    """
+
+    def __init__(self, columns: Sequence[str] = PREPROCESSOR_COLUMNS):
+        self.columns = list(columns)
+        # (field, column position) lists per location in the match
+        self.top_fields: List[Tuple[str, int]] = []
+        self.dict_fields: Dict[str, List[Tuple[str, int]]] = {}
+        self.player_fields: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+        for position, column in enumerate(self.columns):
+            path = compile_column(column)
+            if len(path) == 1:
+                self.top_fields.append((path[0], position))
+            elif len(path) == 2:
+                self.dict_fields.setdefault(path[0], []).append((path[1], position))
+            else:
+                self.player_fields.setdefault((path[0], path[1]), []).append((path[2], position))
+
+    def flatten(self, matches: Sequence[Dict]) -> pd.DataFrame:
+        """One row per match, only the compiled columns"""
+        n = len(matches)
+        arrays = [[None] * n for _ in self.columns]
+        top_fields = [(field, arrays[position]) for field, position in self.top_fields]
+        dict_fields = [
+            (key, [(field, arrays[position]) for field, position in fields])
+            for key, fields in self.dict_fields.items()
+        ]
+        player_fields = [
+            (key, index, [(field, arrays[position]) for field, position in fields])
+            for (key, index), fields in self.player_fields.items()
+        ]
+
+        for row, match in enumerate(matches):
+            for field, array in top_fields:
+                array[row] = match.get(field)
+            for key, fields in dict_fields:
+                nested = match.get(key)
+                if nested:
+                    for field, array in fields:
+                        array[row] = nested.get(field)
+            for key, index, fields in player_fields:
+                items = match.get(key)
+                if items and len(items) > index:
+                    item = items[index]
+                    for field, array in fields:
+                        array[row] = item.get(field)
+
+        return pd.DataFrame(dict(zip(self.columns, arrays)), columns=self.columns)
+
+
+@lru_cache(maxsize=None)
+def get_flattener(columns: Tuple[str, ...]) -> CompiledBattleFlattener:
+    """Compiled flattener for a column projection, built once per process"""
+    return CompiledBattleFlattener(columns)
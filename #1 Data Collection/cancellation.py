@@ -0,0 +1,54 @@
+import threading
+from typing import Callable, List
+
+
+class Cancelled(Exception):
+    """Raised by waits and fetches that gave up because their token was cancelled"""
+
+
+class CancellationToken:
+    """
+    Shared flag telling workers to stop as soon as they can.
+
+    Workers check it before waiting and before fetching, and waits on the
+    token return early when it is cancelled. Callbacks registered with
+    `on_cancel` run once, on the cancelling thread, e.g. to abort in-flight
+    requests or wake threads blocked elsewhere.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print("Cancellation callback failed:", e)
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run callback when the token is cancelled (right away if it already is)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep for up to seconds; True if the token was cancelled meanwhile"""
+        return self._event.wait(seconds)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled()
@@ -0,0 +1,240 @@
+"""
+Sharded battle log collection.
+
+This replaces the hand-written index_tuple cells of
+battle_log_full_batch.ipynb. The players file is read once and cut into
+shards of shard_size players, and a few shards run at a time through the
+collection pipeline. All shards share one rate limiter and one adaptive
+concurrency limit, so the API sees a single global budget however many
+shards are running.
+
+The output is a partitioned dataset. It consists of {prefix}_part1.csv,
+{prefix}_part2.csv, ... (the names the cleaning notebook already reads),
+plus {prefix}_manifest.json. The manifest records the player range, status,
+rows and failures of every shard. Re-running skips shards marked complete.
+An interrupted shard is collected again from scratch.
+
+Usage: python collection_jobs.py --input scraped_ids/clash_royale_uniform.ndjson
+                                 --output-prefix scrapped_data/semi_data_trail [--shard-size 5000] [--concurrent-shards 2]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from battle_log_final import BattleLogWriter, iter_players, pipelined_api_calls
+from battle_schema import PREPROCESSOR_COLUMNS
+from concurrency import configure_concurrency_limiter, get_concurrency_limiter
+from http_client import configure_http_client
+from rate_limiter import COLLECTOR_REQUESTS_PER_SECOND, DEFAULT_BURST, configure_rate_limiter
+from raw_archive import RawProfileArchive
+from replay_index import ReplayIndex
+from retry import RetryQueue
+
+
+class ShardManifest:
+    """Status of every shard of a collection job, rewritten atomically on each change"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {"source": None, "shard_size": None, "shards": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    @property
+    def shards(self) -> Dict[str, Dict]:
+        return self.data["shards"]
+
+    def is_complete(self, name: str, **expected) -> bool:
+        """Complete, and for the same player range when one is given"""
+        shard = self.shards.get(name, {})
+        return shard.get("status") == "complete" and all(shard.get(k) == v for k, v in expected.items())
+
+    def update(self, name: str, **fields):
+        with self.lock:
+            self.shards.setdefault(name, {}).update(fields)
+            self._write()
+
+    def set_job(self, source: str, shard_size: int):
+        with self.lock:
+            self.data["source"] = source
+            self.data["shard_size"] = shard_size
+            self._write()
+
+    def _write(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def manifest_path(output_prefix: str) -> str:
+    return f"{output_prefix}_manifest.json"
+
+
+def shard_path(output_prefix: str, name: str) -> str:
+    return f"{output_prefix}_{name}.csv"
+
+
+def load_dataset(output_prefix: str) -> pd.DataFrame:
+    """All complete shards of a sharded collection as one DataFrame"""
+    manifest = ShardManifest(manifest_path(output_prefix))
+    parts = [shard_path(output_prefix, name) for name, shard in manifest.shards.items()
+             if shard.get("status") == "complete"]
+    # A shard that stored no battles may have left no file
+    frames = [pd.read_csv(part) for part in parts if os.path.exists(part) and os.path.getsize(part) > 0]
+    return pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
+
+
+def run_sharded_collection(
+    json_file_path: str,
+    output_prefix: str,
+    shard_size: int = 5000,
+    concurrent_shards: int = 2,
+    max_workers: int = 30,
+    requests_per_second: Optional[float] = COLLECTOR_REQUESTS_PER_SECOND,
+    burst: int = DEFAULT_BURST,
+    skip_collected: bool = True,
+    failed_file: Optional[str] = None,
+    drain_failed: bool = True,
+    chunk_size: int = 5000,
+    flatten_workers: int = 2,
+    columns: tuple = None, # type: ignore
+    replay_index_file: str = "replay_index.bin",
+    incremental: bool = True,
+    archive_dir: Optional[str] = None,
+):
+    """
+    Collect the battle logs of every player in a crawler output file as shards
+    of shard_size players, concurrent_shards at a time.
+    max_workers, requests_per_second and burst are global budgets shared by
+    all running shards; requests are not throttled unless requests_per_second
+    is given. Tags that fail after retries go to failed_file
+    (default: {prefix}_failed_ids.csv); with drain_failed, the tags queued
+    there when the job starts are collected again as an extra retry shard.
+    The other options are those of battle_log_from_json.
+    """
+    configure_rate_limiter(requests_per_second, burst)
+    configure_concurrency_limiter(max_limit=max_workers)
+    configure_http_client(pool_size=max_workers)
+
+    manifest = ShardManifest(manifest_path(output_prefix))
+    if manifest.data["source"] not in (None, json_file_path) or manifest.data["shard_size"] not in (None, shard_size):
+        print(f"{manifest.path} belongs to a job over {manifest.data['source']} with shard size "
+              f"{manifest.data['shard_size']}; use another output prefix or delete it to start over")
+        return
+    manifest.set_job(json_file_path, shard_size)
+
+    # The players file is read once for all shards
+    players = [(player["tag"], bool(player.get("battles_collected"))) for player in iter_players(json_file_path)]
+    print(f"Loaded {len(players)} players from {json_file_path}")
+
+    pending = []
+    for number, start in enumerate(range(0, len(players), shard_size), 1):
+        name, stop = f"part{number}", min(start + shard_size, len(players))
+        if manifest.is_complete(name, start=start, stop=stop):
+            continue
+        tags = [tag for tag, collected in players[start:stop] if not (skip_collected and collected)]
+        pending.append((name, tags, {"start": start, "stop": stop}))
+
+    retry_queue = RetryQueue(failed_file or f"{output_prefix}_failed_ids.csv")
+    retry_shards = {name: shard for name, shard in manifest.shards.items() if name.startswith("retry")}
+    for name, shard in retry_shards.items():
+        if shard.get("status") != "complete":
+            pending.append((name, shard["tags"], {"tags": shard["tags"]}))
+    if drain_failed:
+        in_retry = {tag for _, tags, fields in pending if "tags" in fields for tag in tags}
+        queued = [tag for tag in retry_queue.load() if tag not in in_retry]
+        if queued:
+            name = f"retry{len(retry_shards) + 1}"
+            pending.append((name, queued, {"tags": queued}))
+
+    skipped = sum(1 for shard in manifest.shards.values() if shard.get("status") == "complete")
+    print(f"{len(pending)} shards to collect, {skipped} already complete")
+    if not pending:
+        return
+
+    replay_index = ReplayIndex(replay_index_file) if incremental else None
+    archive = RawProfileArchive(archive_dir) if archive_dir else None
+
+    def run_shard(name: str, tags: List[str], fields: Dict) -> int:
+        manifest.update(name, status="running", players=len(tags), started_at=int(time.time()), **fields)
+        writer = BattleLogWriter(shard_path(output_prefix, name), chunk_size=chunk_size, append=False,
+                                 columns=columns)
+        view = replay_index.shard(name) if replay_index is not None else None
+        try:
+            failed_ids = pipelined_api_calls(
+                tags, writer, max_workers=max_workers, flatten_workers=flatten_workers, columns=columns,
+                replay_index=view, archive=archive, label=name,
+            )
+            writer.close()
+        except Exception as e:
+            if view is not None:
+                view.release()
+            manifest.update(name, status="failed", error=str(e))
+            raise
+        # Only once the shard's battles are on disk
+        if view is not None:
+            view.save()
+        dead_ids = retry_queue.update(tags, failed_ids)
+        if dead_ids:
+            print(f"{name}: giving up on {len(dead_ids)} IDs, moved to {retry_queue.dead_path}")
+        manifest.update(name, status="complete", rows=writer.rows_written, failed=len(failed_ids),
+                        completed_at=int(time.time()))
+        return writer.rows_written
+
+    start_time = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrent_shards) as executor:
+            futures = {executor.submit(run_shard, *shard): shard[0] for shard in pending}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    rows = future.result()
+                    print(f"Shard {name} complete: {rows} rows in {shard_path(output_prefix, name)}")
+                except Exception as e:
+                    print(f"Shard {name} failed, it will be collected again on the next run:", e)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    complete = sum(1 for shard in manifest.shards.values() if shard.get("status") == "complete")
+    print(f"{complete}/{len(manifest.shards)} shards complete after {time.monotonic() - start_time:.0f}s, "
+          f"manifest: {manifest.path}")
+    print(get_concurrency_limiter().report())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect battle logs for a crawler output file in shards")
+    parser.add_argument("--input", required=True, help="Crawler output (.json or .ndjson)")
+    parser.add_argument("--output-prefix", required=True,
+                        help="Shards are written to <prefix>_part<N>.csv next to <prefix>_manifest.json")
+    parser.add_argument("--shard-size", type=int, default=5000, help="Players per shard")
+    parser.add_argument("--concurrent-shards", type=int, default=2, help="Shards collected at the same time")
+    parser.add_argument("--workers", type=int, default=30, help="Requests in flight across all shards")
+    parser.add_argument("--rate", type=float, default=COLLECTOR_REQUESTS_PER_SECOND,
+                        help="API requests per second across all shards (default: unthrottled)")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST, help="API requests sent back to back")
+    parser.add_argument("--include-collected", action="store_true",
+                        help="Also collect players whose battles were stored during a fused crawl")
+    parser.add_argument("--preprocessor-columns", action="store_true",
+                        help="Only store the columns battle_log_data_preprocessor.py uses")
+    parser.add_argument("--replay-index", default="replay_index.bin", help="Index of battles already stored")
+    parser.add_argument("--no-incremental", action="store_true", help="Store battles even if already stored")
+    parser.add_argument("--archive", default=None, help="Also archive raw profile responses in this directory")
+    args = parser.parse_args()
+    run_sharded_collection(
+        args.input, args.output_prefix, shard_size=args.shard_size, concurrent_shards=args.concurrent_shards,
+        max_workers=args.workers, requests_per_second=args.rate, burst=args.burst,
+        skip_collected=not args.include_collected,
+        columns=tuple(PREPROCESSOR_COLUMNS) if args.preprocessor_columns else None,
+        replay_index_file=args.replay_index, incremental=not args.no_incremental, archive_dir=args.archive,
+    )
@@ -0,0 +1,144 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import requests
+
+from cancellation import Cancelled, CancellationToken
+
+# Status codes that mean the API is overloaded and we should back off
+OVERLOAD_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on the number of requests in flight.
+
+    Every healthy response (fast enough compared to the best latency seen)
+    adds 1/limit, so the limit grows by about one per round of requests.
+    A 429, a 5xx or a timeout/connection error halves it, at most once per
+    `backoff_cooldown` seconds so a burst of failures counts as one signal.
+    Other errors (e.g. 404) leave the limit unchanged.
+    """
+
+    def __init__(self, max_limit: int = 30, min_limit: int = 1, initial_limit: Optional[int] = None,
+                 latency_tolerance: float = 2.0, backoff_factor: float = 0.5, backoff_cooldown: float = 2.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial_limit if initial_limit is not None else max(min_limit, max_limit // 2))
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+        self.backoff_cooldown = backoff_cooldown
+        self.in_flight = 0
+        self.best_latency = None
+        self.last_backoff = 0.0
+        self.successes = 0
+        self.overloads = 0
+        self.start_time = time.monotonic()
+        # (seconds since start, limit) every time the whole-number limit changes
+        self.history = [(0.0, int(self.limit))]
+        self.condition = threading.Condition()
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def _record_limit(self):
+        if self.history[-1][1] != int(self.limit):
+            self.history.append((time.monotonic() - self.start_time, int(self.limit)))
+
+    def _on_success(self, latency: float):
+        self.successes += 1
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+        if latency <= self.best_latency * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._record_limit()
+            self.condition.notify_all()
+
+    def _on_overload(self):
+        self.overloads += 1
+        now = time.monotonic()
+        if now - self.last_backoff >= self.backoff_cooldown:
+            self.last_backoff = now
+            self.limit = max(self.min_limit, self.limit * self.backoff_factor)
+            self._record_limit()
+
+    def wake_all(self):
+        """Wake every thread waiting for a slot, e.g. so it notices a cancelled token"""
+        with self.condition:
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, cancel_token: Optional[CancellationToken] = None):
+        """
+        Hold one in-flight request slot for the duration of the block.
+        The outcome is classified from the block: no exception is a success,
+        requests' HTTPError/Timeout/ConnectionError are checked for overload.
+        With a cancel_token, waiting for a slot raises Cancelled once the token
+        is cancelled (register wake_all with the token so waiters notice), and
+        requests aborted by the cancellation do not count as overload.
+        The block is timed as the request latency, so waits such as rate
+        limiter tokens belong before it.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                self.condition.wait()
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        except Cancelled:
+            raise
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status in OVERLOAD_STATUS_CODES:
+                with self.condition:
+                    self._on_overload()
+            raise
+        except (requests.Timeout, requests.ConnectionError):
+            if cancel_token is None or not cancel_token.cancelled:
+                with self.condition:
+                    self._on_overload()
+            raise
+        else:
+            with self.condition:
+                self._on_success(time.monotonic() - start)
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify()
+
+    def report(self) -> str:
+        """One-line summary of how the limit moved during the run"""
+        limits = [limit for _, limit in self.history]
+        timeline = " -> ".join(f"{limit}@{seconds:.0f}s" for seconds, limit in self.history[-10:])
+        return (f"Concurrency: now {self.current_limit} (min {min(limits)}, max {max(limits)}) | "
+                f"{self.successes} ok, {self.overloads} overloaded | recent: {timeline}")
+
+
+_limiter: Optional[AdaptiveConcurrencyLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def configure_concurrency_limiter(max_limit: int, min_limit: int = 1,
+                                  initial_limit: Optional[int] = None) -> AdaptiveConcurrencyLimiter:
+    """Replace the process-wide concurrency limiter"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = AdaptiveConcurrencyLimiter(max_limit, min_limit, initial_limit)
+        return _limiter
+
+
+def get_concurrency_limiter() -> AdaptiveConcurrencyLimiter:
+    """Return the process-wide concurrency limiter, creating it with the defaults if needed"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveConcurrencyLimiter()
+        return _limiter
@@ -0,0 +1,123 @@
+import socket
+import threading
+import weakref
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# (connect, read) seconds; used when a request does not pass its own timeout
+DEFAULT_TIMEOUT = (5, 10)
+# gzip and deflate, plus br/zstd when the optional decoders are installed
+ACCEPT_ENCODING = urllib3.util.make_headers(accept_encoding=True)["accept-encoding"]
+
+
+def _tracked_connection_class(base, register):
+    class TrackedConnection(base):
+        def connect(self):
+            super().connect()
+            register(self)
+    TrackedConnection.__name__ = f"Tracked{base.__name__}"
+    return TrackedConnection
+
+
+class _TrackingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools hand every connection they open to `register`"""
+
+    def __init__(self, register, **kwargs):
+        self.register = register
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: type(f"Tracked{pool_cls.__name__}", (pool_cls,),
+                         {"ConnectionCls": _tracked_connection_class(pool_cls.ConnectionCls, self.register)})
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class PooledSession(requests.Session):
+    """
+    requests.Session with keep-alive connection pools and a default timeout.
+
+    urllib3 keeps one pool per host. Each pool holds up to `pool_size`
+    connections, which are reused across requests and threads, so a worker
+    only pays for the TCP and TLS handshake when its pool grows. With
+    pool_block=True a host never gets more than `pool_size` connections at
+    once; extra requests wait for a free connection instead of opening
+    throwaway ones.
+
+    The session keeps track of its open connections, so another thread can
+    abort the requests in flight with `abort_in_flight` (e.g. when a crawl
+    is cancelled) instead of waiting for their responses or timeouts.
+    """
+
+    def __init__(self, pool_size: int = 10, max_hosts: int = 10, pool_block: bool = True,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT, headers: Optional[Dict] = None):
+        super().__init__()
+        self.timeout = timeout
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        adapter = _TrackingAdapter(self._track, pool_connections=max_hosts, pool_maxsize=pool_size,
+                                   pool_block=pool_block)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.headers["Connection"] = "keep-alive"
+        if headers:
+            self.headers.update(headers)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+    def _track(self, connection):
+        with self._connections_lock:
+            self._connections.add(connection)
+
+    def abort_in_flight(self) -> int:
+        """
+        Shut down the socket of every open connection. Requests waiting on one
+        fail at once with a ConnectionError; idle pooled connections are
+        reopened on their next use. Returns the number of sockets shut down.
+        """
+        with self._connections_lock:
+            connections = list(self._connections)
+        aborted = 0
+        for connection in connections:
+            sock = getattr(connection, "sock", None)
+            if sock is None:
+                continue
+            try:
+                # The plain socket call: SSLSocket.shutdown would also tear down
+                # the TLS state under the thread still reading from it
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+                aborted += 1
+            except OSError:
+                pass
+        return aborted
+
+
+_session: Optional[PooledSession] = None
+_session_lock = threading.Lock()
+
+
+def configure_http_client(pool_size: int, headers: Optional[Dict] = None, **kwargs) -> PooledSession:
+    """Replace the process-wide session, sizing its pools to the number of workers"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = PooledSession(pool_size=pool_size, headers=headers, **kwargs)
+        return _session
+
+
+def get_http_session() -> PooledSession:
+    """Return the process-wide session, creating it with the defaults if needed"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = PooledSession()
+        return _session
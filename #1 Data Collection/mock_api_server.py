@@ -0,0 +1,257 @@
+"""
+Local stand-in for the Stats Royale API.
+
+Serves GET /profile/{tag} with responses shaped like the real ones, built from
+the fixtures in this folder (somet.json for the profile, its matches plus
+single_battle.json as match templates). Players form a fixed, seeded graph:
+battles are shared by the logs of both players (capped like the real API)
+and opponents are matched around each player's trophies, so a crawl over
+the mock behaves like one over the live API and is reproducible.
+
+Latency, error rate and rate limiting are configurable so crawler and
+collector changes can be benchmarked offline. Point the fetchers at it with
+
+    STATS_ROYALE_API_URL=http://127.0.0.1:8000 python battle_log_final.py
+    python bfs_par_v2.py --api-url http://127.0.0.1:8000 --input mock_seeds.json
+
+Usage: python mock_api_server.py [--port 8000] [--players 50000] [--latency 0.15]
+                                 [--error-rate 0.01] [--rate-limit 20] [--write-seeds mock_seeds.json]
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+TAG_ALPHABET = "0289PYLQGRJCUV"
+MAX_TROPHIES = 10000
+
+
+def make_tag(prefix: str, index: int, length: int = 9) -> str:
+    """Deterministic tag in the game's alphabet"""
+    digest = hashlib.sha1(f"{prefix}:{index}".encode()).digest()
+    return "".join(TAG_ALPHABET[b % len(TAG_ALPHABET)] for b in digest[:length])
+
+
+class PlayerGraph:
+    """Seeded players whose battle logs share the same battles"""
+
+    def __init__(self, n_players: int = 50000, matches_per_player: int = 25, seed: int = 42):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.tags = [make_tag(f"player{seed}", i) for i in range(n_players)]
+        self.index = {tag: i for i, tag in enumerate(self.tags)}
+        # Skewed towards low trophies, like the real ladder
+        self.trophies = [min(int(rng.betavariate(1.6, 2.4) * MAX_TROPHIES), MAX_TROPHIES - 1) for _ in range(n_players)]
+        # battles[i] = list of (battle id, opponent index, player i won)
+        self.battles: List[List[Tuple[int, int, bool]]] = [[] for _ in range(n_players)]
+
+        by_trophies = sorted(range(n_players), key=lambda i: self.trophies[i])
+        position = {player: pos for pos, player in enumerate(by_trophies)}
+        battle_id = 0
+        for player in range(n_players):
+            while len(self.battles[player]) < matches_per_player:
+                # Opponent from a window of players with similar trophies
+                pos = position[player] + rng.randint(-50, 50)
+                opponent = by_trophies[min(max(pos, 0), n_players - 1)]
+                if opponent == player:
+                    continue
+                won = rng.random() < 0.5
+                self.battles[player].append((battle_id, opponent, won))
+                self.battles[opponent].append((battle_id, player, not won))
+                battle_id += 1
+        # Logs are capped like the real API; keep the most recent battles
+        self.battles = [log[-matches_per_player:] for log in self.battles]
+
+    def resolve(self, tag: str) -> int:
+        """Graph node of a tag; unknown tags (e.g. real seed players) map onto the graph by hash"""
+        if tag in self.index:
+            return self.index[tag]
+        return int(hashlib.sha1(tag.encode()).hexdigest(), 16) % len(self.tags)
+
+
+class MockProfileBuilder:
+    """Builds /profile responses from the fixture templates"""
+
+    def __init__(self, graph: PlayerGraph):
+        self.graph = graph
+        with open(os.path.join(FIXTURE_DIR, "somet.json"), "r", encoding="utf-8") as f:
+            profile_fixture = json.load(f)
+        with open(os.path.join(FIXTURE_DIR, "single_battle.json"), "r", encoding="utf-8") as f:
+            battle_fixture = json.load(f)
+        self.profile_template = profile_fixture["profile"]
+        self.chests_template = profile_fixture.get("chests", {})
+        self.match_templates = profile_fixture["matches"] + [battle_fixture]
+        self.base_timestamp = 1760000000
+
+    def _player_side(self, template: Dict, node: int, tag: str, won: bool) -> Dict:
+        side = copy.deepcopy(template)
+        side["hashtag"] = tag
+        side["name"] = f"Mock {tag}"
+        side["score"] = self.graph.trophies[node]
+        side["winner"] = 1 if won else 0
+        side["stars"] = 3 if won else 0
+        return side
+
+    def build(self, tag: str) -> Dict:
+        graph = self.graph
+        node = graph.resolve(tag)
+        profile = copy.deepcopy(self.profile_template)
+        profile["hashtag"] = tag
+        profile["name"] = f"Mock {tag}"
+        profile["trophies"] = graph.trophies[node]
+        profile["maxscore"] = graph.trophies[node]
+
+        matches = []
+        for battle_id, opponent, won in graph.battles[node]:
+            template = self.match_templates[battle_id % len(self.match_templates)]
+            match = {key: copy.deepcopy(value) for key, value in template.items() if key != "players"}
+            match["game_config"]["name"] = "Ladder"
+            match["replayTag"] = make_tag(f"replay{graph.seed}", battle_id, length=12)
+            match["timestamp"] = self.base_timestamp + battle_id
+            players = template["players"]
+            match["players"] = [
+                self._player_side(players[0], node, tag, won),
+                self._player_side(players[1 % len(players)], opponent, graph.tags[opponent], not won),
+            ]
+            matches.append(match)
+        matches.sort(key=lambda m: m["timestamp"], reverse=True)
+        return {"success": True, "profile": profile, "chests": self.chests_template, "matches": matches}
+
+
+class MockApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, builder: MockProfileBuilder, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit: Optional[float] = None, burst: int = 10, seed: int = 42):
+        super().__init__(address, MockApiHandler)
+        self.builder = builder
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "not_found": 0}
+
+    def take_token(self) -> bool:
+        """Non-blocking token bucket: False means the request is over the rate limit"""
+        if self.rate_limit is None:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate_limit)
+            self.last_refill = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server: MockApiServer = self.server  # type: ignore
+        server.count("requests")
+        if not self.path.startswith("/profile/"):
+            server.count("not_found")
+            self._send_json(404, {"success": False, "error": "not found"})
+            return
+        tag = self.path[len("/profile/"):].strip("/").lstrip("#").upper()
+
+        if not server.take_token():
+            server.count("rate_limited")
+            self._send_json(429, {"success": False, "error": "rate limited"}, {"Retry-After": "1"})
+            return
+
+        with server.lock:
+            delay = max(0.0, server.rng.gauss(server.latency, server.latency_jitter)) if server.latency else 0.0
+            fail = server.rng.random() < server.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            server.count("errors")
+            self._send_json(503, {"success": False, "error": "injected failure"})
+            return
+
+        server.count("ok")
+        self._send_json(200, server.builder.build(tag))
+
+    def log_message(self, format, *args):
+        # Request logging would dominate benchmark output
+        pass
+
+
+def write_seed_players(graph: PlayerGraph, filename: str, per_arena: int = 5):
+    """Write an initial players file for bfs_par_v2.py with a few graph players per 400 trophies"""
+    seeds = []
+    taken = {}
+    for node, trophies in enumerate(graph.trophies):
+        bucket = trophies // 400
+        if taken.get(bucket, 0) < per_arena:
+            taken[bucket] = taken.get(bucket, 0) + 1
+            seeds.append({"tag": graph.tags[node], "trophies": trophies, "name": f"Mock {graph.tags[node]}"})
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(seeds, f, indent=2)
+    print(f"Wrote {len(seeds)} seed players to {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in Stats Royale API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--players", type=int, default=50000, help="Number of players in the synthetic graph")
+    parser.add_argument("--matches", type=int, default=25, help="Battles in each player's log")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the graph and injected behavior")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response latency in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before answering 429")
+    parser.add_argument("--burst", type=int, default=10, help="Burst size of the rate limit")
+    parser.add_argument("--write-seeds", default=None, help="Write an initial players file for the crawler and exit")
+    args = parser.parse_args()
+
+    print(f"Building graph of {args.players:,} players...")
+    graph = PlayerGraph(args.players, args.matches, args.seed)
+    if args.write_seeds:
+        write_seed_players(graph, args.write_seeds)
+        return
+
+    server = MockApiServer((args.host, args.port), MockProfileBuilder(graph), args.latency, args.latency_jitter,
+                           args.error_rate, args.rate_limit, args.burst, args.seed)
+    print(f"Mock Stats Royale API on http://{args.host}:{args.port} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
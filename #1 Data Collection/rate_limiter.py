@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Optional
+
+from cancellation import Cancelled, CancellationToken
+
+# Default request budget of the crawler for the Stats Royale API
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_BURST = 5
+# The collector has always sent its requests unthrottled, bounded only by its workers
+COLLECTOR_REQUESTS_PER_SECOND = None
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket.
+
+    Tokens refill at `rate` per second up to `burst`. Every request takes one
+    token; callers that find the bucket empty reserve the next token and sleep
+    until it is due, so the overall request rate is independent of thread count.
+    rate=None never throttles.
+    """
+
+    def __init__(self, rate: Optional[float] = DEFAULT_REQUESTS_PER_SECOND, burst: int = DEFAULT_BURST):
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller has to wait for it"""
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, cancel_token: Optional[CancellationToken] = None):
+        """
+        Block until a request may be sent.
+        With a cancel_token the wait ends early, raising Cancelled, once the token is cancelled.
+        """
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        wait_time = self._reserve()
+        if wait_time > 0:
+            if cancel_token is None:
+                time.sleep(wait_time)
+            elif cancel_token.wait(wait_time):
+                raise Cancelled()
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def configure_rate_limiter(rate: Optional[float] = DEFAULT_REQUESTS_PER_SECOND,
+                           burst: int = DEFAULT_BURST) -> RateLimiter:
+    """Replace the process-wide rate limiter"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(rate, burst)
+        return _limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter, creating it with the defaults if needed"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,246 @@
+"""
+Archive of raw /profile responses, so battle CSVs can be rebuilt after the
+flattening or preprocessing changes without fetching everything again.
+
+Responses are appended to segment files (segment-00000.ndjson.gz, ...) as
+one gzip member per response. A segment is therefore a valid gzip'd NDJSON
+file on its own, and any response can also be read back alone from its byte
+offset. index.tsv holds one `tag, segment, offset, length, fetched_at` line
+per response. A tag archived more than once (re-polls, incremental passes)
+has one line per response: `read` returns the latest one, and
+`replay_archive` replays them all, keeping every battle once.
+
+Usage: python raw_archive.py --archive raw_profiles --output battles.csv [--workers 8] [--preprocessor-columns]
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+INDEX_FILENAME = "index.tsv"
+
+
+def segment_filename(number: int) -> str:
+    return f"segment-{number:05d}.ndjson.gz"
+
+
+class RawProfileArchive:
+    """Thread-safe appender and reader of archived profile responses"""
+
+    def __init__(self, directory: str, segment_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(name for name in os.listdir(directory) if name.startswith("segment-"))
+        self.segment_number = int(segments[-1][len("segment-"):len("segment-") + 5]) if segments else 0
+        self.segment_file = None
+        self.index_file = None
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILENAME)
+
+    def _open(self):
+        if self.segment_file is None:
+            path = os.path.join(self.directory, segment_filename(self.segment_number))
+            self.segment_file = open(path, "ab")
+            self.index_file = open(self.index_path, "a", encoding="utf-8")
+        if self.segment_file.tell() >= self.segment_bytes:
+            self.segment_file.close()
+            self.segment_number += 1
+            self.segment_file = open(os.path.join(self.directory, segment_filename(self.segment_number)), "ab")
+
+    def write(self, tag: str, response: Dict):
+        """Append one raw response; the index line is written after the data"""
+        record = gzip.compress((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"), compresslevel=6)
+        with self.lock:
+            self._open()
+            offset = self.segment_file.tell()
+            self.segment_file.write(record)
+            self.segment_file.flush()
+            self.index_file.write(
+                f"{tag}\t{segment_filename(self.segment_number)}\t{offset}\t{len(record)}\t{int(time.time())}\n"
+            )
+            self.index_file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.segment_file is not None:
+                self.segment_file.close()
+                self.index_file.close()
+                self.segment_file = None
+                self.index_file = None
+
+    def load_index(self) -> Dict[str, Tuple[str, int, int]]:
+        """Latest (segment, offset, length) of every archived tag"""
+        return load_index(self.directory)
+
+    def read(self, tag: str) -> Optional[Dict]:
+        """Latest archived response of a tag, or None"""
+        location = self.load_index().get(tag)
+        if location is None:
+            return None
+        return read_record(self.directory, *location)
+
+
+def iter_index(directory: str) -> Iterator[Tuple[str, str, int, int]]:
+    """(tag, segment, offset, length) of every archived response, oldest first"""
+    path = os.path.join(directory, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 4:
+                # Torn write at the end of the index
+                continue
+            tag, segment, offset, length = fields[:4]
+            yield tag, segment, int(offset), int(length)
+
+
+def load_index(directory: str) -> Dict[str, Tuple[str, int, int]]:
+    """Latest (segment, offset, length) of every archived tag"""
+    return {tag: (segment, offset, length) for tag, segment, offset, length in iter_index(directory)}
+
+
+def read_record(directory: str, segment: str, offset: int, length: int) -> Dict:
+    with open(os.path.join(directory, segment), "rb") as f:
+        f.seek(offset)
+        return json.loads(gzip.decompress(f.read(length)))
+
+
+def iter_segment(directory: str, segment: str, locations: List[Tuple[int, int]]) -> Iterator[Dict]:
+    """Responses at the given (offset, length) locations of one segment, read in file order"""
+    with open(os.path.join(directory, segment), "rb") as f:
+        for offset, length in sorted(locations):
+            f.seek(offset)
+            yield json.loads(gzip.decompress(f.read(length)))
+
+
+def flatten_segment(directory: str, segment: str, locations: List[Tuple[int, int]],
+                    columns: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """Battle rows of the archived responses of one segment (runs in a worker process)"""
+    from battle_log_final import flatten_matches
+
+    matches = [match for response in iter_segment(directory, segment, locations) for match in response["matches"]]
+    return flatten_matches(matches, columns)
+
+
+class _ParquetSpool:
+    """
+    Streams frames whose columns and types vary into one Parquet file.
+    Frames are spooled to temporary files first; their schemas are then
+    unified (new columns, all-null columns, ints next to floats, ...) and
+    the files are copied into the output one at a time through a
+    ParquetWriter, so only one frame is ever in memory.
+    """
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.directory = tempfile.mkdtemp(prefix="replay_", dir=os.path.dirname(os.path.abspath(output_file)))
+        self.paths: List[str] = []
+        self.schemas = []
+
+    def write_frame(self, frame: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(frame, preserve_index=False).replace_schema_metadata(None)
+        path = os.path.join(self.directory, f"frame-{len(self.paths):06d}.parquet")
+        pq.write_table(table, path)
+        self.paths.append(path)
+        self.schemas.append(table.schema)
+
+    def close(self, columns: Optional[Tuple[str, ...]] = None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            if self.schemas:
+                schema = pa.unify_schemas(self.schemas, promote_options="permissive")
+            else:
+                schema = pa.schema([(column, pa.null()) for column in columns or []])
+            with pq.ParquetWriter(self.output_file, schema) as writer:
+                for path in self.paths:
+                    table = pq.read_table(path)
+                    for field in schema:
+                        if field.name not in table.column_names:
+                            table = table.append_column(field.name, pa.nulls(table.num_rows, field.type))
+                    writer.write_table(table.select(schema.names).cast(schema))
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def replay_archive(directory: str, output_file: str, workers: int = os.cpu_count() or 4,
+                   columns: Optional[Tuple[str, ...]] = None, dedupe: bool = True, task_size: int = 500):
+    """
+    Rebuild a battle CSV (or .parquet, which needs pyarrow) from every
+    archived response, including older responses of players archived more
+    than once. Responses are flattened in parallel worker processes,
+    task_size responses of a segment per task, and a battle seen in more
+    than one response is kept once when dedupe=True.
+    """
+    from battle_log_final import BattleLogWriter
+
+    by_segment: Dict[str, List[Tuple[int, int]]] = {}
+    for _, segment, offset, length in iter_index(directory):
+        by_segment.setdefault(segment, []).append((offset, length))
+    print(f"Replaying {sum(map(len, by_segment.values()))} archived profiles from {len(by_segment)} segments")
+    tasks = [
+        (segment, locations[i:i + task_size])
+        for segment, locations in by_segment.items()
+        for i in range(0, len(locations), task_size)
+    ]
+
+    parquet = output_file.endswith(".parquet")
+    writer = _ParquetSpool(output_file) if parquet else BattleLogWriter(output_file, append=False,
+                                                                         columns=list(columns or []))
+    seen = set()
+    rows = 0
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(flatten_segment, directory, segment, locations, columns)
+            for segment, locations in tasks
+        ]
+        for future in as_completed(futures):
+            frame = future.result()
+            if dedupe and "replayTag" in frame.columns:
+                frame = frame.drop_duplicates(subset=["replayTag"])
+                frame = frame[~frame["replayTag"].isin(seen)]
+                seen.update(frame["replayTag"])
+            rows += len(frame)
+            writer.write_frame(frame)
+            print(f"Tasks done: {sum(f.done() for f in futures)}/{len(futures)} - {rows} battles")
+
+    if parquet:
+        writer.close(columns)
+    else:
+        writer.close()
+    print(f"Data saved to {output_file} ({rows} rows in {time.monotonic() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    from battle_schema import PREPROCESSOR_COLUMNS
+
+    parser = argparse.ArgumentParser(description="Rebuild battle data from archived profile responses")
+    parser.add_argument("--archive", required=True, help="Archive directory written by the collector or crawler")
+    parser.add_argument("--output", required=True, help="Output .csv or .parquet file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Worker processes")
+    parser.add_argument("--preprocessor-columns", action="store_true",
+                        help="Only keep the columns battle_log_data_preprocessor.py uses")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="Keep a battle once per archived response it appears in")
+    args = parser.parse_args()
+    replay_archive(args.archive, args.output, args.workers,
+                   tuple(PREPROCESSOR_COLUMNS) if args.preprocessor_columns else None,
+                   dedupe=not args.keep_duplicates)
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+def replay_hash(replay_tag: str) -> int:
+    """Stable 64-bit hash of a replayTag (Python's hash() changes between runs)"""
+    return int.from_bytes(hashlib.blake2b(replay_tag.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class ReplayIndex:
+    """
+    Which battles are already stored, kept across collection runs.
+
+    Stored replayTags are kept on disk as 64-bit hashes (8 bytes each,
+    appended by every run) and loaded into a sorted array. A sidecar JSON
+    file holds each player's high-water mark, the newest battle timestamp
+    seen in their log, so a repeat pass only looks at newer battles.
+
+    Nothing is persisted until `save`, which the collector calls once the
+    battles are safely written; a crashed run leaves the index untouched.
+    Concurrent jobs sharing one index claim through `shard(name)` views, so
+    each job saves (or releases) only its own claims.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.high_water_path = f"{os.path.splitext(path)[0]}.hwm.json"
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            self.stored = np.unique(np.fromfile(path, dtype="<u8"))
+        else:
+            self.stored = np.empty(0, dtype="<u8")
+        self.high_water: Dict[str, int] = {}
+        if os.path.exists(self.high_water_path):
+            with open(self.high_water_path, "r", encoding="utf-8") as f:
+                self.high_water = json.load(f)
+        # Claimed during this run, persisted by save(); claims and marks are kept per owner
+        self.pending = set()
+        self.claims: Dict[Hashable, List[int]] = {}
+        self.marks: Dict[Hashable, Dict[str, int]] = {}
+        self.skipped_old = 0
+        self.skipped_duplicate = 0
+
+    def __len__(self) -> int:
+        return len(self.stored) + len(self.pending)
+
+    def newer_than_mark(self, player_tag: str, matches: List[Dict], owner: Hashable = None) -> List[Dict]:
+        """Matches of a player newer than their high-water mark; the mark advances on save"""
+        mark = self.high_water.get(player_tag)
+        fresh = matches if mark is None else [m for m in matches if m.get("timestamp", 0) > mark]
+        timestamps = [m["timestamp"] for m in matches if m.get("timestamp") is not None]
+        with self.lock:
+            self.skipped_old += len(matches) - len(fresh)
+            if timestamps:
+                marks = self.marks.setdefault(owner, {})
+                marks[player_tag] = max(timestamps + [mark or 0, marks.get(player_tag, 0)])
+        return fresh
+
+    def claim(self, matches: List[Dict], owner: Hashable = None) -> List[Dict]:
+        """
+        Matches whose replayTag is neither stored nor claimed yet, claiming them.
+        Matches without a replayTag are always kept.
+        """
+        tagged = [i for i, match in enumerate(matches) if match.get("replayTag")]
+        if not tagged:
+            return matches
+        hashes = np.fromiter((replay_hash(matches[i]["replayTag"]) for i in tagged), dtype="<u8", count=len(tagged))
+        if len(self.stored):
+            positions = np.minimum(np.searchsorted(self.stored, hashes), len(self.stored) - 1)
+            known = self.stored[positions] == hashes
+        else:
+            known = np.zeros(len(hashes), dtype=bool)
+        lookup = dict(zip(tagged, zip(hashes.tolist(), known.tolist())))
+
+        kept = []
+        with self.lock:
+            claims = self.claims.setdefault(owner, [])
+            for i, match in enumerate(matches):
+                if i in lookup:
+                    value, was_stored = lookup[i]
+                    if was_stored or value in self.pending:
+                        self.skipped_duplicate += 1
+                        continue
+                    self.pending.add(value)
+                    claims.append(value)
+                kept.append(match)
+        return kept
+
+    def release_matches(self, matches: List[Dict], player_tags: List[str], owner: Hashable = None):
+        """
+        Undo claim() for matches it returned and forget the marks of their
+        players, e.g. when those battles could not be flattened. The next
+        pass then fetches and stores them again.
+        """
+        values = {replay_hash(match["replayTag"]) for match in matches if match.get("replayTag")}
+        with self.lock:
+            self.pending.difference_update(values)
+            if owner in self.claims:
+                self.claims[owner] = [value for value in self.claims[owner] if value not in values]
+            marks = self.marks.get(owner, {})
+            for tag in player_tags:
+                marks.pop(tag, None)
+
+    def save(self, owners: Optional[List[Hashable]] = None):
+        """Persist the battles claimed and the marks advanced during this run (by the given owners only)"""
+        with self.lock:
+            if owners is None:
+                owners = list(self.claims.keys() | self.marks.keys())
+            claimed = [value for key in owners for value in self.claims.pop(key, [])]
+            marks = [self.marks.pop(key, {}) for key in owners]
+            if claimed:
+                new_hashes = np.array(sorted(claimed), dtype="<u8")
+                with open(self.path, "ab") as f:
+                    new_hashes.tofile(f)
+                self.stored = np.union1d(self.stored, new_hashes).astype("<u8")
+                self.pending.difference_update(claimed)
+            if any(marks):
+                for owner_marks in marks:
+                    for tag, newest in owner_marks.items():
+                        self.high_water[tag] = max(newest, self.high_water.get(tag, 0))
+                tmp_path = f"{self.high_water_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.high_water, f)
+                os.replace(tmp_path, self.high_water_path)
+
+    def release(self, owner: Hashable):
+        """Forget the claims and marks of an owner whose battles were not written"""
+        with self.lock:
+            self.pending.difference_update(self.claims.pop(owner, []))
+            self.marks.pop(owner, None)
+
+    def shard(self, owner: Hashable) -> "ReplayIndexShard":
+        return ReplayIndexShard(self, owner)
+
+    def report(self) -> str:
+        return (f"Replay index: {len(self):,} battles stored | skipped {self.skipped_old} older than the "
+                f"player's last pass, {self.skipped_duplicate} already stored")
+
+
+class ReplayIndexShard:
+    """A ReplayIndex as seen by one of several concurrent collection jobs"""
+
+    def __init__(self, index: ReplayIndex, owner: Hashable):
+        self.index = index
+        self.owner = owner
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def newer_than_mark(self, player_tag: str, matches: List[Dict]) -> List[Dict]:
+        return self.index.newer_than_mark(player_tag, matches, self.owner)
+
+    def claim(self, matches: List[Dict]) -> List[Dict]:
+        return self.index.claim(matches, self.owner)
+
+    def release_matches(self, matches: List[Dict], player_tags: List[str]):
+        self.index.release_matches(matches, player_tags, self.owner)
+
+    def save(self):
+        self.index.save([self.owner])
+
+    def release(self):
+        self.index.release(self.owner)
+
+    def report(self) -> str:
+        return self.index.report()
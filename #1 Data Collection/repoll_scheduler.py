@@ -0,0 +1,233 @@
+"""
+Keeps re-collecting the battle logs of known players to grow the dataset.
+
+The API only returns a player's most recent battles (about 25), so a single
+pass misses most of the games of active players. The scheduler re-polls
+players in rounds. Each round spends a fixed request budget on the players
+expected to have the most new battles.
+
+Every player has an estimated battle rate. It starts from the timestamps in
+their log and is then updated from how many new replayTags each poll found.
+A player's expected yield is rate * time since the last poll, capped at the
+log size. Active players therefore come due quickly and dormant ones rarely.
+A poll whose log was entirely new may have missed battles, so its rate is
+taken from the log itself.
+
+New battles are appended to one CSV through the replay index, so nothing is
+stored twice. The scheduler state is saved after every round, so a stopped
+scheduler continues where it left off. Ctrl-C during a round lets the
+requests in flight finish, then saves their battles and the state too.
+
+Usage: python repoll_scheduler.py --input scraped_ids/clash_royale_uniform.ndjson --output battles_live.csv
+                                  [--rate 5] [--round-seconds 60] [--rounds 0]
+"""
+import argparse
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from battle_log_final import BattleLogWriter, PipelineInterrupted, iter_players, pipelined_api_calls
+from battle_schema import PREPROCESSOR_COLUMNS
+from concurrency import configure_concurrency_limiter
+from http_client import configure_http_client
+from rate_limiter import DEFAULT_BURST, DEFAULT_REQUESTS_PER_SECOND, configure_rate_limiter
+from replay_index import ReplayIndex
+
+# Battles returned per profile by the API
+LOG_SIZE = 25
+
+
+class RepollScheduler:
+    """Per-player battle rate estimates and the choice of whom to poll next"""
+
+    def __init__(self, state_path: str, log_size: int = LOG_SIZE, min_yield: float = 1.0,
+                 max_interval: float = 7 * 24 * 3600, smoothing: float = 0.5, min_rate: float = 1 / 86400):
+        self.state_path = state_path
+        self.log_size = log_size
+        # Players expected to have fewer new battles are skipped until max_interval has passed
+        self.min_yield = min_yield
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        # Floor of the rate estimates, so a quiet first poll does not shelve a player for good
+        self.min_rate = min_rate
+        self.lock = threading.Lock()
+        # tag -> {"last_poll", "rate" (battles per second), "polls", "new"}
+        self.players: Dict[str, Dict] = {}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.players = json.load(f)
+
+    def add_players(self, tags: Iterable[str]) -> int:
+        """Track new players; they are polled before anyone is re-polled"""
+        added = 0
+        for tag in tags:
+            if tag not in self.players:
+                self.players[tag] = {"last_poll": None, "rate": 0.0, "polls": 0, "new": 0}
+                added += 1
+        return added
+
+    def expected_yield(self, player: Dict, now: float) -> float:
+        if player["last_poll"] is None:
+            return float(self.log_size)
+        rate = max(player["rate"], self.min_rate)
+        return min(rate * (now - player["last_poll"]), float(self.log_size))
+
+    def select(self, now: float, budget: int) -> List[str]:
+        """Up to budget players with the highest expected number of new battles"""
+        candidates = []
+        for tag, player in self.players.items():
+            expected = self.expected_yield(player, now)
+            overdue = player["last_poll"] is not None and now - player["last_poll"] >= self.max_interval
+            if expected >= self.min_yield or overdue:
+                candidates.append((expected, tag))
+        return [tag for _, tag in heapq.nlargest(budget, candidates)]
+
+    def log_rate(self, matches: List[Dict]) -> Optional[float]:
+        """Battles per second over the span of a battle log"""
+        timestamps = [m["timestamp"] for m in matches if m.get("timestamp") is not None]
+        if len(timestamps) < 2 or max(timestamps) == min(timestamps):
+            return None
+        return (len(timestamps) - 1) / (max(timestamps) - min(timestamps))
+
+    def record(self, tag: str, matches: List[Dict], new_matches: int, now: Optional[float] = None):
+        """Update a player's rate from a successful poll (called by the fetch workers)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            player = self.players.setdefault(tag, {"last_poll": None, "rate": 0.0, "polls": 0, "new": 0})
+            saturated = new_matches >= len(matches) and len(matches) >= self.log_size
+            if player["last_poll"] is None or saturated:
+                # First look, or the log rolled over since the last poll: the log itself is the best estimate
+                observed = self.log_rate(matches)
+                if observed is None:
+                    observed = new_matches / max(now - player["last_poll"], 1.0) if player["last_poll"] else 0.0
+            else:
+                observed = new_matches / max(now - player["last_poll"], 1.0)
+            if player["polls"] == 0:
+                player["rate"] = observed
+            else:
+                player["rate"] = self.smoothing * observed + (1 - self.smoothing) * player["rate"]
+            player["last_poll"] = now
+            player["polls"] += 1
+            player["new"] += new_matches
+
+    def save(self):
+        with self.lock:
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.players, f)
+            os.replace(tmp_path, self.state_path)
+
+    def report(self, now: float) -> str:
+        polled = [p for p in self.players.values() if p["polls"]]
+        due = sum(1 for p in self.players.values() if self.expected_yield(p, now) >= self.min_yield)
+        active = sum(1 for p in polled if p["rate"] * 3600 >= 1)
+        return (f"{len(self.players)} players, {len(polled)} polled, {active} with 1+ battle/hour, "
+                f"{due} due now")
+
+
+def run_repolling(
+    json_file_path: str,
+    csv_file_path: str,
+    state_file: Optional[str] = None,
+    replay_index_file: str = "replay_index.bin",
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    burst: int = DEFAULT_BURST,
+    round_seconds: float = 60.0,
+    rounds: int = 0,
+    max_workers: int = 30,
+    columns: tuple = None, # type: ignore
+    min_yield: float = 1.0,
+):
+    """
+    Poll the players of a crawler output file in rounds of round_seconds,
+    spending requests_per_second * round_seconds requests per round on the
+    players with the most expected new battles. rounds=0 runs until stopped.
+    """
+    configure_rate_limiter(requests_per_second, burst)
+    configure_concurrency_limiter(max_limit=max_workers)
+    configure_http_client(pool_size=max_workers)
+    scheduler = RepollScheduler(state_file or f"{os.path.splitext(csv_file_path)[0]}.repoll.json",
+                                min_yield=min_yield)
+    added = scheduler.add_players(player["tag"] for player in iter_players(json_file_path))
+    print(f"Tracking {len(scheduler.players)} players ({added} new) in {scheduler.state_path}")
+    replay_index = ReplayIndex(replay_index_file)
+    writer = BattleLogWriter(csv_file_path, append=True, columns=list(columns) if columns else None) # type: ignore
+    budget = max(1, int(requests_per_second * round_seconds))
+
+    round_number = 0
+    total_new = total_polls = 0
+    in_round = False
+    try:
+        while not rounds or round_number < rounds:
+            round_number += 1
+            round_start = time.time()
+            selected = scheduler.select(round_start, budget)
+            if selected:
+                in_round = True
+                rows_before = writer.rows_written
+                failed_ids = pipelined_api_calls(
+                    selected, writer, max_workers=max_workers, columns=columns, replay_index=replay_index,
+                    label=f"Round {round_number}", on_fetched=scheduler.record,
+                )
+                # Battles must be on disk before the index and marks say so
+                writer.flush()
+                replay_index.save()
+                scheduler.save()
+                in_round = False
+                new_rows = writer.rows_written - rows_before
+                polls = len(selected) - len(failed_ids)
+                total_new += new_rows
+                total_polls += polls
+                print(f"Round {round_number}: {polls} polls, {new_rows} new battles "
+                      f"({new_rows / max(polls, 1):.2f}/call, {total_new / max(total_polls, 1):.2f}/call overall) | "
+                      f"{scheduler.report(time.time())}")
+            else:
+                print(f"Round {round_number}: nobody due | {scheduler.report(round_start)}")
+            remaining = round_seconds - (time.time() - round_start)
+            if remaining > 0 and (not rounds or round_number < rounds):
+                time.sleep(remaining)
+    except PipelineInterrupted:
+        # Every battle fetched in this round reached the writer, so the round can be saved like a complete one
+        writer.flush()
+        replay_index.save()
+        scheduler.save()
+        print(f"Stopping: round {round_number} was cut short, its battles and the state are saved")
+    except KeyboardInterrupt:
+        if in_round:
+            # Interrupted again while finishing a round: its battles are not in the index, so they are
+            # not kept either (rows flushed earlier in the round may be stored again on restart)
+            writer.discard()
+            print(f"Stopping: the unsaved battles of round {round_number} were discarded, "
+                  f"state saved after the last complete round")
+        else:
+            print("Stopping, state saved after the last complete round")
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-poll known players for new battles under a request budget")
+    parser.add_argument("--input", required=True, help="Crawler output with the players to follow (.json or .ndjson)")
+    parser.add_argument("--output", required=True, help="CSV the new battles are appended to")
+    parser.add_argument("--state", default=None, help="Scheduler state (default: <output>.repoll.json)")
+    parser.add_argument("--replay-index", default="replay_index.bin", help="Index of battles already stored")
+    parser.add_argument("--rate", type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help="API requests per second, which also sets the request budget of a round")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST, help="API requests sent back to back")
+    parser.add_argument("--round-seconds", type=float, default=60.0, help="Length of a polling round")
+    parser.add_argument("--rounds", type=int, default=0, help="Number of rounds (0: until stopped)")
+    parser.add_argument("--workers", type=int, default=30, help="Maximum requests in flight")
+    parser.add_argument("--min-yield", type=float, default=1.0,
+                        help="Expected new battles below which a player is not polled")
+    parser.add_argument("--preprocessor-columns", action="store_true",
+                        help="Only store the columns battle_log_data_preprocessor.py uses")
+    args = parser.parse_args()
+    run_repolling(
+        args.input, args.output, state_file=args.state, replay_index_file=args.replay_index,
+        requests_per_second=args.rate, burst=args.burst, round_seconds=args.round_seconds, rounds=args.rounds,
+        max_workers=args.workers, columns=tuple(PREPROCESSOR_COLUMNS) if args.preprocessor_columns else None,
+        min_yield=args.min_yield,
+    )
@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+# Error kinds worth another attempt; everything else fails immediately
+RETRYABLE_ERRORS = {"timeout", "connection", "rate_limited", "server"}
+
+
+def classify_error(error: Exception) -> str:
+    """Map a fetch exception to timeout, connection, rate_limited, server, not_found or other"""
+    if isinstance(error, requests.Timeout):
+        return "timeout"
+    if isinstance(error, requests.ConnectionError):
+        return "connection"
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status == 429:
+            return "rate_limited"
+        if status == 404:
+            return "not_found"
+        if status >= 500:
+            return "server"
+    return "other"
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    Exponential backoff with full jitter for the given (0-based) attempt.
+    A Retry-After header on a 429 is used as the minimum wait.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None and response.status_code == 429:
+        try:
+            delay = max(delay, float(response.headers.get("Retry-After", 0)))
+        except ValueError:
+            pass
+    return delay
+
+
+class RetryQueue:
+    """
+    Durable queue of tags whose fetch failed, one `tag,attempts` line per tag
+    (plain `tag` lines from older failed_ids files count as one attempt).
+
+    A collection pass drains the queue together with its own tags and then
+    calls `update`, which rewrites the file atomically: tags that succeeded
+    leave the queue, failed ones come back with one more attempt and tags
+    that reach `max_attempts` move to the `.dead` file.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 5):
+        self.path = path
+        self.dead_path = f"{path}.dead"
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, int]:
+        """Queued tags with their number of failed attempts"""
+        queued = {}
+        if not os.path.exists(self.path):
+            return queued
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                tag, _, attempts = line.partition(",")
+                queued[tag] = max(queued.get(tag, 0), int(attempts) if attempts.isdigit() else 1)
+        return queued
+
+    def update(self, attempted: Iterable[str], failed: Iterable[str]) -> List[str]:
+        """
+        Record the outcome of a pass over `attempted` tags, of which `failed`
+        failed again. Returns the tags given up on.
+        """
+        with self.lock:
+            queued = self.load()
+            failed = set(failed)
+            for tag in attempted:
+                if tag not in failed:
+                    queued.pop(tag, None)
+            for tag in failed:
+                queued[tag] = queued.get(tag, 0) + 1
+
+            dead = [tag for tag, attempts in queued.items() if attempts >= self.max_attempts]
+            if dead:
+                with open(self.dead_path, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{tag}\n" for tag in dead))
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for tag, attempts in queued.items():
+                    if attempts < self.max_attempts:
+                        f.write(f"{tag},{attempts}\n")
+            os.replace(tmp_path, self.path)
+            return dead
@@ -0,0 +1,259 @@
+import _thread
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import battle_log_final
+from battle_log_final import (BattleLogWriter, PipelineInterrupted, battle_log_from_json, flatten_matches, iter_players,
+                              pipelined_api_calls)
+from battle_schema import PREPROCESSOR_COLUMNS
+from mock_api_server import MockProfileBuilder, PlayerGraph
+from replay_index import ReplayIndex
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return PlayerGraph(n_players=60, matches_per_player=25, seed=7)
+
+
+@pytest.fixture
+def api(graph, monkeypatch):
+    """fetch_raw_matches served from the mock profiles; fetched tags are recorded"""
+    builder = MockProfileBuilder(graph)
+    fetched = []
+
+    def fetch(player_id, headers=None, archive=None):
+        fetched.append(player_id)
+        return player_id, "success", builder.build(player_id)["matches"]
+
+    monkeypatch.setattr(battle_log_final, "fetch_raw_matches", fetch)
+    return fetched
+
+
+def run(timeout=60, **kwargs):
+    """pipelined_api_calls in a thread, failing the test instead of hanging"""
+    result = {}
+
+    def target():
+        try:
+            result["failed"] = pipelined_api_calls(report_every=600, **kwargs)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline did not finish"
+    if "error" in result:
+        raise result["error"]
+    return result["failed"]
+
+
+def stored_tags(path):
+    return set(pd.read_csv(path, usecols=["replayTag"])["replayTag"])
+
+
+def expected_tags(graph, players):
+    builder = MockProfileBuilder(graph)
+    return {match["replayTag"] for tag in players for match in builder.build(tag)["matches"]}
+
+
+def test_pipeline_writes_every_battle_once(tmp_path, graph, api):
+    path = str(tmp_path / "battles.csv")
+    players = graph.tags[:20]
+    writer = BattleLogWriter(path, chunk_size=100)
+    index = ReplayIndex(str(tmp_path / "replay_index.bin"))
+    assert run(ids=players, writer=writer, max_workers=4, flatten_batch=3, replay_index=index) == []
+    writer.close()
+
+    battles = pd.read_csv(path, usecols=["replayTag"])
+    assert battles["replayTag"].is_unique
+    assert set(battles["replayTag"]) == expected_tags(graph, players)
+    assert sorted(api) == sorted(players)
+
+
+def test_failed_flatten_releases_the_batch(tmp_path, graph, api, monkeypatch):
+    bad_player = graph.tags[3]
+    bad_tags = expected_tags(graph, [bad_player])
+    flatten = battle_log_final.flatten_matches
+
+    def flaky_flatten(matches, columns=None):
+        if any(match["players"][0]["hashtag"] == bad_player for match in matches):
+            raise ValueError("unparseable battle")
+        return flatten(matches, columns)
+
+    monkeypatch.setattr(battle_log_final, "flatten_matches", flaky_flatten)
+    path = str(tmp_path / "battles.csv")
+    index = ReplayIndex(str(tmp_path / "replay_index.bin"))
+    writer = BattleLogWriter(path)
+    players = graph.tags[:10]
+    assert run(ids=players, writer=writer, max_workers=3, flatten_batch=1, replay_index=index) == [bad_player]
+    writer.close()
+    index.save()
+
+    # Battles the bad player shares with others were written through their logs
+    assert stored_tags(path) == expected_tags(graph, [p for p in players if p != bad_player])
+    assert bad_player not in index.high_water
+    assert len(index) == len(stored_tags(path))
+    assert bad_tags - stored_tags(path)
+
+
+def test_fetch_worker_survives_a_failing_hook(tmp_path, graph, api):
+    bad_player = graph.tags[5]
+
+    def on_fetched(player_id, matches, new_matches):
+        if player_id == bad_player:
+            raise RuntimeError("hook failed")
+
+    index = ReplayIndex(str(tmp_path / "replay_index.bin"))
+    writer = BattleLogWriter(str(tmp_path / "battles.csv"))
+    players = graph.tags[:12]
+    # A single fetcher: had it died, the remaining players would never be fetched
+    failed = run(ids=players, writer=writer, max_workers=1, replay_index=index, on_fetched=on_fetched)
+    writer.close()
+    index.save()
+
+    assert failed == [bad_player]
+    assert sorted(api) == sorted(players)
+    assert bad_player not in index.high_water
+    assert set(index.high_water) == set(players) - {bad_player}
+
+
+def test_failing_claim_does_not_block_the_fetchers(tmp_path, graph, api):
+    class BrokenIndex(ReplayIndex):
+        def claim(self, matches, owner=None):
+            raise OSError("index unavailable")
+
+    index = BrokenIndex(str(tmp_path / "replay_index.bin"))
+    writer = BattleLogWriter(str(tmp_path / "battles.csv"))
+    players = graph.tags[:30]
+    # Queues far smaller than the work: a dead flattener would leave the fetchers blocked
+    failed = run(ids=players, writer=writer, max_workers=4, flatten_workers=1, queue_size=1, flatten_batch=1,
+                 replay_index=index)
+    writer.close()
+
+    assert sorted(failed) == sorted(players)
+    assert index.high_water == {} and not any(index.marks.values())
+
+
+def test_write_errors_are_raised_after_draining(tmp_path, graph, api):
+    class BrokenWriter(BattleLogWriter):
+        def write_frame(self, frame):
+            raise OSError("disk full")
+
+    writer = BrokenWriter(str(tmp_path / "battles.csv"))
+    with pytest.raises(OSError, match="disk full"):
+        run(ids=graph.tags[:20], writer=writer, max_workers=4, queue_size=1, flatten_batch=1)
+
+
+def test_interrupt_finishes_the_requests_in_flight(tmp_path, graph, monkeypatch):
+    builder = MockProfileBuilder(graph)
+    fetched = []
+    lock = threading.Lock()
+
+    def fetch(player_id, headers=None, archive=None):
+        with lock:
+            fetched.append(player_id)
+            if len(fetched) == 5:
+                _thread.interrupt_main()
+        time.sleep(0.02)
+        return player_id, "success", builder.build(player_id)["matches"]
+
+    monkeypatch.setattr(battle_log_final, "fetch_raw_matches", fetch)
+    path = str(tmp_path / "battles.csv")
+    writer = BattleLogWriter(path, chunk_size=10)
+    index = ReplayIndex(str(tmp_path / "replay_index.bin"))
+    players = graph.tags
+    # In the main thread, where Ctrl-C lands; the short report interval keeps the joins waking up
+    with pytest.raises(PipelineInterrupted) as interrupted:
+        pipelined_api_calls(players, writer, max_workers=3, report_every=0.01, replay_index=index)
+    writer.close()
+    index.save()
+
+    assert interrupted.value.failed_ids == []
+    assert 5 <= len(fetched) < len(players)
+    # Every battle fetched before the workers stopped was written, and only those
+    assert stored_tags(path) == expected_tags(graph, fetched)
+    assert set(index.high_water) == set(fetched)
+
+
+def write_and_close(path, frames, **kwargs):
+    writer = BattleLogWriter(str(path), **kwargs)
+    for frame in frames:
+        writer.write_frame(pd.DataFrame(frame))
+    writer.close()
+    return writer
+
+
+def test_writer_adds_new_columns_to_the_header(tmp_path):
+    path = tmp_path / "battles.csv"
+    writer = write_and_close(path, [{"a": [1], "b": [2]}, {"a": [3], "c": [4]}, {"b": [5]}], chunk_size=1)
+    battles = pd.read_csv(path)
+    assert list(battles.columns) == ["a", "b", "c"]
+    assert battles.fillna(0).astype(int).values.tolist() == [[1, 2, 0], [3, 0, 4], [0, 5, 0]]
+    assert writer.rows_written == 3
+
+
+def test_writer_buffers_rows_until_a_chunk_is_full(tmp_path):
+    path = tmp_path / "battles.csv"
+    writer = BattleLogWriter(str(path), chunk_size=3)
+    writer.write_rows([{"a": 1}, {"a": 2}])
+    assert not path.exists()
+    writer.write_rows([{"a": 3}])
+    assert len(pd.read_csv(path)) == 3
+    writer.write_rows([{"a": 4}])
+    writer.discard()
+    writer.close()
+    assert pd.read_csv(path)["a"].tolist() == [1, 2, 3]
+
+
+def test_writer_appends_to_an_existing_csv(tmp_path):
+    path = tmp_path / "battles.csv"
+    write_and_close(path, [{"a": [1], "b": [2]}])
+    write_and_close(path, [{"b": [3], "c": [4]}])
+    battles = pd.read_csv(path)
+    assert list(battles.columns) == ["a", "b", "c"]
+    assert battles["b"].tolist() == [2, 3]
+
+    write_and_close(path, [{"d": [5]}], append=False)
+    assert pd.read_csv(path).to_dict("list") == {"d": [5]}
+
+
+def test_iter_players_skips_a_torn_line(tmp_path, capsys):
+    path = tmp_path / "players.ndjson"
+    path.write_text('{"tag": "#A"}\n\n{"tag": "#B"}\n{"tag": "#C"}\n{"tag": "#TO', encoding="utf-8")
+    assert [player["tag"] for player in iter_players(str(path))] == ["#A", "#B", "#C"]
+    assert "line 5" in capsys.readouterr().out
+    assert [player["tag"] for player in iter_players(str(path), (2, 4))] == ["#B", "#C"]
+
+
+def test_iter_players_reads_json_output(tmp_path):
+    path = tmp_path / "players.json"
+    path.write_text('{"metadata": {}, "players": [{"tag": "#A"}, {"tag": "#B"}, {"tag": "#C"}]}', encoding="utf-8")
+    assert [player["tag"] for player in iter_players(str(path), (1, 3))] == ["#B", "#C"]
+
+
+@pytest.mark.parametrize("columns", [None, tuple(PREPROCESSOR_COLUMNS)])
+def test_collected_columns(tmp_path, graph, api, columns):
+    player = graph.tags[0]
+    players = tmp_path / "players.ndjson"
+    players.write_text(json.dumps({"tag": player}) + "\n", encoding="utf-8")
+    path = str(tmp_path / "battles.csv")
+    battle_log_from_json(str(players), path, csv_file_path_failed=str(tmp_path / "failed.csv"), max_workers=1,
+                         flatten_workers=1, columns=columns, replay_index_file=str(tmp_path / "replay_index.bin"))
+
+    matches = MockProfileBuilder(graph).build(player)["matches"]
+    # A full flatten keeps the battles' own column order, a projection stores exactly its columns
+    expected = list(flatten_matches(matches).columns) if columns is None else list(PREPROCESSOR_COLUMNS)
+    assert list(pd.read_csv(path, nrows=0).columns) == expected
+
+
+def test_projection_header_is_written_without_battles(tmp_path):
+    path = tmp_path / "battles.csv"
+    BattleLogWriter(str(path), columns=list(PREPROCESSOR_COLUMNS)).close()
+    assert list(pd.read_csv(path).columns) == list(PREPROCESSOR_COLUMNS)
+    BattleLogWriter(str(tmp_path / "full.csv")).close()
+    assert not (tmp_path / "full.csv").exists()
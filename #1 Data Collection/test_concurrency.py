@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from cancellation import Cancelled, CancellationToken
+from concurrency import AdaptiveConcurrencyLimiter
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+def fail(limiter, error, cancel_token=None):
+    with pytest.raises(type(error)):
+        with limiter.slot(cancel_token):
+            raise error
+
+
+def succeed(limiter, times=1):
+    for _ in range(times):
+        with limiter.slot():
+            pass
+
+
+def test_limit_grows_by_about_one_per_round():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=5, initial_limit=2)
+    succeed(limiter, 2)
+    assert limiter.current_limit == 2
+    succeed(limiter)
+    assert limiter.current_limit == 3
+    succeed(limiter, 100)
+    assert limiter.current_limit == 5
+    assert [limit for _, limit in limiter.history] == [2, 3, 4, 5]
+
+
+def test_slow_response_does_not_grow_the_limit():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=10, initial_limit=4, latency_tolerance=2.0)
+    with limiter.slot():
+        time.sleep(0.01)
+    grown = limiter.limit
+    with limiter.slot():
+        time.sleep(0.1)
+    assert limiter.limit == grown
+    assert limiter.successes == 2
+
+
+@pytest.mark.parametrize("error", [http_error(429), http_error(503), requests.Timeout(), requests.ConnectionError()])
+def test_overload_halves_the_limit_once_per_cooldown(error):
+    limiter = AdaptiveConcurrencyLimiter(max_limit=32, initial_limit=16, backoff_cooldown=60)
+    fail(limiter, error)
+    assert limiter.current_limit == 8
+    # Further failures of the same burst count as one signal
+    fail(limiter, error)
+    assert limiter.current_limit == 8
+    assert limiter.overloads == 2
+    assert limiter.in_flight == 0
+
+
+def test_limit_never_drops_below_the_minimum():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, min_limit=2, initial_limit=8, backoff_cooldown=0)
+    for _ in range(5):
+        fail(limiter, http_error(429))
+    assert limiter.current_limit == 2
+
+
+def test_other_errors_leave_the_limit_alone():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, initial_limit=4, backoff_cooldown=0)
+    fail(limiter, http_error(404))
+    fail(limiter, ValueError("bad payload"))
+    assert limiter.limit == 4
+    assert limiter.overloads == 0
+
+
+def test_aborted_request_of_a_cancelled_crawl_is_not_an_overload():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, initial_limit=4, backoff_cooldown=0)
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(Cancelled):
+        with limiter.slot(token):
+            pass
+    crawl_token = CancellationToken()
+    with pytest.raises(requests.ConnectionError):
+        with limiter.slot(crawl_token):
+            crawl_token.cancel()
+            raise requests.ConnectionError()
+    assert limiter.limit == 4
+
+
+def hold_slot(limiter, entered, release, cancel_token=None, errors=None):
+    """Thread target: take a slot, signal entered and keep it until release is set"""
+    try:
+        with limiter.slot(cancel_token):
+            entered.set()
+            release.wait(5)
+    except Cancelled as e:
+        errors.append(e)
+
+
+def test_slot_waits_for_a_free_slot():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=1, initial_limit=1)
+    first_in, second_in, release_first, release_second = (threading.Event() for _ in range(4))
+    first = threading.Thread(target=hold_slot, args=(limiter, first_in, release_first))
+    second = threading.Thread(target=hold_slot, args=(limiter, second_in, release_second))
+    first.start()
+    assert first_in.wait(1)
+    second.start()
+    assert not second_in.wait(0.1)
+    assert limiter.in_flight == 1
+
+    release_first.set()
+    assert second_in.wait(1)
+    release_second.set()
+    first.join()
+    second.join()
+    assert limiter.in_flight == 0
+
+
+def test_cancel_wakes_threads_waiting_for_a_slot():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=1, initial_limit=1)
+    token = CancellationToken()
+    token.on_cancel(limiter.wake_all)
+    holder_in, release, waiter_in = threading.Event(), threading.Event(), threading.Event()
+    errors = []
+    holder = threading.Thread(target=hold_slot, args=(limiter, holder_in, release))
+    waiter = threading.Thread(target=hold_slot, args=(limiter, waiter_in, release, token, errors))
+    holder.start()
+    assert holder_in.wait(1)
+    waiter.start()
+    time.sleep(0.05)
+
+    token.cancel()
+    waiter.join(1)
+    assert not waiter.is_alive()
+    assert not waiter_in.is_set() and len(errors) == 1
+    release.set()
+    holder.join()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from cancellation import Cancelled, CancellationToken
+from rate_limiter import RateLimiter
+
+
+def timed(fn):
+    start = time.monotonic()
+    fn()
+    return time.monotonic() - start
+
+
+def test_burst_then_rate():
+    limiter = RateLimiter(rate=50, burst=3)
+    assert timed(lambda: [limiter.acquire() for _ in range(3)]) < 0.02
+    # Each further request waits for its own token
+    assert 0.08 <= timed(lambda: [limiter.acquire() for _ in range(5)]) < 0.3
+
+
+def test_rate_is_shared_by_all_threads():
+    limiter = RateLimiter(rate=100, burst=1)
+
+    def acquire_many():
+        for _ in range(5):
+            limiter.acquire()
+
+    def run_threads():
+        threads = [threading.Thread(target=acquire_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # 20 requests, the first one from the burst
+    assert 0.17 <= timed(run_threads) < 0.5
+
+
+def test_cancel_ends_the_wait():
+    limiter = RateLimiter(rate=0.5, burst=1)
+    limiter.acquire()
+    token = CancellationToken()
+    threading.Timer(0.05, token.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(Cancelled):
+        limiter.acquire(token)
+    assert time.monotonic() - start < 1
+
+
+def test_cancelled_token_takes_no_token():
+    limiter = RateLimiter(rate=1, burst=1)
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(Cancelled):
+        limiter.acquire(token)
+    assert timed(limiter.acquire) < 0.02
+
+
+def test_no_rate_never_waits():
+    limiter = RateLimiter(rate=None, burst=1)
+    assert timed(lambda: [limiter.acquire() for _ in range(1000)]) < 0.1
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 1), (-1, 1), (1, 0)])
+def test_invalid_budget(rate, burst):
+    with pytest.raises(ValueError):
+        RateLimiter(rate, burst)
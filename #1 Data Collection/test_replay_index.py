@@ -0,0 +1,142 @@
+import numpy as np
+
+from replay_index import ReplayIndex, replay_hash
+
+
+def battle(tag, timestamp=0):
+    return {"replayTag": tag, "timestamp": timestamp}
+
+
+def tags(matches):
+    return [match["replayTag"] for match in matches]
+
+
+def test_replay_hash_is_stable():
+    assert replay_hash("ABC") == replay_hash("ABC")
+    assert replay_hash("ABC") != replay_hash("ABD")
+    assert 0 <= replay_hash("ABC") < 2 ** 64
+
+
+def test_claim_skips_battles_already_claimed(tmp_path):
+    index = ReplayIndex(str(tmp_path / "replay_index.bin"))
+    assert tags(index.claim([battle("A"), battle("B"), battle("A")])) == ["A", "B"]
+    assert tags(index.claim([battle("B"), battle("C")])) == ["C"]
+    assert len(index) == 3
+    assert index.skipped_duplicate == 2
+
+
+def test_claim_keeps_battles_without_replay_tag(tmp_path):
+    index = ReplayIndex(str(tmp_path / "replay_index.bin"))
+    untagged = [{"timestamp": 1}, {"replayTag": "", "timestamp": 2}]
+    assert index.claim(untagged) == untagged
+    assert index.claim(untagged) == untagged
+    assert len(index) == 0
+
+
+def test_save_round_trip(tmp_path):
+    path = str(tmp_path / "replay_index.bin")
+    index = ReplayIndex(path)
+    index.claim([battle("A"), battle("B")])
+    index.save()
+    index.claim([battle("C")])
+    index.save()
+
+    reloaded = ReplayIndex(path)
+    assert len(reloaded) == 3
+    assert np.all(np.diff(reloaded.stored.astype(np.float64)) > 0)
+    assert tags(reloaded.claim([battle("A"), battle("C"), battle("D")])) == ["D"]
+
+
+def test_nothing_is_persisted_without_save(tmp_path):
+    path = str(tmp_path / "replay_index.bin")
+    index = ReplayIndex(path)
+    index.newer_than_mark("P", [battle("A", 10)])
+    index.claim([battle("A", 10)])
+
+    reloaded = ReplayIndex(path)
+    assert len(reloaded) == 0
+    assert reloaded.high_water == {}
+
+
+def test_high_water_marks_round_trip(tmp_path):
+    path = str(tmp_path / "replay_index.bin")
+    index = ReplayIndex(path)
+    log = [battle("A", 10), battle("B", 20)]
+    assert index.newer_than_mark("P", log) == log
+    index.save()
+
+    reloaded = ReplayIndex(path)
+    assert reloaded.high_water == {"P": 20}
+    newer = reloaded.newer_than_mark("P", [battle("C", 30)] + log)
+    assert tags(newer) == ["C"]
+    assert reloaded.skipped_old == 2
+
+
+def test_release_forgets_an_owners_claims_and_marks(tmp_path):
+    path = str(tmp_path / "replay_index.bin")
+    index = ReplayIndex(path)
+    index.newer_than_mark("P", [battle("A", 10)], owner="job")
+    index.claim([battle("A", 10)], owner="job")
+    index.release("job")
+    assert len(index) == 0
+    assert tags(index.claim([battle("A", 10)])) == ["A"]
+    index.save()
+    assert ReplayIndex(path).high_water == {}
+
+
+def test_shards_save_and_release_only_their_own_claims(tmp_path):
+    path = str(tmp_path / "replay_index.bin")
+    index = ReplayIndex(path)
+    first, second = index.shard("first"), index.shard("second")
+
+    first.newer_than_mark("P1", [battle("A", 10)])
+    assert tags(first.claim([battle("A", 10), battle("B", 11)])) == ["A", "B"]
+    second.newer_than_mark("P2", [battle("B", 11), battle("C", 12)])
+    # B is claimed by the first shard, so the second one skips it
+    assert tags(second.claim([battle("B", 11), battle("C", 12)])) == ["C"]
+    assert len(first) == len(second) == len(index) == 3
+
+    first.save()
+    second.release()
+
+    reloaded = ReplayIndex(path)
+    assert len(reloaded) == 2
+    assert reloaded.high_water == {"P1": 10}
+    assert tags(reloaded.claim([battle("A"), battle("B"), battle("C")])) == ["C"]
+    # The released battle can be claimed again in the same run too
+    assert tags(second.claim([battle("C", 12)])) == ["C"]
+
+
+def test_release_matches_undoes_a_failed_batch(tmp_path):
+    path = str(tmp_path / "replay_index.bin")
+    index = ReplayIndex(path)
+    index.newer_than_mark("P1", [battle("A", 10)])
+    index.newer_than_mark("P2", [battle("B", 20)])
+    kept = index.claim([battle("A", 10), battle("B", 20)])
+
+    # The batch holding B (from P2) could not be flattened
+    index.release_matches([match for match in kept if match["replayTag"] == "B"], ["P2"])
+    assert len(index) == 1
+    index.save()
+
+    reloaded = ReplayIndex(path)
+    assert reloaded.high_water == {"P1": 10}
+    assert tags(reloaded.claim([battle("A", 10), battle("B", 20)])) == ["B"]
+
+
+def test_release_matches_through_a_shard(tmp_path):
+    path = str(tmp_path / "replay_index.bin")
+    index = ReplayIndex(path)
+    first, second = index.shard("first"), index.shard("second")
+    second.newer_than_mark("P", [battle("B", 20)])
+    first.claim([battle("A")])
+    claimed = second.claim([battle("B", 20), battle("C", 21)])
+
+    second.release_matches(claimed[:1], ["P"])
+    assert tags(index.claim([battle("B"), battle("C")])) == ["B"]
+    index.release(None)
+    index.save(["first", "second"])
+
+    reloaded = ReplayIndex(path)
+    assert reloaded.high_water == {}
+    assert tags(reloaded.claim([battle("A"), battle("B"), battle("C")])) == ["B"]
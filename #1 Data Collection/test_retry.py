@@ -0,0 +1,74 @@
+import random
+
+import pytest
+import requests
+
+from retry import RetryQueue, backoff_delay, classify_error
+
+
+def http_error(status: int, headers=None) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("attempt", range(8))
+def test_backoff_delay_stays_within_the_jitter_window(attempt):
+    random.seed(attempt)
+    ceiling = min(30.0, 1.0 * 2 ** attempt)
+    delays = [backoff_delay(attempt) for _ in range(500)]
+    assert all(0 <= delay <= ceiling for delay in delays)
+    # Full jitter spreads the delays over the whole window
+    assert max(delays) - min(delays) > ceiling / 2
+
+
+def test_backoff_delay_is_capped():
+    assert all(backoff_delay(20, cap=5.0) <= 5.0 for _ in range(200))
+
+
+def test_backoff_delay_waits_at_least_retry_after():
+    error = http_error(429, {"Retry-After": "7"})
+    assert all(7.0 <= backoff_delay(0, error) <= 7.0 + 1.0 for _ in range(100))
+
+
+def test_backoff_delay_ignores_unusable_retry_after():
+    assert backoff_delay(0, http_error(429, {"Retry-After": "soon"})) <= 1.0
+    # Only a 429 is a request to slow down
+    assert backoff_delay(0, http_error(503, {"Retry-After": "7"})) <= 1.0
+
+
+def test_classify_error():
+    assert classify_error(requests.Timeout()) == "timeout"
+    assert classify_error(requests.ConnectionError()) == "connection"
+    assert classify_error(http_error(429)) == "rate_limited"
+    assert classify_error(http_error(404)) == "not_found"
+    assert classify_error(http_error(502)) == "server"
+    assert classify_error(ValueError()) == "other"
+
+
+def test_retry_queue_update_round_trip(tmp_path):
+    queue = RetryQueue(str(tmp_path / "failed_ids.csv"), max_attempts=3)
+    assert queue.load() == {}
+
+    assert queue.update(["A", "B", "C"], failed=["A", "B"]) == []
+    assert queue.load() == {"A": 1, "B": 1}
+
+    # B succeeds on the retry, A fails again
+    queue.update(["A", "B"], failed=["A"])
+    assert queue.load() == {"A": 2}
+
+
+def test_retry_queue_gives_up_after_max_attempts(tmp_path):
+    queue = RetryQueue(str(tmp_path / "failed_ids.csv"), max_attempts=2)
+    queue.update(["A", "B"], failed=["A", "B"])
+    assert queue.update(["A", "B"], failed=["A"]) == ["A"]
+    assert queue.load() == {}
+    with open(queue.dead_path, encoding="utf-8") as f:
+        assert f.read() == "A\n"
+
+
+def test_retry_queue_reads_plain_tag_lines(tmp_path):
+    path = tmp_path / "failed_ids.csv"
+    path.write_text("A\nB,3\n\nA\n", encoding="utf-8")
+    assert RetryQueue(str(path)).load() == {"A": 1, "B": 3}
@@ -2,6 +2,12 @@ import pandas as pd
 import ast
 import warnings
 
+import numpy as np
+
+from card_catalog import encode_deck, load_catalog
+from deck_bitset import deck_bitsets
+from deck_storage import BattleWriter, write_battles
+
 # --- Setup ---
 # Suppress warnings for cleaner output
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -16,24 +22,33 @@ rarity_increase = {
         "champion": 10
     }
 
+# --- Function to Load a Card List ---
+def load_card_list(cards_str):
+    """
+    Safely evaluates a string representation of a list of dictionaries.
+    Returns an empty list for missing or malformed values.
+    """
+    if pd.isna(cards_str):
+        return []
+    try:
+        cards_list = ast.literal_eval(cards_str)
+    except (ValueError, SyntaxError, TypeError):
+        return []
+    return cards_list if isinstance(cards_list, list) else []
+
 # --- Function to Parse Spells ---
 def parse_spells(spells_str):
     """
     Safely evaluates a string representation of a list of dictionaries
     and converts it into a list of (icon, l) tuples.
     """
-    # Handle empty or NaN values first
-    if pd.isna(spells_str):
-        return []  # Return an empty list for missing data
-    
-    try:
-        # Safely evaluate the string as a Python literal (list of dicts)
-        spells_list = ast.literal_eval(spells_str)
-        
-        # Ensure it's a list
-        if not isinstance(spells_list, list):
-            return []
+    return spell_tuples(load_card_list(spells_str))
 
+def spell_tuples(spells_list):
+    """
+    Converts a list of card dictionaries into a list of (name, level, evo) tuples.
+    """
+    try:
         parsed_tuples = []
         for spell_dict in spells_list:
             # Ensure each item is a dict and has the required keys
@@ -44,8 +59,8 @@ def parse_spells(spells_str):
                     parsed_tuples.append((spell_dict['name'], spell_dict['nl'], 0))
         
         return parsed_tuples
-    except (ValueError, SyntaxError, TypeError):
-        # Handle cases where the string is not a valid list literal
+    except TypeError:
+        # Handle cards with unexpected field types
         return []
     
 # --- Parsing Function 2: Support Cards (NEW) ---
@@ -73,56 +88,125 @@ def parse_support_cards(support_cards_str):
         # Handle cases where the string is not a valid list literal
         return []
 
+# --- Columns Kept from the Raw Scrape ---
+COLUMNS_TO_KEEP = [
+    "replayTag", "arena", "game_config_name", "players_0_avgManaCost", "players_0_hashtag", "players_0_score",
+    "players_0_stars", "players_0_winner", "players_0_elixirLeaked", "players_0_supportCards",
+    'players_0_spells', "players_0_kingTowerHitPoints", "players_0_princessTowersHitPoints",
+    "players_1_avgManaCost", "players_1_hashtag", "players_1_score", "players_1_stars",
+    "players_1_winner", "players_1_elixirLeaked", "players_1_spells", 'players_1_supportCards',
+    "players_1_kingTowerHitPoints", "players_1_princessTowersHitPoints"
+]
+
+# Dtypes for chunked reads, so every chunk is written with the same schema
+# (an int column with one missing value would otherwise turn float in that chunk only)
+COLUMN_DTYPES = {
+    column: "Int64" if column.split("_")[-1] in ("arena", "score", "stars", "winner", "kingTowerHitPoints")
+    else "float64" if column.endswith(("avgManaCost", "elixirLeaked"))
+    else "string"
+    for column in COLUMNS_TO_KEEP
+}
+
+# --- Preprocessing of a Frame of Raw Battles ---
+def preprocess_battles(df, catalog=None):
+    """
+    Keeps the COLUMNS_TO_KEEP of the Ladder battles in df and parses their
+    decks and support cards. Works on a whole scrape or on one chunk of it.
+    """
+    if catalog is None:
+        catalog = load_catalog()
+
+    # 1. Keep the columns that exist in the loaded CSV
+    existing_columns_to_keep = [col for col in COLUMNS_TO_KEEP if col in df.columns]
+    results_df = df[existing_columns_to_keep].copy()
+
+    # 2. Filter in "Ladder" rows
+    if "game_config_name" in results_df.columns:
+        results_df = results_df[results_df["game_config_name"] == "Ladder"].copy()
+
+    # Decks are kept as (name, level, evo) tuples and encoded as card codes (see card_catalog.py)
+    for player in (0, 1):
+        spells_column = f'players_{player}_spells'
+        if spells_column in results_df.columns:
+            spells = results_df[spells_column].apply(load_card_list)
+            results_df[spells_column] = spells.apply(spell_tuples)
+            encoded = [encode_deck(deck, catalog) for deck in spells]
+            results_df[f'players_{player}_deck'] = [codes for codes, _, _ in encoded]
+            results_df[f'players_{player}_deck_levels'] = [levels for _, levels, _ in encoded]
+            results_df[f'players_{player}_evo_mask'] = [evo_mask for _, _, evo_mask in encoded]
+            # ... and as a 128-bit card set in two uint64 words (see deck_bitset.py)
+            codes = np.array([codes for codes, _, _ in encoded], dtype=np.uint16).reshape(-1, 8)
+            lo, hi = deck_bitsets(codes)
+            results_df[f'players_{player}_deck_bits_lo'] = lo
+            results_df[f'players_{player}_deck_bits_hi'] = hi
+
+    # Apply Support Cards Transformation
+    for player in (0, 1):
+        support_column = f'players_{player}_supportCards'
+        if support_column in results_df.columns:
+            results_df[support_column] = results_df[support_column].apply(parse_support_cards)
+
+    return results_df
+
+# --- Chunked Processing ---
+def iter_preprocessed_chunks(input_filename, chunksize):
+    """
+    Yields (raw row count, preprocessed chunk) for every chunksize rows of
+    the scrape, reading only COLUMNS_TO_KEEP
+    """
+    catalog = load_catalog()
+    chunks = pd.read_csv(input_filename, usecols=lambda column: column in COLUMN_DTYPES, dtype=COLUMN_DTYPES,
+                         chunksize=chunksize)
+    for chunk in chunks:
+        yield len(chunk), preprocess_battles(chunk, catalog)
+
+def preprocess_in_chunks(input_filename, output_path, chunksize):
+    """
+    Streams the scrape through preprocess_battles chunksize rows at a time,
+    appending each chunk to the output, so peak memory depends on chunksize
+    instead of on the file size.
+    Returns the number of rows read and written.
+    """
+    rows_read = 0
+    with BattleWriter(output_path) as writer:
+        for chunk_rows, results_df in iter_preprocessed_chunks(input_filename, chunksize):
+            rows_read += chunk_rows
+            writer.write(results_df)
+            print(f"Processed {rows_read:,} rows ({writer.rows:,} Ladder battles kept).")
+    return rows_read, writer.rows
+
 # --- Main Processing ---
 def main(input_filename = "../#2 Data Storage/scrapped_data/semi_data_trail.csv",
-         output_filename = "preprocessed_battle_log.csv"):
+         output_filename = "preprocessed_battle_log.parquet", chunksize=None):
+    """
+    Keep the Ladder battles and parse their decks and support cards.
+    A .parquet output stores them as typed list columns, a .csv output as
+    tuple-list strings; load either with deck_storage.read_battles.
+    With chunksize, the scrape is processed in chunks of that many rows
+    (see preprocess_in_chunks) instead of being loaded at once.
+    """
+    output_path = f"../Processed Data/{output_filename}"
 
     try:
+        if chunksize:
+            rows_read, rows_written = preprocess_in_chunks(input_filename, output_path, chunksize)
+            print(f"\nSuccessfully preprocessed all data and saved to '{output_filename}'")
+            print("number of rows dropped", rows_read - rows_written)
+            return
+
         # Load the dataframe
         df = pd.read_csv(input_filename, low_memory=False)
         print(f"Successfully loaded '{input_filename}'.")
 
-        # 1. Define the columns you want to keep
-        columns_to_keep = [
-            "replayTag", "arena", "game_config_name", "players_0_avgManaCost", "players_0_hashtag", "players_0_score",
-            "players_0_stars", "players_0_winner", "players_0_elixirLeaked", "players_0_supportCards",
-            'players_0_spells', "players_0_kingTowerHitPoints", "players_0_princessTowersHitPoints",
-            "players_1_avgManaCost", "players_1_hashtag", "players_1_score", "players_1_stars",
-            "players_1_winner", "players_1_elixirLeaked", "players_1_spells", 'players_1_supportCards',
-            "players_1_kingTowerHitPoints", "players_1_princessTowersHitPoints"
-        ]
-
-        # Filter out any columns that don't exist in the loaded CSV
-        existing_columns_to_keep = [col for col in columns_to_keep if col in df.columns]
-        
-        # Create the new dataframe
-        results_df = df[existing_columns_to_keep].copy()
-        
-    
-        # 2. Filter in "Ladder" rows
+        results_df = preprocess_battles(df)
         if "game_config_name" in results_df.columns:
-            results_df = results_df[results_df["game_config_name"] == "Ladder"].copy()
             print("Filtered in 'Ladder' rows.")
-
-        if 'players_0_spells' in results_df.columns:
-            results_df['players_0_spells'] = results_df['players_0_spells'].apply(parse_spells)
-            print("Processed 'players_0_spells'.")
-
-        if 'players_1_spells' in results_df.columns:
-            results_df['players_1_spells'] = results_df['players_1_spells'].apply(parse_spells)
-            print("Processed 'players_1_spells'.")
-
-        # Apply Support Cards Transformation
-        if 'players_0_supportCards' in results_df.columns:
-            results_df['players_0_supportCards'] = results_df['players_0_supportCards'].apply(parse_support_cards)
-            print("Processed 'players_0_supportCards'.")
-
-        if 'players_1_supportCards' in results_df.columns:
-            results_df['players_1_supportCards'] = results_df['players_1_supportCards'].apply(parse_support_cards)
-            print("Processed 'players_1_supportCards'.")
+        for column in ('players_0_spells', 'players_1_spells', 'players_0_supportCards', 'players_1_supportCards'):
+            if column in results_df.columns:
+                print(f"Processed '{column}'.")
 
         # Save the preprocessed data
-        results_df.to_csv(f"../Processed Data/{output_filename}", index=False)
+        write_battles(results_df, output_path)
         print(f"\nSuccessfully preprocessed all data and saved to '{output_filename}'")
 
         # Optional: Display info and head to verify the new columns
@@ -138,4 +222,4 @@ def main(input_filename = "../#2 Data Storage/scrapped_data/semi_data_trail.csv"
     except FileNotFoundError:
         print(f"Error: The file '{input_filename}' was not found.")
     except Exception as e:
-        print(f"An error occurred: {e}")
\ No newline at end of file
+        print(f"An error occurred: {e}")
@@ -0,0 +1,136 @@
+"""
+Integer codes for cards.
+
+Every card gets a small, stable code derived from its game ID:
+troops (26xxxxxx), buildings (27xxxxxx), spells (28xxxxxx) and tower troops
+(159xxxxxx) map to 1-999, 1001-1999, 2001-2999 and 3001-3999. For example,
+Knight (26000000) is 1, Cannon (27000000) is 1001 and Fireball (28000000)
+is 2001. Code 0 marks an empty deck slot. The code depends only on the
+game ID, so it is the same in every dataset and never needs renumbering
+when new cards are released.
+
+An encoded deck is three values:
+- 8 card codes (uint16),
+- 8 card levels (uint8),
+- an evo bitmask (uint8), where bit i is set when slot i holds an evolution.
+
+The CardCatalog maps codes back to names and card details. It is read from
+card_id_mapping.csv, or from gamedata-v4.json when the CSV is missing.
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DECK_SIZE = 8
+EMPTY_SLOT = 0
+# Game ID prefixes in code order: troops, buildings, spells, tower troops
+CARD_KINDS = (26, 27, 28, 159)
+CODE_BLOCK = 1000
+
+CARD_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "# 0 Data Scraping", "card_data_scraping")
+CARD_ID_MAPPING = os.path.join(CARD_DATA_DIR, "card_id_mapping.csv")
+GAMEDATA = os.path.join(CARD_DATA_DIR, "gamedata-v4.json")
+
+
+def card_code(card_id: int) -> int:
+    """Code of a game card ID, 0 for IDs outside the known card kinds"""
+    kind, number = divmod(int(card_id), 1_000_000)
+    if kind not in CARD_KINDS or number >= CODE_BLOCK - 1:
+        return EMPTY_SLOT
+    return CARD_KINDS.index(kind) * CODE_BLOCK + number + 1
+
+
+def card_id(code: int) -> int:
+    """Game card ID of a code"""
+    block, number = divmod(int(code) - 1, CODE_BLOCK)
+    return CARD_KINDS[block] * 1_000_000 + number
+
+
+class CardCatalog:
+    """Names and details of the cards, indexed by code"""
+
+    def __init__(self, cards: List[Dict]):
+        # cards: dicts with at least "id" and "name"
+        self.cards: Dict[int, Dict] = {}
+        for card in cards:
+            code = card_code(card["id"])
+            if code != EMPTY_SLOT:
+                self.cards[code] = dict(card, code=code)
+        self.codes_by_name = {card["name"]: code for code, card in self.cards.items()}
+        # names[code] decodes whole arrays of codes at once; unknown codes decode to ""
+        self.names = np.full(len(CARD_KINDS) * CODE_BLOCK, "", dtype=object)
+        for code, card in self.cards.items():
+            self.names[code] = card["name"]
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def code(self, name: str) -> int:
+        return self.codes_by_name.get(name, EMPTY_SLOT)
+
+    def name(self, code: int) -> str:
+        card = self.cards.get(int(code))
+        return card["name"] if card else f"Card {card_id(code)}"
+
+    def deck_names(self, codes) -> List[str]:
+        """Names of the cards of one encoded deck, empty slots left out"""
+        return [self.name(code) for code in codes if code != EMPTY_SLOT]
+
+    @classmethod
+    def from_mapping_csv(cls, path: str = CARD_ID_MAPPING) -> "CardCatalog":
+        mapping = pd.read_csv(path)
+        return cls([
+            {"id": int(row.id), "name": row.englishName, "elixir": row.elixir_cost,
+             "rarity": row.rarity, "has_evo": bool(row.is_evo)}
+            for row in mapping.itertuples()
+        ])
+
+    @classmethod
+    def from_gamedata(cls, path: str = GAMEDATA) -> "CardCatalog":
+        with open(path, "r", encoding="utf-8") as f:
+            spells = json.load(f)["items"]["spells"]
+        return cls([
+            {"id": spell["id"], "name": spell.get("englishName", spell["name"]), "elixir": spell.get("manaCost"),
+             "rarity": spell.get("rarity"), "has_evo": "evolvedSpellsData" in spell}
+            for spell in spells if "id" in spell
+        ])
+
+
+@lru_cache(maxsize=None)
+def load_catalog(path: Optional[str] = None) -> CardCatalog:
+    """The card catalog from path, card_id_mapping.csv, or gamedata-v4.json, whichever exists first"""
+    if path is None:
+        path = CARD_ID_MAPPING if os.path.exists(CARD_ID_MAPPING) else GAMEDATA
+    if path.endswith(".json"):
+        return CardCatalog.from_gamedata(path)
+    return CardCatalog.from_mapping_csv(path)
+
+
+def encode_deck(spells: List[Dict], catalog: Optional[CardCatalog] = None) -> Tuple[List[int], List[int], int]:
+    """
+    Codes, levels and evo bitmask of a deck from its raw API card dicts.
+    Cards are identified by their game ID ('d'), or by name through the
+    catalog when the ID is missing. Slots past the deck's cards are empty.
+    """
+    codes = [EMPTY_SLOT] * DECK_SIZE
+    levels = [0] * DECK_SIZE
+    evo_mask = 0
+    spells = [spell for spell in spells if isinstance(spell, dict)]
+    for slot, spell in enumerate(spells[:DECK_SIZE]):
+        if "d" in spell:
+            codes[slot] = card_code(spell["d"])
+        elif catalog is not None:
+            codes[slot] = catalog.code(spell.get("name"))
+        levels[slot] = spell.get("nl", 0)
+        if "evolution" in str(spell.get("icon", "")):
+            evo_mask |= 1 << slot
+    return codes, levels, evo_mask
+
+
+def evo_slots(cards: np.ndarray, evo_mask: np.ndarray) -> np.ndarray:
+    """Boolean (n, 8) array telling which slots of encoded decks hold evolutions"""
+    return (evo_mask[:, None] >> np.arange(cards.shape[1], dtype=np.uint8)) & 1 == 1
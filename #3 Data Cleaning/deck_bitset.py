@@ -0,0 +1,138 @@
+"""
+Decks as 128-bit card sets.
+
+Each card of the ladder card pool (troop_name.csv, the same 121 cards as
+ALL_CARDS_LIST in Pairs_data.py) owns one bit: the card in row i gets bit i.
+A deck is then a 128-bit mask stored as two uint64 words, lo (bits 0-63) and
+hi (bits 64-127). The preprocessor writes them as players_*_deck_bits_lo and
+players_*_deck_bits_hi.
+
+Set questions over many decks become bitwise operations on NumPy arrays:
+- contains_card(lo, hi, "Hog Rider"): decks with a card,
+- contains_all(lo, hi, ["Hog Rider", "Fireball"]): decks with all of them,
+- matches_archetype(lo, hi, cards, min_cards): decks with at least
+  min_cards of an archetype's cards,
+- pair_counts(lo, hi): how often every two cards are played together.
+
+New cards must be appended to troop_name.csv, so existing bits keep their
+meaning. Cards outside the pool (event cards such as Party Rocket) have no
+bit and are left out of the mask.
+"""
+import os
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from card_catalog import CODE_BLOCK, CARD_KINDS, load_catalog
+
+BITSET_BITS = 128
+WORD_BITS = 64
+LADDER_CARDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "#2 Data Storage", "Utils",
+                            "troop_name.csv")
+
+
+@lru_cache(maxsize=None)
+def bit_cards(path: str = LADDER_CARDS) -> Tuple[str, ...]:
+    """Card names by bit"""
+    names = tuple(pd.read_csv(path)["Troop_name"])
+    if len(names) > BITSET_BITS:
+        raise ValueError(f"{path} lists {len(names)} cards, a deck bitset holds {BITSET_BITS}")
+    return names
+
+
+@lru_cache(maxsize=None)
+def _bit_lookup() -> np.ndarray:
+    """Card code -> bit, -1 for cards without one"""
+    catalog = load_catalog()
+    lookup = np.full(len(CARD_KINDS) * CODE_BLOCK, -1, dtype=np.int16)
+    for bit, name in enumerate(bit_cards()):
+        code = catalog.code(name)
+        if code:
+            lookup[code] = bit
+    return lookup
+
+
+def card_bit(name: str) -> int:
+    try:
+        return bit_cards().index(name)
+    except ValueError:
+        raise KeyError(f"{name!r} is not in the deck bitset card pool") from None
+
+
+def card_mask(names: Iterable[str]) -> Tuple[np.uint64, np.uint64]:
+    """(lo, hi) mask of a set of card names"""
+    lo = hi = 0
+    for name in names:
+        bit = card_bit(name)
+        if bit < WORD_BITS:
+            lo |= 1 << bit
+        else:
+            hi |= 1 << (bit - WORD_BITS)
+    return np.uint64(lo), np.uint64(hi)
+
+
+def deck_bitsets(cards: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """lo and hi words of encoded decks ((n, 8) card codes, see card_catalog.py)"""
+    bits = _bit_lookup()[cards]
+    lo = np.zeros(len(cards), dtype=np.uint64)
+    hi = np.zeros(len(cards), dtype=np.uint64)
+    for slot in bits.T:
+        in_lo = (slot >= 0) & (slot < WORD_BITS)
+        in_hi = slot >= WORD_BITS
+        lo[in_lo] |= np.left_shift(np.uint64(1), slot[in_lo].astype(np.uint64))
+        hi[in_hi] |= np.left_shift(np.uint64(1), (slot[in_hi] - WORD_BITS).astype(np.uint64))
+    return lo, hi
+
+
+def contains_all(lo: np.ndarray, hi: np.ndarray, names: Iterable[str]) -> np.ndarray:
+    """Boolean array: decks holding every one of the cards"""
+    mask_lo, mask_hi = card_mask(names)
+    return ((lo & mask_lo) == mask_lo) & ((hi & mask_hi) == mask_hi)
+
+
+def contains_card(lo: np.ndarray, hi: np.ndarray, name: str) -> np.ndarray:
+    """Boolean array: decks holding the card"""
+    return contains_all(lo, hi, [name])
+
+
+def matches_archetype(lo: np.ndarray, hi: np.ndarray, names: Iterable[str],
+                      min_cards: Optional[int] = None) -> np.ndarray:
+    """Boolean array: decks holding at least min_cards of the cards (default: all of them)"""
+    names = list(names)
+    mask_lo, mask_hi = card_mask(names)
+    shared = np.bitwise_count(lo & mask_lo) + np.bitwise_count(hi & mask_hi)
+    return shared >= (len(set(names)) if min_cards is None else min_cards)
+
+
+def card_count(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Number of pool cards in each deck"""
+    return np.bitwise_count(lo).astype(np.int64) + np.bitwise_count(hi)
+
+
+def _unpack(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """(n, 128) 0/1 matrix of decks"""
+    shifts = np.arange(WORD_BITS, dtype=np.uint64)
+    return np.concatenate([(lo[:, None] >> shifts) & np.uint64(1), (hi[:, None] >> shifts) & np.uint64(1)],
+                          axis=1).astype(np.float32)
+
+
+def pair_counts(lo: np.ndarray, hi: np.ndarray, chunk_size: int = 200_000) -> np.ndarray:
+    """
+    (128, 128) int64 matrix: entry [i, j] is the number of decks holding the
+    cards of bits i and j (the diagonal counts single cards)
+    """
+    counts = np.zeros((BITSET_BITS, BITSET_BITS), dtype=np.int64)
+    for start in range(0, len(lo), chunk_size):
+        members = _unpack(lo[start:start + chunk_size], hi[start:start + chunk_size])
+        # float32 sums are exact up to 2**24 decks per chunk
+        counts += (members.T @ members).astype(np.int64)
+    return counts
+
+
+def bitset_names(lo: int, hi: int) -> List[str]:
+    """Card names of one deck bitset"""
+    names = bit_cards()
+    return [names[bit] for bit in range(len(names))
+            if (int(lo) >> bit if bit < WORD_BITS else int(hi) >> (bit - WORD_BITS)) & 1]
@@ -0,0 +1,264 @@
+"""
+Reading and writing preprocessed battle logs.
+
+The preprocessor turns every deck (players_*_spells) into a list of
+(name, level, evo) tuples and every support card list
+(players_*_supportCards) into a list of (name, level, rarity) tuples.
+
+- Parquet output (.parquet, needs pyarrow) stores them as native
+  list<struct> columns. Loading them needs no parsing at all.
+- CSV output stores the Python repr of the lists, as before. Those
+  strings are parsed with a regular expression instead of
+  ast.literal_eval, which was the slowest step of every aggregation.
+
+read_battles returns the same lists of tuples for either format, so the
+analysis scripts do not care which one they are given. BattleWriter
+appends chunks of battles to one file, for preprocessing that streams.
+
+Decks are also stored encoded (see card_catalog.py):
+- players_*_deck: 8 card codes,
+- players_*_deck_levels: their levels,
+- players_*_evo_mask: the evo bitmask.
+Parquet stores the first two as fixed-size uint16/uint8 lists, and CSV as
+space-separated numbers. read_deck_arrays loads them as NumPy arrays for
+counting jobs.
+
+players_*_deck_bits_lo/_hi hold each deck as a 128-bit card set (see
+deck_bitset.py), as uint64 columns in either format; read_deck_bitsets
+loads them.
+"""
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from card_catalog import DECK_SIZE
+
+DECK_COLUMNS = ("players_0_spells", "players_1_spells")
+SUPPORT_CARD_COLUMNS = ("players_0_supportCards", "players_1_supportCards")
+DECK_CODE_COLUMNS = ("players_0_deck", "players_1_deck")
+DECK_LEVEL_COLUMNS = ("players_0_deck_levels", "players_1_deck_levels")
+EVO_MASK_COLUMNS = ("players_0_evo_mask", "players_1_evo_mask")
+DECK_BITS_COLUMNS = (("players_0_deck_bits_lo", "players_0_deck_bits_hi"),
+                     ("players_1_deck_bits_lo", "players_1_deck_bits_hi"))
+# Encoded deck column -> NumPy dtype of its values
+_ENCODED_DTYPES = dict([(c, np.uint16) for c in DECK_CODE_COLUMNS] + [(c, np.uint8) for c in DECK_LEVEL_COLUMNS])
+
+# ('Hog Rider', 11, 0) in decks, ('Tower Princess', 14, 'common') in support cards
+_CARD_TUPLE = re.compile(r"""\((['"])(.*?)\1,\s*(-?\d+),\s*(?:(-?\d+)|(['"])(.*?)\5)\)""")
+
+
+def is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() == ".parquet"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet battle logs need pyarrow (pip install pyarrow); "
+                          "use a .csv path to keep the old format") from None
+    return pa, pq
+
+
+def _card_list_types(pa):
+    deck = pa.list_(pa.struct([("name", pa.string()), ("level", pa.int16()), ("evo", pa.int8())]))
+    support = pa.list_(pa.struct([("name", pa.string()), ("level", pa.int16()), ("rarity", pa.string())]))
+    return deck, support
+
+
+def parse_card_list(value) -> List[tuple]:
+    """A deck or support card list from its CSV repr, e.g. "[('Knight', 11, 1), ...]" """
+    if not isinstance(value, str):
+        return []
+    cards = []
+    for _, name, level, evo, _, rarity in _CARD_TUPLE.findall(value):
+        cards.append((name, int(level), int(evo) if evo else rarity))
+    return cards
+
+
+def _list_column_to_tuples(column, fields: Sequence[str]) -> List[List[tuple]]:
+    """list<struct> Arrow column -> one list of tuples per row, built from the flat child arrays"""
+    column = column.combine_chunks()
+    flat = column.flatten()
+    cards = list(zip(*(flat.field(field).to_pylist() for field in fields)))
+    offsets = column.offsets.to_pylist()
+    valid = column.is_valid().to_pylist()
+    # Null lists (absent decks) come out empty, like unparsable CSV values
+    return [cards[offsets[i]:offsets[i + 1]] if valid[i] else [] for i in range(len(column))]
+
+
+def _encoded_matrix(values, dtype) -> np.ndarray:
+    """(n, 8) array from a column of encoded decks"""
+    return np.asarray(values.tolist(), dtype=dtype).reshape(-1, DECK_SIZE)
+
+
+def _csv_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Battles with the encoded decks as space-separated numbers"""
+    encoded = [c for c in df.columns if c in _ENCODED_DTYPES]
+    return df.assign(**{c: [" ".join(map(str, deck)) for deck in df[c]] for c in encoded})
+
+
+def _battles_table(df: pd.DataFrame):
+    """Arrow table of preprocessed battles"""
+    pa, _ = _import_pyarrow()
+    encoded = [c for c in df.columns if c in _ENCODED_DTYPES]
+    deck_type, support_type = _card_list_types(pa)
+    plain = df.drop(columns=[c for c in DECK_COLUMNS + SUPPORT_CARD_COLUMNS if c in df.columns] + encoded)
+    plain = plain.astype({c: np.uint8 for c in EVO_MASK_COLUMNS if c in plain.columns})
+    table = pa.Table.from_pandas(plain, preserve_index=False)
+    for column in df.columns:
+        if column in DECK_COLUMNS or column in SUPPORT_CARD_COLUMNS:
+            list_type = deck_type if column in DECK_COLUMNS else support_type
+            values = pa.array(df[column].tolist(), type=list_type)
+        elif column in _ENCODED_DTYPES:
+            flat = _encoded_matrix(df[column], _ENCODED_DTYPES[column]).ravel()
+            values = pa.FixedSizeListArray.from_arrays(pa.array(flat), DECK_SIZE)
+        else:
+            continue
+        table = table.add_column(df.columns.get_loc(column), column, values)
+    return table
+
+
+def write_battles(df: pd.DataFrame, path: str):
+    """Write preprocessed battles as Parquet or CSV, chosen by the file extension"""
+    if not is_parquet(path):
+        _csv_frame(df).to_csv(path, index=False)
+        return
+    _, pq = _import_pyarrow()
+    pq.write_table(_battles_table(df), path)
+
+
+class BattleWriter:
+    """
+    Appends chunks of preprocessed battles to one Parquet or CSV file, so
+    the whole dataset never has to be in memory. Every chunk must have the
+    columns of the first one, with the same dtypes. Use as a context
+    manager, or call close() to finish the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self._parquet_writer = None
+        self._header_written = False
+
+    def write(self, df: pd.DataFrame):
+        if is_parquet(self.path):
+            self.write_table(_battles_table(df))
+            return
+        if df.empty and self._header_written:
+            return
+        _csv_frame(df).to_csv(self.path, mode="a" if self._header_written else "w",
+                              header=not self._header_written, index=False)
+        self._header_written = True
+        self.rows += len(df)
+
+    def write_table(self, table):
+        """Append an Arrow table of battles, e.g. read from a write_battles Parquet file"""
+        if not is_parquet(self.path):
+            self.write(_table_to_battles(table))
+            return
+        if table.num_rows == 0 and self._parquet_writer is not None:
+            return
+        _, pq = _import_pyarrow()
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            # e.g. string vs large_string when a chunk's text column is all missing
+            table = table.cast(self._parquet_writer.schema)
+        self._parquet_writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _table_to_battles(table) -> pd.DataFrame:
+    """Arrow table of battles (as written by write_battles) -> DataFrame with lists of tuples"""
+    card_columns = [c for c in table.column_names
+                    if c in DECK_COLUMNS or c in SUPPORT_CARD_COLUMNS or c in _ENCODED_DTYPES]
+    df = table.drop_columns(card_columns).to_pandas()
+    for column in card_columns:
+        if column in _ENCODED_DTYPES:
+            values = [tuple(deck) for deck in _fixed_size_matrix(table.column(column)).tolist()]
+        else:
+            fields = ("name", "level", "evo") if column in DECK_COLUMNS else ("name", "level", "rarity")
+            values = _list_column_to_tuples(table.column(column), fields)
+        df.insert(table.column_names.index(column), column, values)
+    return df
+
+
+def read_battles(path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Load preprocessed battles written by write_battles (or an older
+    preprocessor CSV). Deck and support card columns are lists of tuples.
+    """
+    if is_parquet(path):
+        _, pq = _import_pyarrow()
+        return _table_to_battles(pq.read_table(path, columns=list(columns) if columns is not None else None))
+
+    # Bitset words above 2**63 would otherwise be read as floats
+    bit_dtypes = {c: np.uint64 for words in DECK_BITS_COLUMNS for c in words}
+    df = pd.read_csv(path, usecols=list(columns) if columns is not None else None, dtype=bit_dtypes,
+                     low_memory=False)
+    for column in DECK_COLUMNS + SUPPORT_CARD_COLUMNS:
+        if column in df.columns:
+            df[column] = [parse_card_list(value) for value in df[column]]
+    for column in _ENCODED_DTYPES:
+        if column in df.columns:
+            df[column] = [tuple(map(int, value.split())) if isinstance(value, str) else (0,) * DECK_SIZE
+                          for value in df[column]]
+    return df
+
+
+def _fixed_size_matrix(column) -> np.ndarray:
+    """(n, 8) array from a fixed-size list Arrow column, without a per-row step"""
+    return column.combine_chunks().flatten().to_numpy().reshape(-1, DECK_SIZE)
+
+
+def read_deck_arrays(path: str, player: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One player's encoded decks as arrays: card codes (n, 8) uint16, levels
+    (n, 8) uint8 and evo bitmasks (n,) uint8, row-aligned with read_battles
+    """
+    columns = [DECK_CODE_COLUMNS[player], DECK_LEVEL_COLUMNS[player], EVO_MASK_COLUMNS[player]]
+    if is_parquet(path):
+        _, pq = _import_pyarrow()
+        table = pq.read_table(path, columns=columns)
+        return (_fixed_size_matrix(table.column(columns[0])), _fixed_size_matrix(table.column(columns[1])),
+                table.column(columns[2]).to_numpy())
+    df = read_battles(path, columns=columns)
+    return (_encoded_matrix(df[columns[0]], np.uint16), _encoded_matrix(df[columns[1]], np.uint8),
+            df[columns[2]].to_numpy(dtype=np.uint8))
+
+
+def read_deck_bitsets(path: str, player: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One player's deck bitsets as (lo, hi) uint64 arrays, row-aligned with
+    read_battles. Files written before the bitset columns existed get them
+    computed from the encoded decks.
+    """
+    columns = list(DECK_BITS_COLUMNS[player])
+    try:
+        if is_parquet(path):
+            _, pq = _import_pyarrow()
+            table = pq.read_table(path, columns=columns)
+            return table.column(columns[0]).to_numpy(), table.column(columns[1]).to_numpy()
+        df = read_battles(path, columns=columns)
+        return df[columns[0]].to_numpy(dtype=np.uint64), df[columns[1]].to_numpy(dtype=np.uint64)
+    except (KeyError, ValueError):
+        from deck_bitset import deck_bitsets
+        cards, _, _ = read_deck_arrays(path, player)
+        return deck_bitsets(cards)
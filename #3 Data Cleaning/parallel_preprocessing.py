@@ -0,0 +1,158 @@
+"""
+Parallel preprocessing of scrape parts into one deduplicated dataset.
+
+This replaces the preprocess / concat / drop_duplicates cells of
+data_full_batch-cleaner.ipynb. It runs in three steps:
+1. A process pool preprocesses the part files chunk by chunk (see
+   battle_log_data_preprocessor.py). Every battle goes to one of
+   `partitions` files, picked by a hash of its replayTag, so copies of a
+   battle scraped into different parts land in the same partition.
+2. A second pool deduplicates every partition on its own. Like the
+   notebook, it drops battles without a replayTag and keeps the first copy
+   of every battle, in part order.
+3. The partitions are appended to the output one at a time.
+
+Parsing (ast.literal_eval) is CPU-bound, so processes are used instead of
+threads. No step holds more than a chunk or one partition in memory, and
+the partition files are deleted at the end. Battles come out grouped by
+partition rather than in scrape order.
+
+Usage: python parallel_preprocessing.py "../#2 Data Storage/scrapped_data/semi_data_trail_part*.csv"
+           --output "../#2 Data Storage/Processed Data/preprocessed_battle_log_full_batch.parquet"
+           [--partitions 16] [--workers 4] [--chunksize 50000]
+"""
+import argparse
+import glob
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from battle_log_data_preprocessor import iter_preprocessed_chunks
+from deck_storage import BattleWriter, _import_pyarrow
+
+DEFAULT_PARTITIONS = 16
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def partition_of(replay_tags: pd.Series, partitions: int) -> np.ndarray:
+    """
+    Partition of every replayTag. Python's hash() of a string differs between
+    processes, so a pandas hash (the same in every process) is used instead.
+    """
+    return pd.util.hash_pandas_object(replay_tags.astype(str), index=False).to_numpy() % partitions
+
+
+def part_order(path: str) -> list:
+    """Sort key putting part2 before part10"""
+    return [int(token) if token.isdigit() else token for token in re.split(r"(\d+)", path)]
+
+
+def partition_path(work_dir: str, part: int, partition: int) -> str:
+    return os.path.join(work_dir, f"part{part:04d}_partition{partition:03d}.parquet")
+
+
+def _partition_part(part: int, input_path: str, work_dir: str, partitions: int,
+                    chunksize: int) -> Tuple[int, int]:
+    """Preprocess one part file into its partition files; returns (rows read, battles kept)"""
+    writers = {}
+    rows_read = kept = 0
+    try:
+        for chunk_rows, results_df in iter_preprocessed_chunks(input_path, chunksize):
+            rows_read += chunk_rows
+            # Battles without a replayTag cannot be deduplicated, so they are dropped
+            tags = results_df["replayTag"]
+            results_df = results_df[tags.notna() & (tags != "")]
+            if results_df.empty:
+                continue
+            kept += len(results_df)
+            targets = partition_of(results_df["replayTag"], partitions)
+            for partition in np.unique(targets):
+                if partition not in writers:
+                    writers[partition] = BattleWriter(partition_path(work_dir, part, partition))
+                writers[partition].write(results_df[targets == partition])
+    finally:
+        for writer in writers.values():
+            writer.close()
+    print(f"Part {part + 1} preprocessed: {kept:,} of {rows_read:,} rows kept ({input_path})")
+    return rows_read, kept
+
+
+def _deduplicate_partition(partition_files: List[str], output_path: str) -> Tuple[int, int]:
+    """Keep the first copy of every battle of one partition; returns (battles in, battles out)"""
+    pa, pq = _import_pyarrow()
+    table = pa.concat_tables([pq.read_table(path) for path in partition_files], promote_options="permissive")
+    first_copies = ~table.column("replayTag").to_pandas().duplicated().to_numpy()
+    pq.write_table(table.filter(pa.array(first_copies)), output_path)
+    return table.num_rows, int(first_copies.sum())
+
+
+def preprocess_parts(input_paths: Sequence[str], output_path: str, partitions: int = DEFAULT_PARTITIONS,
+                     workers: Optional[int] = None, chunksize: int = DEFAULT_CHUNKSIZE,
+                     work_dir: Optional[str] = None) -> int:
+    """
+    Preprocess the scrape parts in a process pool and write their Ladder
+    battles, deduplicated by replayTag, to output_path (.parquet or .csv).
+    Partition files go to a temporary directory in work_dir (default: next
+    to the output). Returns the number of battles written.
+    """
+    _import_pyarrow()
+    start_time = time.monotonic()
+    if work_dir is None:
+        work_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(prefix="preprocessing_", dir=work_dir) as tmp_dir, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        # 1. Preprocess the parts into hash partitions
+        part_jobs = [executor.submit(_partition_part, part, path, tmp_dir, partitions, chunksize)
+                     for part, path in enumerate(input_paths)]
+        rows_read = kept = 0
+        for job in part_jobs:
+            part_rows, part_kept = job.result()
+            rows_read += part_rows
+            kept += part_kept
+        print(f"Preprocessed {len(input_paths)} parts: {kept:,} Ladder battles of {rows_read:,} rows "
+              f"in {time.monotonic() - start_time:.0f}s")
+
+        # 2. Deduplicate every partition; part order is kept, so the first copy wins
+        dedup_jobs = {}
+        for partition in range(partitions):
+            partition_files = [partition_path(tmp_dir, part, partition) for part in range(len(input_paths))]
+            partition_files = [path for path in partition_files if os.path.exists(path)]
+            if partition_files:
+                deduplicated = os.path.join(tmp_dir, f"deduplicated{partition:03d}.parquet")
+                dedup_jobs[deduplicated] = executor.submit(_deduplicate_partition, partition_files, deduplicated)
+        duplicates = 0
+        for job in dedup_jobs.values():
+            battles_in, battles_out = job.result()
+            duplicates += battles_in - battles_out
+
+        # 3. Append the partitions to the output
+        _, pq = _import_pyarrow()
+        with BattleWriter(output_path) as writer:
+            for deduplicated in dedup_jobs:
+                writer.write_table(pq.read_table(deduplicated))
+
+    print(f"Dropped {duplicates:,} duplicate battles, saved {writer.rows:,} to '{output_path}' "
+          f"in {time.monotonic() - start_time:.0f}s")
+    return writer.rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess scrape parts in parallel into one deduplicated dataset")
+    parser.add_argument("inputs", nargs="+", help="Scrape part CSVs, in order (glob patterns are expanded)")
+    parser.add_argument("--output", required=True, help="Preprocessed battles (.parquet or .csv)")
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS,
+                        help="replayTag hash partitions, each deduplicated on its own")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per CPU)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read at a time per part")
+    parser.add_argument("--work-dir", default=None, help="Where partition files are kept (default: next to --output)")
+    args = parser.parse_args()
+    input_paths = [path for pattern in args.inputs
+                   for path in (sorted(glob.glob(pattern), key=part_order) or [pattern])]
+    preprocess_parts(input_paths, args.output, partitions=args.partitions, workers=args.workers,
+                     chunksize=args.chunksize, work_dir=args.work_dir)
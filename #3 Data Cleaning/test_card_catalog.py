@@ -0,0 +1,72 @@
+import numpy as np
+
+from card_catalog import (CARD_KINDS, CODE_BLOCK, EMPTY_SLOT, CardCatalog, card_code, card_id, encode_deck,
+                          evo_slots, load_catalog)
+
+
+def test_code_examples():
+    assert card_code(26000000) == 1
+    assert card_code(27000000) == 1001
+    assert card_code(28000000) == 2001
+    assert card_code(159000000) == 3001
+
+
+def test_code_id_round_trip():
+    for kind in CARD_KINDS:
+        for number in (0, 1, 57, CODE_BLOCK - 2):
+            game_id = kind * 1_000_000 + number
+            code = card_code(game_id)
+            assert 0 < code < len(CARD_KINDS) * CODE_BLOCK
+            assert card_id(code) == game_id
+
+
+def test_unknown_ids_are_empty_slots():
+    assert card_code(54000001) == EMPTY_SLOT
+    assert card_code(26000000 + CODE_BLOCK - 1) == EMPTY_SLOT
+
+
+def test_catalog_round_trip():
+    catalog = load_catalog()
+    assert len(catalog) > 100
+    for code, card in catalog.cards.items():
+        assert card_code(card["id"]) == code
+        assert card_id(code) == card["id"]
+        assert catalog.code(card["name"]) == code
+        assert catalog.name(code) == card["name"]
+        assert catalog.names[code] == card["name"]
+
+
+def test_catalog_sources_agree():
+    from_csv = CardCatalog.from_mapping_csv()
+    from_gamedata = CardCatalog.from_gamedata()
+    shared = from_csv.cards.keys() & from_gamedata.cards.keys()
+    assert len(shared) > 100
+    assert all(from_csv.name(code) == from_gamedata.name(code) for code in shared)
+
+
+def test_unknown_names_and_codes():
+    catalog = CardCatalog([{"id": 26000000, "name": "Knight"}])
+    assert catalog.code("Not A Card") == EMPTY_SLOT
+    assert catalog.name(2001) == "Card 28000000"
+    assert catalog.deck_names([1, EMPTY_SLOT, 1]) == ["Knight", "Knight"]
+
+
+def test_encode_deck():
+    catalog = CardCatalog([{"id": 26000000, "name": "Knight"}, {"id": 28000000, "name": "Fireball"}])
+    spells = [
+        {"d": 26000000, "nl": 14, "icon": "knight_evolution"},
+        {"name": "Fireball", "nl": 12},
+        "not a card",
+    ]
+    codes, levels, evo_mask = encode_deck(spells, catalog)
+    assert codes == [1, 2001, 0, 0, 0, 0, 0, 0]
+    assert levels == [14, 12, 0, 0, 0, 0, 0, 0]
+    assert evo_mask == 0b1
+    assert catalog.deck_names(codes) == ["Knight", "Fireball"]
+
+
+def test_evo_slots():
+    cards = np.ones((2, 8), dtype=np.uint16)
+    slots = evo_slots(cards, np.array([0b101, 0], dtype=np.uint8))
+    assert slots[0].tolist() == [True, False, True, False, False, False, False, False]
+    assert not slots[1].any()
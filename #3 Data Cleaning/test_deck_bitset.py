@@ -0,0 +1,85 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from card_catalog import EMPTY_SLOT, load_catalog
+from deck_bitset import (BITSET_BITS, WORD_BITS, bit_cards, bitset_names, card_bit, card_count, card_mask,
+                         contains_all, contains_card, deck_bitsets, matches_archetype, pair_counts)
+
+
+@pytest.fixture(scope="module")
+def decks():
+    """(codes, names) of random 8-card decks; some slots are empty or hold cards outside the pool"""
+    rng = np.random.default_rng(7)
+    catalog = load_catalog()
+    pool = [catalog.code(name) for name in bit_cards()]
+    outside = [code for code in catalog.cards if catalog.name(code) not in set(bit_cards())]
+    codes = np.array([rng.choice(pool, size=8, replace=False) for _ in range(500)], dtype=np.uint16)
+    codes[::7, 7] = EMPTY_SLOT
+    if outside:
+        codes[::11, 6] = outside[0]
+    names = [{catalog.name(code) for code in deck if code != EMPTY_SLOT} & set(bit_cards()) for deck in codes]
+    return codes, names
+
+
+def test_bits_cover_both_words():
+    names = bit_cards()
+    assert WORD_BITS < len(names) <= BITSET_BITS
+    assert card_bit(names[0]) == 0
+    assert card_bit(names[-1]) == len(names) - 1
+    with pytest.raises(KeyError):
+        card_bit("Party Rocket")
+
+
+def test_card_mask():
+    names = bit_cards()
+    lo, hi = card_mask([names[0], names[WORD_BITS]])
+    assert (int(lo), int(hi)) == (1, 1)
+    assert bitset_names(lo, hi) == [names[0], names[WORD_BITS]]
+
+
+def test_deck_bitsets_round_trip(decks):
+    codes, names = decks
+    lo, hi = deck_bitsets(codes)
+    assert lo.dtype == hi.dtype == np.uint64
+    for deck_lo, deck_hi, deck_names in zip(lo, hi, names):
+        assert set(bitset_names(deck_lo, deck_hi)) == deck_names
+    assert card_count(lo, hi).tolist() == [len(deck_names) for deck_names in names]
+
+
+def test_set_queries_match_a_naive_check(decks):
+    codes, names = decks
+    lo, hi = deck_bitsets(codes)
+    pool = bit_cards()
+    card, other, high_card = pool[3], pool[40], pool[WORD_BITS + 5]
+    assert contains_card(lo, hi, high_card).tolist() == [high_card in deck for deck in names]
+    assert contains_all(lo, hi, [card, high_card]).tolist() == [{card, high_card} <= deck for deck in names]
+    archetype = [card, other, high_card]
+    assert matches_archetype(lo, hi, archetype, 2).tolist() == \
+        [len(deck & set(archetype)) >= 2 for deck in names]
+    assert matches_archetype(lo, hi, archetype).tolist() == [set(archetype) <= deck for deck in names]
+
+
+def test_pair_counts_match_a_naive_count(decks):
+    codes, names = decks
+    lo, hi = deck_bitsets(codes)
+    expected = np.zeros((BITSET_BITS, BITSET_BITS), dtype=np.int64)
+    for deck in names:
+        bits = sorted(card_bit(name) for name in deck)
+        for bit in bits:
+            expected[bit, bit] += 1
+        for first, second in itertools.combinations(bits, 2):
+            expected[first, second] += 1
+            expected[second, first] += 1
+
+    # A chunk size that does not divide the decks, so the last chunk is partial
+    counts = pair_counts(lo, hi, chunk_size=64)
+    assert counts.dtype == np.int64
+    np.testing.assert_array_equal(counts, expected)
+    np.testing.assert_array_equal(pair_counts(lo, hi), expected)
+
+
+def test_pair_counts_of_no_decks():
+    empty = np.zeros(0, dtype=np.uint64)
+    assert not pair_counts(empty, empty).any()
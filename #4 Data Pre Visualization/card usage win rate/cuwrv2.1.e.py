@@ -1,10 +1,14 @@
-import csv
+import os
+import sys
 from collections import defaultdict
-import ast
 import json
 import pandas as pd
 import pickle
 
+# Preprocessed battle logs are read with the loader next to the preprocessor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "#3 Data Cleaning"))
+from deck_storage import read_battles
+
 # Initialize counters for EVO and NON-EVO cards
 evo_card_usage_counter = defaultdict(int)
 evo_card_win_counter = defaultdict(int)
@@ -19,103 +23,94 @@ player_deck_combinations = set()
 
 print("Processing Clash Royale battle data (separating EVO vs NON-EVO)...")
 
-# Read the CSV file
-with open('../../#2 Data Storage/Processed Data/fullbatch.csv', 'r', encoding='utf-8') as file:
-    reader = csv.DictReader(file)
+# Read the preprocessed battles
+battles = read_battles('../../#2 Data Storage/Processed Data/fullbatch.parquet',
+                       columns=['players_0_hashtag', 'players_1_hashtag', 'players_0_winner',
+                                'players_1_winner', 'players_0_spells', 'players_1_spells'])
+
+for row in battles.to_dict('records'):
+    # Get player identifiers and winner status
+    player0_hashtag = row['players_0_hashtag']
+    player1_hashtag = row['players_1_hashtag']
+    player0_winner = int(row['players_0_winner'])
+    player1_winner = int(row['players_1_winner'])
     
-    for row in reader:
-        # Get player identifiers and winner status
-        player0_hashtag = row['players_0_hashtag']
-        player1_hashtag = row['players_1_hashtag']
-        player0_winner = int(row['players_0_winner'])
-        player1_winner = int(row['players_1_winner'])
-        
-        # Process player 0's deck
-        player0_spells = row['players_0_spells']
-        
-        # Process player 1's deck  
-        player1_spells = row['players_1_spells']
-        
-        # Parse the spells strings into actual lists
-        try:
-            player0_cards_list = ast.literal_eval(player0_spells)
-            player1_cards_list = ast.literal_eval(player1_spells)
-        except:
-            print(f"Error parsing spells for row: {row.get('replayTag', 'Unknown')}")
-            continue
-        
-        # Create unique identifiers for player-deck combinations
-        player0_deck_id = (player0_hashtag, tuple(sorted([card[0] for card in player0_cards_list if isinstance(card, tuple) and len(card) > 0])))
-        player1_deck_id = (player1_hashtag, tuple(sorted([card[0] for card in player1_cards_list if isinstance(card, tuple) and len(card) > 0])))
-        
-        # Extract cards from both players' decks, separating EVO and NON-EVO
-        player0_evo_cards = set()
-        player0_non_evo_cards = set()
-        for card_tuple in player0_cards_list:
-            if isinstance(card_tuple, tuple) and len(card_tuple) >= 3:
-                card_name = card_tuple[0]
-                is_evo = card_tuple[2]  # 3rd element indicates evolution (1 = EVO, 0 = NON-EVO)
-                if is_evo == 1:
-                    player0_evo_cards.add(card_name)
-                else:
-                    player0_non_evo_cards.add(card_name)
-        
-        player1_evo_cards = set()
-        player1_non_evo_cards = set()
-        for card_tuple in player1_cards_list:
-            if isinstance(card_tuple, tuple) and len(card_tuple) >= 3:
-                card_name = card_tuple[0]
-                is_evo = card_tuple[2]  # 3rd element indicates evolution (1 = EVO, 0 = NON-EVO)
-                if is_evo == 1:
-                    player1_evo_cards.add(card_name)
-                else:
-                    player1_non_evo_cards.add(card_name)
-        
-        # Process player 0 for USAGE counter - only count if we haven't seen this player with this deck before
-        if player0_deck_id not in player_deck_combinations:
-            player_deck_combinations.add(player0_deck_id)
-            
-            # Add to EVO usage counter
-            for card in player0_evo_cards:
-                evo_card_usage_counter[card] += 1
-            
-            # Add to NON-EVO usage counter
-            for card in player0_non_evo_cards:
-                non_evo_card_usage_counter[card] += 1
-        
-        # Process player 1 for USAGE counter - only count if we haven't seen this player with this deck before
-        if player1_deck_id not in player_deck_combinations:
-            player_deck_combinations.add(player1_deck_id)
-            
-            # Add to EVO usage counter
-            for card in player1_evo_cards:
-                evo_card_usage_counter[card] += 1
-            
-            # Add to NON-EVO usage counter
-            for card in player1_non_evo_cards:
-                non_evo_card_usage_counter[card] += 1
+    # Decks are loaded as lists of (name, level, evo) tuples
+    player0_cards_list = row['players_0_spells']
+    player1_cards_list = row['players_1_spells']
+    
+    # Create unique identifiers for player-deck combinations
+    player0_deck_id = (player0_hashtag, tuple(sorted([card[0] for card in player0_cards_list if isinstance(card, tuple) and len(card) > 0])))
+    player1_deck_id = (player1_hashtag, tuple(sorted([card[0] for card in player1_cards_list if isinstance(card, tuple) and len(card) > 0])))
+    
+    # Extract cards from both players' decks, separating EVO and NON-EVO
+    player0_evo_cards = set()
+    player0_non_evo_cards = set()
+    for card_tuple in player0_cards_list:
+        if isinstance(card_tuple, tuple) and len(card_tuple) >= 3:
+            card_name = card_tuple[0]
+            is_evo = card_tuple[2]  # 3rd element indicates evolution (1 = EVO, 0 = NON-EVO)
+            if is_evo == 1:
+                player0_evo_cards.add(card_name)
+            else:
+                player0_non_evo_cards.add(card_name)
+    
+    player1_evo_cards = set()
+    player1_non_evo_cards = set()
+    for card_tuple in player1_cards_list:
+        if isinstance(card_tuple, tuple) and len(card_tuple) >= 3:
+            card_name = card_tuple[0]
+            is_evo = card_tuple[2]  # 3rd element indicates evolution (1 = EVO, 0 = NON-EVO)
+            if is_evo == 1:
+                player1_evo_cards.add(card_name)
+            else:
+                player1_non_evo_cards.add(card_name)
+    
+    # Process player 0 for USAGE counter - only count if we haven't seen this player with this deck before
+    if player0_deck_id not in player_deck_combinations:
+        player_deck_combinations.add(player0_deck_id)
         
-        # Process player 0 for TOTAL PLAYS counter and WIN counter
+        # Add to EVO usage counter
         for card in player0_evo_cards:
-            evo_card_total_plays_counter[card] += 1
-            if player0_winner == 1:  # Player 0 won
-                evo_card_win_counter[card] += 1
+            evo_card_usage_counter[card] += 1
         
+        # Add to NON-EVO usage counter
         for card in player0_non_evo_cards:
-            non_evo_card_total_plays_counter[card] += 1
-            if player0_winner == 1:  # Player 0 won
-                non_evo_card_win_counter[card] += 1
+            non_evo_card_usage_counter[card] += 1
+    
+    # Process player 1 for USAGE counter - only count if we haven't seen this player with this deck before
+    if player1_deck_id not in player_deck_combinations:
+        player_deck_combinations.add(player1_deck_id)
         
-        # Process player 1 for TOTAL PLAYS counter and WIN counter
+        # Add to EVO usage counter
         for card in player1_evo_cards:
-            evo_card_total_plays_counter[card] += 1
-            if player1_winner == 1:  # Player 1 won
-                evo_card_win_counter[card] += 1
+            evo_card_usage_counter[card] += 1
         
+        # Add to NON-EVO usage counter
         for card in player1_non_evo_cards:
-            non_evo_card_total_plays_counter[card] += 1
-            if player1_winner == 1:  # Player 1 won
-                non_evo_card_win_counter[card] += 1
+            non_evo_card_usage_counter[card] += 1
+    
+    # Process player 0 for TOTAL PLAYS counter and WIN counter
+    for card in player0_evo_cards:
+        evo_card_total_plays_counter[card] += 1
+        if player0_winner == 1:  # Player 0 won
+            evo_card_win_counter[card] += 1
+    
+    for card in player0_non_evo_cards:
+        non_evo_card_total_plays_counter[card] += 1
+        if player0_winner == 1:  # Player 0 won
+            non_evo_card_win_counter[card] += 1
+    
+    # Process player 1 for TOTAL PLAYS counter and WIN counter
+    for card in player1_evo_cards:
+        evo_card_total_plays_counter[card] += 1
+        if player1_winner == 1:  # Player 1 won
+            evo_card_win_counter[card] += 1
+    
+    for card in player1_non_evo_cards:
+        non_evo_card_total_plays_counter[card] += 1
+        if player1_winner == 1:  # Player 1 won
+            non_evo_card_win_counter[card] += 1
 
 # Convert to regular dictionaries for easier handling
 evo_card_usage_dict = dict(evo_card_usage_counter)
@@ -1,10 +1,17 @@
 import pandas as pd
-import ast
+import numpy as np
+import os
+import sys
 import json
 import functools
 from collections import defaultdict
 import concurrent.futures
 
+# Preprocessed battle logs are read with the loader next to the preprocessor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "#3 Data Cleaning"))
+from deck_storage import read_battles, read_deck_arrays
+from card_catalog import EMPTY_SLOT, load_catalog
+
 # --- 1. ARENA MAPPING ---
 ARENA_ID_TO_NUMBER_MAP = {
     '54000002': '2', '54000003': '3', '54000004': '4', '54000005': '5',
@@ -18,46 +25,36 @@ ARENA_ID_TO_NUMBER_MAP = {
 # --- 2. HELPER FUNCTIONS ---
 
 def convert_data(path):
-    data = pd.read_csv(path)
+    """
+    Arena number and encoded deck (card codes, see card_catalog.py) of the
+    first battle of every player, as an array of arenas and an (n, 8) array
+    """
+    data = read_battles(path, columns=['arena', 'players_0_hashtag', 'players_1_hashtag'])
     data['arena'] = data['arena'].astype(str)
     data['arena_num'] = data['arena'].map(ARENA_ID_TO_NUMBER_MAP)
     
     player_tag = pd.concat([data['players_0_hashtag'], data['players_1_hashtag']], ignore_index=True)
-    spells = pd.concat([data['players_0_spells'], data['players_1_spells']], ignore_index=True)
     arena = pd.concat([data['arena_num'], data['arena_num']], ignore_index=True)
+    decks = np.concatenate([read_deck_arrays(path, 0)[0], read_deck_arrays(path, 1)[0]])
     
     new_data = pd.DataFrame({
         'player_tag': player_tag,
-        'card_list': spells,
         'arena': arena
     })
     
     new_data = new_data.dropna(subset=['arena'])
-    data = new_data.drop_duplicates(subset='player_tag', keep='first')
-    return data
+    new_data = new_data.drop_duplicates(subset='player_tag', keep='first')
+    return new_data['arena'].to_numpy(), decks[new_data.index.to_numpy()]
 
-def process_dataframe_with_totals(input_df):
-    ARENA_COLUMN_NAME = 'arena'
-    CARDS_COLUMN_NAME = 'card_list'
-    arena_card_counts = defaultdict(lambda: defaultdict(int))
+def process_decks_with_totals(arenas, decks):
+    catalog = load_catalog()
+    arena_card_counts = {}
     
-    for _, row in input_df.iterrows():
-        try:
-            arena_num = row[ARENA_COLUMN_NAME]
-            card_list_str = row[CARDS_COLUMN_NAME]
-            
-            # --- Use the correct parser for [('Card', 11, 0), ...] ---
-            card_list = ast.literal_eval(card_list_str)
-            if not isinstance(card_list, list):
-                continue
-                
-            for card_tuple in card_list:
-                if isinstance(card_tuple, tuple) and len(card_tuple) > 0:
-                    arena_card_counts[arena_num][card_tuple[0]] += 1
-            # --------------------------------------------------------
-                    
-        except (ValueError, SyntaxError, TypeError, KeyError):
-            pass 
+    # One bincount over the card codes of each arena's decks
+    for arena_num in pd.unique(arenas):
+        counts = np.bincount(decks[arenas == arena_num].ravel(), minlength=len(catalog.names))
+        counts[EMPTY_SLOT] = 0
+        arena_card_counts[arena_num] = {catalog.name(code): int(counts[code]) for code in np.flatnonzero(counts)}
 
     final_dict = {}
     for arena, counts in arena_card_counts.items():
@@ -109,8 +106,8 @@ def calculate_card_percentages(arena_counts):
 
 def process_item_to_dict(item):
     try:
-        dataframe = convert_data(item) 
-        arena_dict = process_dataframe_with_totals(dataframe)
+        arenas, decks = convert_data(item)
+        arena_dict = process_decks_with_totals(arenas, decks)
         return arena_dict
     except Exception as e:
         print(f"Error processing item {item}: {e}")
@@ -118,7 +115,7 @@ def process_item_to_dict(item):
 
 # --- 3. MAIN EXECUTION (PROCESS & SAVE) ---
 def main_process_and_save():
-    input_data = ["../#2 Data Storage/Processed Data/preprocessed_battle_log_full_batch.csv"]
+    input_data = ["../#2 Data Storage/Processed Data/preprocessed_battle_log_full_batch.parquet"]
     output_filename = "../#2 Data Storage/Visualization Data/card_percentage_dict.json"
 
     print(f"Starting parallel processing for {len(input_data)} items...")